@@ -4,9 +4,11 @@ import numpy as np
 from PIL import Image
 
 import manimalai
+from manimalai.task_catalog import get_catalog
 
-def capture_task(task_id):
-    env = gym.make('ManimalAI-v0', width=256, height=256, task_id=task_id)
+def capture_task(env, task_id):
+    # Reuse the same environment for all the tasks
+    env.set_task(task_id)
     
     action = [1,1]
     state, reward, terminal, _ = env.step(action=action)
@@ -16,21 +18,19 @@ def capture_task(task_id):
     pimage = Image.fromarray(top_image)
     path = "captures/{}.png".format(task_id)
     pimage.save(path)
-    env.close()
     
 
 def main():
-    config_files = os.listdir("../manimalai/configurations")
-    config_files.sort()
-
     if not os.path.exists("./captures"):
         os.makedirs("./captures")
 
-    for file in config_files:
-        if ".yml" in file:
-            task_id = file[:-4]
-            print(task_id)
-            capture_task(task_id)
+    env = gym.make('ManimalAI-v0', width=256, height=256).unwrapped
+
+    for task_id in get_catalog().task_ids():
+        print(task_id)
+        capture_task(env, task_id)
+
+    env.close()
 
 
 if __name__ == '__main__':
@@ -5,16 +5,39 @@ import pygame, sys
 from pygame.locals import *
 
 import manimalai
+from manimalai.server import EnvClient
 
 BLACK = (0, 0, 0)
 
 
+class RemoteEnv(object):
+    """ Drives one env of a running manimalai.server. """
+    def __init__(self, address, env_id):
+        self.client = EnvClient(address)
+        self.env_id = env_id
+
+    def reset(self):
+        return self.client.reset(env_ids=[self.env_id])[0]
+
+    def step(self, action):
+        screens, rewards, terminals, info = self.client.step([action],
+                                                             env_ids=[self.env_id])
+        return screens[0], rewards[0], terminals[0], info
+
+    def get_top_view(self):
+        return self.client.call("get_top_view")[self.env_id]
+
+
 class Display(object):
-    def __init__(self, display_size, task_id):
+    def __init__(self, display_size, task_id, address=None, env_id=0):
         self.width = display_size[0]
         self.height = display_size[1]
-        
-        self.env = gym.make('ManimalAI-v0', width=256, height=256, task_id=task_id)
+
+        if address is not None:
+            # Server has to be started with --width 256 --height 256
+            self.env = RemoteEnv(address, env_id)
+        else:
+            self.env = gym.make('ManimalAI-v0', width=256, height=256, task_id=task_id)
         
         pygame.init()
         
@@ -71,11 +94,14 @@ def main():
     parser = argparse.ArgumentParser()
     parser.add_argument("--task", type=str,
                         default="1-1-1")
+    parser.add_argument("--address", type=str, default=None,
+                        help="socket of manimalai.server to control its env")
+    parser.add_argument("--env_id", type=int, default=0)
     args = parser.parse_args()
     task_id = args.task
     
     display_size = (512, 256)
-    display = Display(display_size, task_id)
+    display = Display(display_size, task_id, args.address, args.env_id)
     clock = pygame.time.Clock()
 
     running = True
@@ -1,6 +1,8 @@
-from gym.envs.registration import register
+import sys
 
-register(
-    id='ManimalAI-v0',
-    entry_point='manimalai.environment:AAIEnvironment',
-)
+# gym (and numpy) are not imported here. The gym ids are registered by the
+# "gym.envs" entry point when gym is imported later, or right now when gym is
+# already imported.
+if "gym" in sys.modules:
+    from .registration import register_envs
+    register_envs()
@@ -2,8 +2,36 @@ import yaml
 
 from typing import List
 
+try:
+    # libyaml based loader is much faster when it is available
+    from yaml import CLoader as Loader
+except ImportError:
+    from yaml import Loader
+
 yaml.Dumper.ignore_aliases = lambda *args: True
 
+# Item names handled by the environment
+ITEM_NAMES = (
+    "Agent",
+    "GoodGoal",
+    "GoodGoalBounce",
+    "BadGoal",
+    "BadGoalBounce",
+    "GoodGoalMulti",
+    "GoodGoalMultiBounce",
+    "Wall",
+    "Ramp",
+    "CylinderTunnel",
+    "CylinderTunnelTransparent",
+    "DeathZone",
+    "HotZone",
+    "Cardbox1",
+    "Cardbox2",
+    "LObject",
+    "LObject2",
+    "UObject",
+)
+
 
 class Vector3(yaml.YAMLObject):
     yaml_tag = u"!Vector3"
@@ -63,7 +91,8 @@ class ArenaConfig(yaml.YAMLObject):
     def __init__(self, yaml_path: str = None):
 
         if yaml_path is not None:
-            self.arenas = yaml.load(open(yaml_path, "r"), Loader=yaml.Loader).arenas
+            with open(yaml_path, "r") as f:
+                self.arenas = yaml.load(f, Loader=Loader).arenas
         else:
             self.arenas = {}
 
@@ -80,3 +109,10 @@ def constructor_item(loader, node):
 
 yaml.add_constructor(u"!Arena", constructor_arena)
 yaml.add_constructor(u"!Item", constructor_item)
+
+if Loader is not yaml.Loader:
+    yaml.add_constructor(u"!Arena", constructor_arena, Loader=Loader)
+    yaml.add_constructor(u"!Item", constructor_item, Loader=Loader)
+    yaml.add_constructor(u"!Vector3", Vector3.from_yaml, Loader=Loader)
+    yaml.add_constructor(u"!RGB", RGB.from_yaml, Loader=Loader)
+    yaml.add_constructor(u"!ArenaConfig", ArenaConfig.from_yaml, Loader=Loader)
@@ -0,0 +1,206 @@
+import numpy as np
+
+from .arena_config import Arena, Item, Vector3, RGB, ITEM_NAMES
+
+# Size of the arena in the configuration coordinates
+ARENA_SIZE = 40.0
+AGENT_RADIUS = 0.5
+
+# Offsets of the 3x3 neighbor cells
+_NEIGHBOR_OFFSETS = np.array([[dx, dz] for dx in (-1, 0, 1) for dz in (-1, 0, 1)])
+
+
+class ItemSpec:
+    """
+    Distribution of one item type in generated arenas.
+
+    count is a number or a (min, max) range (inclusive). Sizes are sampled
+    uniformly between size_min and size_max for each axis. color is an RGB
+    tuple, or None to let the environment choose a random color.
+    """
+
+    def __init__(self, name, count=1, size_min=(1.0, 1.0, 1.0), size_max=None,
+                 rotate=True, color=None):
+        if name not in ITEM_NAMES or name == "Agent":
+            raise ValueError("Unknown item name: {}".format(name))
+        self.name = name
+        if isinstance(count, (tuple, list)):
+            self.count_range = (int(count[0]), int(count[1]))
+        else:
+            self.count_range = (int(count), int(count))
+        self.size_min = np.array(size_min, dtype=np.float64)
+        self.size_max = self.size_min if size_max is None else \
+            np.array(size_max, dtype=np.float64)
+        if np.any(self.size_max < self.size_min):
+            raise ValueError("size_max must be >= size_min: {}".format(name))
+        self.rotate = rotate
+        self.color = color
+
+    @property
+    def max_radius(self):
+        # Radius of the circle containing the footprint in any rotation
+        return 0.5 * np.hypot(self.size_max[0], self.size_max[2])
+
+
+class _SpatialHash:
+    """
+    Uniform grid of the centers of the placed circles. The cell size has to
+    be at least the sum of the radii of any two circles.
+    """
+
+    def __init__(self, cell_size, capacity=4, max_circles=64):
+        self.cell_size = cell_size
+        self.num_cells = int(ARENA_SIZE // cell_size) + 3
+        self.capacity = capacity
+        # Indices of the circles in each cell (-1 for empty), with a margin
+        # of one cell around the arena
+        self.cells = np.full((self.num_cells, self.num_cells, capacity), -1, dtype=np.int64)
+        self.counts = np.zeros((self.num_cells, self.num_cells), dtype=np.int64)
+        self.centers = np.zeros((max_circles, 2))
+        self.radii = np.zeros(max_circles)
+        self.num_circles = 0
+
+    def _cell(self, positions):
+        return np.floor(positions / self.cell_size).astype(np.int64) + 1
+
+    def find_free(self, positions, radii):
+        """ Returns the mask of the candidate circles not overlapping any circle. """
+        if self.num_circles == 0:
+            return np.ones(len(positions), dtype=np.bool_)
+
+        # Positions are inside the arena, so the neighbors are inside the grid
+        neighbors = self._cell(positions)[:, None, :] + _NEIGHBOR_OFFSETS
+        # (candidates, 9 * capacity)
+        indices = self.cells[neighbors[:, :, 0], neighbors[:, :, 1]].reshape(len(positions), -1)
+        valid = indices >= 0
+
+        delta = self.centers[indices] - positions[:, None, :]
+        squared_distances = np.einsum("ijk,ijk->ij", delta, delta)
+        min_distances = self.radii[indices] + radii[:, None]
+        overlap = valid & (squared_distances < min_distances * min_distances)
+        return ~np.any(overlap, axis=1)
+
+    def insert(self, position, radius):
+        index = self.num_circles
+        if index == len(self.radii):
+            self.centers = np.concatenate([self.centers, np.zeros_like(self.centers)])
+            self.radii = np.concatenate([self.radii, np.zeros_like(self.radii)])
+        self.centers[index] = position
+        self.radii[index] = radius
+        self.num_circles += 1
+
+        # Cells are larger than the sum of any two radii, so overlapping
+        # circles are always found in the neighbor cells of the center
+        x, z = self._cell(position)
+        count = self.counts[x, z]
+        if count == self.capacity:
+            self._grow()
+        self.cells[x, z, count] = index
+        self.counts[x, z] = count + 1
+
+    def _grow(self):
+        cells = np.full(self.cells.shape[:2] + (self.capacity * 2,), -1, dtype=np.int64)
+        cells[:, :, :self.capacity] = self.cells
+        self.cells = cells
+        self.capacity *= 2
+
+
+class ArenaGenerator:
+    """
+    Generates Arena objects with randomly placed items which do not overlap
+    each other or the agent.
+
+    The agent is placed first, and the items from the largest to the
+    smallest. For each item a batch of candidate positions is sampled at once
+    and checked against the circles of the placed items through a spatial
+    hash. Items which can not be placed within max_batches batches are skipped.
+    """
+
+    def __init__(self, item_specs, t=250, pass_mark=0, blackouts=None,
+                 margin=0.5, batch_size=32, max_batches=8, agent_radius=AGENT_RADIUS,
+                 seed=None):
+        self.item_specs = list(item_specs)
+        self.t = t
+        self.pass_mark = pass_mark
+        self.blackouts = list(blackouts or [])
+        self.margin = margin
+        self.batch_size = batch_size
+        self.max_batches = max_batches
+        # Same as agent_radius of the physics settings of the env
+        self.agent_radius = agent_radius
+        self.random = np.random.default_rng(seed)
+
+        max_radius = max([agent_radius] + [spec.max_radius for spec in self.item_specs])
+        self.cell_size = 2.0 * (max_radius + margin)
+
+    def _place(self, spatial_hash, radius, random):
+        # Distance of the circle from the outer walls
+        low = radius + self.margin
+        high = ARENA_SIZE - radius - self.margin
+        if low > high:
+            return None
+        for _ in range(self.max_batches):
+            positions = random.uniform(low, high, size=(self.batch_size, 2))
+            radii = np.full(self.batch_size, radius + self.margin * 0.5)
+            free = spatial_hash.find_free(positions, radii)
+            free_indices = np.flatnonzero(free)
+            if len(free_indices) > 0:
+                position = positions[free_indices[0]]
+                spatial_hash.insert(position, radius + self.margin * 0.5)
+                return position
+        return None
+
+    def generate(self, random=None):
+        """ Returns a new Arena. random is a numpy Generator (default: own one). """
+        if random is None:
+            random = self.random
+
+        # Sample counts, sizes and rotations of all items at once
+        elements = []
+        for spec_index, spec in enumerate(self.item_specs):
+            count = random.integers(spec.count_range[0], spec.count_range[1] + 1)
+            sizes = random.uniform(spec.size_min, spec.size_max, size=(count, 3))
+            if spec.rotate:
+                rotations = random.uniform(0.0, 360.0, size=count)
+            else:
+                rotations = np.zeros(count)
+            radii = 0.5 * np.hypot(sizes[:, 0], sizes[:, 2])
+            for i in range(count):
+                elements.append((radii[i], spec_index, sizes[i], rotations[i]))
+
+        # Larger items first
+        elements.sort(key=lambda element: -element[0])
+
+        # The spot of the agent is reserved before the items fill the arena
+        spatial_hash = _SpatialHash(self.cell_size)
+        agent_position = self._place(spatial_hash, self.agent_radius, random)
+        if agent_position is None:
+            raise ValueError("Agent can not be placed in the arena")
+        items = [Item(name="Agent",
+                      positions=[Vector3(float(agent_position[0]), 0.0,
+                                         float(agent_position[1]))],
+                      rotations=[float(random.uniform(0.0, 360.0))])]
+
+        placed = [[] for _ in self.item_specs]
+        for radius, spec_index, size, rotation in elements:
+            position = self._place(spatial_hash, radius, random)
+            if position is not None:
+                placed[spec_index].append((position, size, rotation))
+
+        for spec, elements in zip(self.item_specs, placed):
+            if len(elements) == 0:
+                continue
+            item = Item(name=spec.name)
+            for position, size, rotation in elements:
+                item.positions.append(Vector3(float(position[0]), 0.0, float(position[1])))
+                item.sizes.append(Vector3(float(size[0]), float(size[1]), float(size[2])))
+                item.rotations.append(float(rotation))
+                if spec.color is not None:
+                    item.colors.append(RGB(*spec.color))
+            items.append(item)
+
+        return Arena(t=self.t, items=items, pass_mark=self.pass_mark,
+                     blackouts=list(self.blackouts))
+
+    def __call__(self, random=None):
+        return self.generate(random)
@@ -0,0 +1,410 @@
+"""
+Asset bundle of the textures and meshes in manimalai/data.
+
+    python -m manimalai.assets build
+    python -m manimalai.assets info
+
+rodentia loads textures and meshes by path, and every environment still
+decodes and uploads its own copy of each texture. The bundle is a copy of the
+data directory where the PNG image data is stored without compression, so
+decoding skips the inflate step, and which is placed in memory (/dev/shm) by
+default, so that the file reads of the environments are served from RAM
+instead of the disk.
+
+Environments use the default bundle when it has been built and is up to date
+with the data directory, and the data directory otherwise.
+
+Lower levels of detail (LOD) for small screens are mirrors of the data
+directory, next to the bundle, with simplified meshes and textures
+downscaled with Pillow. (Textures keep their size when Pillow is not
+installed.) They are built by "build", or on the first use of the level by
+the registries created with build=True (build_lod option of the
+environment), and concurrent builds are serialized with a lock file next to
+the bundle.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import struct
+import sys
+import threading
+import zlib
+
+try:
+    import fcntl
+except ImportError:
+    # Builds are not serialized between processes without fcntl (Windows)
+    fcntl = None
+
+from .task_catalog import get_cache_dir
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+# Bump when the layout of the bundle changes
+BUNDLE_VERSION = 2
+
+MANIFEST_NAME = "manifest.json"
+
+ASSET_EXTENSIONS = (".png", ".obj", ".mtl", ".col")
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+# Chunks kept in the bundle. Other ancillary chunks (text, gamma etc.) are
+# dropped.
+PNG_KEPT_CHUNKS = (b"IHDR", b"PLTE", b"tRNS", b"IEND")
+
+# Levels of detail
+LOD_FULL = 0
+NUM_LODS = 3
+# Maximum texture size of each lower level
+LOD_TEXTURE_SIZES = {1: 256, 2: 64}
+# Simplified meshes drawn in the lower levels (AssetRegistry.draw_path()).
+# They only replace the meshes of the bodies which collide with the boxes of
+# the .col file, which the variant has a copy of, so that the collision shapes
+# are the same at every level.
+LOD_MESHES = {"immovable/cylinder.obj": "immovable/cylinder_lod1.obj"}
+
+
+def select_lod(width, height):
+    """ Level of detail for the screen size. """
+    size = max(width, height)
+    if size >= 256:
+        return LOD_FULL
+    elif size >= 128:
+        return 1
+    else:
+        return 2
+
+
+def _load_pillow():
+    try:
+        from PIL import Image
+    except ImportError:
+        return None
+    return Image
+
+
+def get_default_bundle_dir():
+    bundle_dir = os.environ.get("MANIMALAI_ASSET_DIR")
+    if bundle_dir is not None:
+        return bundle_dir
+    name = "manimalai-assets-v{}".format(BUNDLE_VERSION)
+    if os.path.isdir("/dev/shm"):
+        return os.path.join("/dev/shm", "{}-{}".format(name, os.getuid()))
+    return os.path.join(get_cache_dir(), name)
+
+
+def _read_png_chunks(data):
+    if not data.startswith(PNG_SIGNATURE):
+        raise ValueError("Not a PNG file")
+    chunks = []
+    offset = len(PNG_SIGNATURE)
+    while offset < len(data):
+        length, chunk_type = struct.unpack(">I4s", data[offset:offset + 8])
+        chunks.append((chunk_type, data[offset + 8:offset + 8 + length]))
+        offset += 12 + length
+        if chunk_type == b"IEND":
+            break
+    return chunks
+
+
+def _png_chunk(chunk_type, body):
+    crc = zlib.crc32(chunk_type + body) & 0xffffffff
+    return struct.pack(">I", len(body)) + chunk_type + body + struct.pack(">I", crc)
+
+
+def repack_png(data):
+    """
+    Returns the PNG data with the image data stored without compression.
+    Scanlines and their filters are kept as they are, so the pixels are the
+    same as the original.
+    """
+    chunks = _read_png_chunks(data)
+    image_data = zlib.decompress(b"".join(body for chunk_type, body in chunks
+                                          if chunk_type == b"IDAT"))
+
+    output = [PNG_SIGNATURE]
+    for chunk_type, body in chunks:
+        if chunk_type == b"IEND":
+            output.append(_png_chunk(b"IDAT", zlib.compress(image_data, 0)))
+        if chunk_type in PNG_KEPT_CHUNKS:
+            output.append(_png_chunk(chunk_type, body))
+    return b"".join(output)
+
+
+def encode_png(image):
+    """ Returns the PNG data of an RGB image array (height, width, 3) of uint8. """
+    height, width = image.shape[:2]
+    header = struct.pack(">IIBBBBB", width, height, 8, 2, 0, 0, 0)
+    # Filter type 0 (none) for every scanline
+    scanlines = b"".join(b"\x00" + image[y].tobytes() for y in range(height))
+    return b"".join([PNG_SIGNATURE,
+                     _png_chunk(b"IHDR", header),
+                     _png_chunk(b"IDAT", zlib.compress(scanlines)),
+                     _png_chunk(b"IEND", b"")])
+
+
+def downscale_png(data, max_size):
+    """ Returns the PNG data scaled down to max_size, or None without Pillow. """
+    Image = _load_pillow()
+    if Image is None:
+        return None
+    image = Image.open(io.BytesIO(data))
+    if max(image.size) <= max_size:
+        return data
+    image.thumbnail((max_size, max_size), Image.LANCZOS)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def _scan(data_dir):
+    # Relative path -> (mtime, size) of the asset files
+    stamps = {}
+    for root, _, files in os.walk(data_dir):
+        for name in files:
+            if name.endswith(ASSET_EXTENSIONS):
+                path = os.path.join(root, name)
+                stat = os.stat(path)
+                relative_path = os.path.relpath(path, data_dir).replace(os.sep, "/")
+                stamps[relative_path] = [stat.st_mtime_ns, stat.st_size]
+    return stamps
+
+
+def get_lod_dir(bundle_dir, lod):
+    if lod == LOD_FULL:
+        return bundle_dir
+    return "{}-lod{}".format(bundle_dir.rstrip(os.sep), lod)
+
+
+def load_manifest(bundle_dir):
+    try:
+        with open(os.path.join(bundle_dir, MANIFEST_NAME)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if manifest.get("version") != BUNDLE_VERSION:
+        return None
+    return manifest
+
+
+def _scaled_textures(lod):
+    return lod != LOD_FULL and _load_pillow() is not None
+
+
+def is_up_to_date(bundle_dir, data_dir=DATA_DIR, lod=LOD_FULL):
+    manifest = load_manifest(bundle_dir)
+    return manifest is not None and \
+        manifest["data_dir"] == os.path.abspath(data_dir) and \
+        manifest.get("lod", LOD_FULL) == lod and \
+        manifest.get("scaled_textures", False) == _scaled_textures(lod) and \
+        manifest["sources"] == _scan(data_dir)
+
+
+def _read_asset(data_dir, relative_path, lod):
+    with open(os.path.join(data_dir, relative_path), "rb") as f:
+        data = f.read()
+
+    if relative_path.endswith(".png"):
+        if lod != LOD_FULL:
+            data = downscale_png(data, LOD_TEXTURE_SIZES[lod]) or data
+        data = repack_png(data)
+    return data
+
+
+@contextlib.contextmanager
+def _build_lock(output_dir):
+    # Lock file next to the bundle, held while the bundle is built and swapped in
+    if fcntl is None:
+        yield
+        return
+    lock_path = "{}.lock".format(output_dir.rstrip(os.sep))
+    os.makedirs(os.path.dirname(os.path.abspath(lock_path)), exist_ok=True)
+    with open(lock_path, "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def build_bundle(bundle_dir=None, data_dir=DATA_DIR, lod=LOD_FULL):
+    """
+    Builds the asset bundle of data_dir and returns its manifest. With lod,
+    the level of detail is built in get_lod_dir(bundle_dir, lod).
+    """
+    if bundle_dir is None:
+        bundle_dir = get_default_bundle_dir()
+    with _build_lock(get_lod_dir(bundle_dir, lod)):
+        return _build_bundle(bundle_dir, data_dir, lod)
+
+
+def ensure_bundle(bundle_dir=None, data_dir=DATA_DIR, lod=LOD_FULL):
+    """
+    Builds the asset bundle unless it is up to date. Builds of concurrent
+    processes are serialized, so that the bundle which one of them built, and
+    its environments already use, is not replaced by the others.
+    """
+    if bundle_dir is None:
+        bundle_dir = get_default_bundle_dir()
+    output_dir = get_lod_dir(bundle_dir, lod)
+    with _build_lock(output_dir):
+        manifest = load_manifest(output_dir)
+        if not is_up_to_date(output_dir, data_dir, lod):
+            manifest = _build_bundle(bundle_dir, data_dir, lod)
+    return manifest
+
+
+def _build_bundle(bundle_dir, data_dir, lod):
+    output_dir = get_lod_dir(bundle_dir, lod)
+    stamps = _scan(data_dir)
+
+    # Built next to the bundle and swapped in, so that environments never see
+    # a partial bundle
+    tmp_dir = "{}.{}.tmp".format(output_dir.rstrip(os.sep), os.getpid())
+    if os.path.exists(tmp_dir):
+        shutil.rmtree(tmp_dir)
+
+    sizes = {}
+    for relative_path in sorted(stamps.keys()):
+        data = _read_asset(data_dir, relative_path, lod)
+        path = os.path.join(tmp_dir, relative_path)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(data)
+        sizes[relative_path] = len(data)
+
+    manifest = {
+        "version": BUNDLE_VERSION,
+        "data_dir": os.path.abspath(data_dir),
+        "lod": lod,
+        "scaled_textures": _scaled_textures(lod),
+        "sources": stamps,
+        "sizes": sizes,
+    }
+    with open(os.path.join(tmp_dir, MANIFEST_NAME), "w") as f:
+        json.dump(manifest, f, indent=1)
+
+    # Builds wait for each other on the lock
+    try:
+        if os.path.exists(output_dir):
+            shutil.rmtree(output_dir)
+        os.replace(tmp_dir, output_dir)
+    except OSError:
+        # Another process swapped in its build first (without fcntl)
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        if not is_up_to_date(output_dir, data_dir, lod):
+            raise
+    return manifest
+
+
+class AssetRegistry:
+    """
+    Resolves the paths of the assets (e.g. "stage/floor.png") to the bundle
+    when it is up to date, and to the data directory otherwise.
+
+    With build, the directory of a lower level of detail is built on the
+    first path() call when it is missing or out of date. Otherwise, and when
+    it can not be built, the full level is used (with the simplified meshes
+    of draw_path() only).
+    """
+
+    def __init__(self, bundle_dir=None, data_dir=DATA_DIR, lod=LOD_FULL, build=False):
+        if lod not in range(NUM_LODS):
+            raise ValueError("lod must be in [0, {}): {}".format(NUM_LODS, lod))
+        if bundle_dir is None:
+            bundle_dir = get_default_bundle_dir()
+        self.data_dir = data_dir
+        self.bundle_dir = bundle_dir
+        self.lod = lod
+        self.build = build
+        self._use_bundle = None
+        self._root = None
+        # Asset name -> path
+        self.paths = {}
+
+    def _resolve(self):
+        lod_dir = get_lod_dir(self.bundle_dir, self.lod)
+        use_bundle = is_up_to_date(lod_dir, self.data_dir, self.lod)
+        if not use_bundle and self.lod != LOD_FULL and self.build:
+            try:
+                ensure_bundle(self.bundle_dir, self.data_dir, self.lod)
+                use_bundle = True
+            except OSError:
+                pass
+        if not use_bundle and self.lod != LOD_FULL:
+            lod_dir = self.bundle_dir
+            use_bundle = is_up_to_date(lod_dir, self.data_dir)
+        self._use_bundle = use_bundle
+        self._root = lod_dir if use_bundle else self.data_dir
+
+    @property
+    def use_bundle(self):
+        if self._root is None:
+            self._resolve()
+        return self._use_bundle
+
+    @property
+    def root(self):
+        if self._root is None:
+            self._resolve()
+        return self._root
+
+    def path(self, name):
+        path = self.paths.get(name)
+        if path is None:
+            path = os.path.join(self.root, name)
+            self.paths[name] = path
+        return path
+
+    def draw_path(self, name):
+        """ Path of the mesh drawn at the level, which may be simplified. """
+        if self.lod != LOD_FULL:
+            name = LOD_MESHES.get(name, name)
+        return self.path(name)
+
+
+_registries = {}
+_registries_lock = threading.Lock()
+
+
+def get_registry(bundle_dir=None, lod=LOD_FULL, build=False):
+    """ Returns the registry shared by the environments of this process. """
+    with _registries_lock:
+        key = (bundle_dir, lod, build)
+        registry = _registries.get(key)
+        if registry is None:
+            registry = AssetRegistry(bundle_dir, lod=lod, build=build)
+            _registries[key] = registry
+        return registry
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ManimalAI asset bundle")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--output", default=None,
+                        help="bundle directory (default: {})".format(get_default_bundle_dir()))
+    parser.add_argument("--lods", type=int, nargs="+", default=list(range(NUM_LODS)),
+                        help="levels of detail to build")
+    args = parser.parse_args(argv)
+
+    bundle_dir = args.output or get_default_bundle_dir()
+    for lod in args.lods:
+        lod_dir = get_lod_dir(bundle_dir, lod)
+        if args.command == "build":
+            manifest = build_bundle(bundle_dir, lod=lod)
+            print("Built {} assets ({:.1f} MB) in {}".format(
+                len(manifest["sizes"]), sum(manifest["sizes"].values()) / 1e6, lod_dir))
+        elif is_up_to_date(lod_dir, lod=lod):
+            print("{}: up to date".format(lod_dir))
+        elif load_manifest(lod_dir) is not None:
+            print("{}: out of date".format(lod_dir))
+        else:
+            print("{}: not built".format(lod_dir))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,378 @@
+"""
+Performance benchmark of AAIEnvironment.
+
+    python -m manimalai.benchmark --category 1 --resolutions 64 256 --output result.json
+    python -m manimalai.benchmark --category 1 --resolutions 64 256 --compare result.json
+    python -m manimalai.benchmark --tasks 1-1-1 --resolutions 84 --startup 5
+
+Measures step() throughput and reset() latency for each arena, resolution and
+top view setting, and aggregates them per item type and per resolution.
+With --startup, the import, construction and first reset times of a fresh
+process are measured as well.
+"""
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+from .__version__ import __version__
+from .environment import AAIEnvironment
+from .task_catalog import get_catalog
+
+RESULT_FORMAT_VERSION = 1
+
+DEFAULT_RESOLUTIONS = (64, 128, 256, 512)
+
+
+def _module_version(name):
+    try:
+        from importlib import metadata
+        return metadata.version(name)
+    except Exception:
+        return None
+
+
+def get_platform_info():
+    return {
+        "manimalai": __version__,
+        "rodentia": _module_version("rodentia"),
+        "numpy": np.__version__,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+    }
+
+
+def benchmark_arena(task_id,
+                    arena_index=0,
+                    width=256,
+                    height=256,
+                    top_view=False,
+                    num_steps=200,
+                    num_resets=5,
+                    seed=0,
+                    env_kwargs=None):
+    """ Measures one arena and returns the result as a dictionary. """
+    rng = np.random.RandomState(seed)
+    actions = rng.randint(0, 3, size=(num_steps, 2))
+
+    start = time.perf_counter()
+    env = AAIEnvironment(width=width,
+                         height=height,
+                         task_id=task_id,
+                         arena_index=arena_index,
+                         **(env_kwargs or {}))
+    init_time = time.perf_counter() - start
+
+    try:
+        # rodentia and the scene are loaded on the first reset, which is timed
+        # apart from the others
+        start = time.perf_counter()
+        env.reset()
+        first_reset_time = time.perf_counter() - start
+
+        reset_times = []
+        for _ in range(num_resets):
+            start = time.perf_counter()
+            env.reset()
+            reset_times.append(time.perf_counter() - start)
+
+        num_terminals = 0
+        start = time.perf_counter()
+        for action in actions:
+            _, _, terminal, _ = env.step(action)
+            if top_view:
+                env.get_top_view()
+            if terminal:
+                num_terminals += 1
+        step_time = time.perf_counter() - start
+    finally:
+        env.close()
+
+    reset_times = np.array(reset_times) * 1000.0
+    return {
+        "task_id": task_id,
+        "arena_index": arena_index,
+        "width": width,
+        "height": height,
+        "top_view": top_view,
+        "num_steps": num_steps,
+        "num_terminals": num_terminals,
+        "steps_per_sec": num_steps / step_time if step_time > 0.0 else float("inf"),
+        "step_ms": step_time * 1000.0 / num_steps,
+        "reset_ms": float(np.mean(reset_times)) if num_resets > 0 else None,
+        "reset_ms_max": float(np.max(reset_times)) if num_resets > 0 else None,
+        "init_ms": init_time * 1000.0,
+        "first_reset_ms": first_reset_time * 1000.0,
+    }
+
+
+# Run in a fresh interpreter by benchmark_startup()
+_STARTUP_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import manimalai
+import_time = time.perf_counter() - start
+start = time.perf_counter()
+from manimalai.environment import AAIEnvironment
+env_import_time = time.perf_counter() - start
+start = time.perf_counter()
+env = AAIEnvironment(width={width}, height={height}, task_id={task_id!r})
+construct_time = time.perf_counter() - start
+start = time.perf_counter()
+env.reset()
+reset_time = time.perf_counter() - start
+json.dump([import_time, env_import_time, construct_time, reset_time], sys.stdout)
+"""
+
+STARTUP_METRICS = ("import_ms", "env_import_ms", "construct_ms", "first_reset_ms")
+
+
+def benchmark_startup(task_id="1-1-1", width=84, height=84, num_trials=3):
+    """
+    Measures the import time of manimalai, the import time of
+    manimalai.environment, the construction time of AAIEnvironment and the
+    time of its first reset() in fresh processes. The package import loads
+    neither gym nor numpy. The environment module needs gym, numpy and yaml,
+    which make up the floor of env_import_ms, while rodentia is loaded on the
+    first reset().
+    """
+    script = _STARTUP_SCRIPT.format(width=width, height=height, task_id=task_id)
+    times = []
+    for _ in range(num_trials):
+        output = subprocess.run([sys.executable, "-c", script],
+                                check=True, stdout=subprocess.PIPE).stdout
+        times.append(json.loads(output))
+    times = np.array(times) * 1000.0
+
+    result = {
+        "task_id": task_id,
+        "width": width,
+        "height": height,
+        "num_trials": num_trials,
+    }
+    for i, metric in enumerate(STARTUP_METRICS):
+        result[metric] = float(np.mean(times[:, i]))
+        result[metric + "_max"] = float(np.max(times[:, i]))
+    return result
+
+
+def _summarize(results, key_func):
+    groups = {}
+    for result in results:
+        for key in key_func(result):
+            groups.setdefault(key, []).append(result)
+
+    summary = {}
+    for key in sorted(groups.keys()):
+        group = groups[key]
+        summary[key] = {
+            "num_results": len(group),
+            "steps_per_sec": float(np.mean([r["steps_per_sec"] for r in group])),
+            "step_ms": float(np.mean([r["step_ms"] for r in group])),
+            "reset_ms": float(np.mean([r["reset_ms"] for r in group
+                                       if r["reset_ms"] is not None] or [0.0])),
+        }
+    return summary
+
+
+def summarize_by_item_type(results, infos):
+    """ Averages the results of the arenas which contain each item type. """
+    item_names = {(info.task_id, info.arena_index): list(info.item_counts.keys())
+                  for info in infos}
+    return _summarize(results,
+                      lambda r: item_names.get((r["task_id"], r["arena_index"]), []))
+
+
+def summarize_by_setting(results):
+    return _summarize(results,
+                      lambda r: ["{}x{}{}".format(r["width"], r["height"],
+                                                  "+top_view" if r["top_view"] else "")])
+
+
+def run_benchmark(infos,
+                  resolutions=DEFAULT_RESOLUTIONS,
+                  top_view_settings=(False,),
+                  num_steps=200,
+                  num_resets=5,
+                  seed=0,
+                  env_kwargs=None,
+                  startup_trials=0,
+                  log=None):
+    results = []
+    for info in infos:
+        for resolution in resolutions:
+            for top_view in top_view_settings:
+                result = benchmark_arena(info.task_id,
+                                         info.arena_index,
+                                         width=resolution,
+                                         height=resolution,
+                                         top_view=top_view,
+                                         num_steps=num_steps,
+                                         num_resets=num_resets,
+                                         seed=seed,
+                                         env_kwargs=env_kwargs)
+                results.append(result)
+                if log is not None:
+                    log("{} [{}] {}x{} top_view={}: {:.1f} steps/s, reset {:.2f} ms".format(
+                        info.task_id, info.arena_index, resolution, resolution, top_view,
+                        result["steps_per_sec"], result["reset_ms"] or 0.0))
+
+    output = {
+        "format_version": RESULT_FORMAT_VERSION,
+        "platform": get_platform_info(),
+        "settings": {
+            "resolutions": list(resolutions),
+            "top_view": list(top_view_settings),
+            "num_steps": num_steps,
+            "num_resets": num_resets,
+            "seed": seed,
+            "env_kwargs": env_kwargs or {},
+        },
+        "results": results,
+        "by_item_type": summarize_by_item_type(results, infos),
+        "by_setting": summarize_by_setting(results),
+    }
+
+    if startup_trials > 0 and len(infos) > 0:
+        startup = benchmark_startup(infos[0].task_id,
+                                    width=resolutions[0],
+                                    height=resolutions[0],
+                                    num_trials=startup_trials)
+        output["startup"] = startup
+        if log is not None:
+            log("startup: import {:.1f} ms, env import {:.1f} ms, construct {:.1f} ms, "
+                "first reset {:.1f} ms".format(
+                    startup["import_ms"], startup["env_import_ms"], startup["construct_ms"],
+                    startup["first_reset_ms"]))
+    return output
+
+
+def _result_key(result):
+    return (result["task_id"], result["arena_index"], result["width"],
+            result["height"], result["top_view"])
+
+
+def compare_results(baseline, current, threshold=0.1):
+    """
+    Compares two outputs of run_benchmark(). Returns a list of regressions, where
+    steps/sec dropped or reset latency grew by more than threshold (ratio).
+    """
+    baseline_results = {_result_key(r): r for r in baseline["results"]}
+
+    regressions = []
+    for result in current["results"]:
+        key = _result_key(result)
+        base = baseline_results.get(key)
+        if base is None:
+            continue
+
+        speed_ratio = result["steps_per_sec"] / base["steps_per_sec"]
+        if speed_ratio < 1.0 - threshold:
+            regressions.append({"key": list(key),
+                                "metric": "steps_per_sec",
+                                "baseline": base["steps_per_sec"],
+                                "current": result["steps_per_sec"],
+                                "ratio": speed_ratio})
+
+        if base["reset_ms"] and result["reset_ms"] is not None:
+            reset_ratio = result["reset_ms"] / base["reset_ms"]
+            if reset_ratio > 1.0 + threshold:
+                regressions.append({"key": list(key),
+                                    "metric": "reset_ms",
+                                    "baseline": base["reset_ms"],
+                                    "current": result["reset_ms"],
+                                    "ratio": reset_ratio})
+
+    if "startup" in baseline and "startup" in current:
+        for metric in STARTUP_METRICS:
+            base = baseline["startup"][metric]
+            value = current["startup"][metric]
+            if base > 0.0 and value / base > 1.0 + threshold:
+                regressions.append({"key": ["startup"],
+                                    "metric": metric,
+                                    "baseline": base,
+                                    "current": value,
+                                    "ratio": value / base})
+    return regressions
+
+
+def _select_infos(args):
+    catalog = get_catalog()
+    if args.tasks:
+        infos = []
+        for task_id in args.tasks:
+            infos.extend(catalog.get_infos(task_id)[index]
+                         for index in catalog.arena_indices(task_id))
+    else:
+        infos = catalog.all_infos(args.category)
+    if args.limit is not None:
+        infos = infos[:args.limit]
+    return infos
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark of ManimalAI environments")
+    parser.add_argument("--tasks", nargs="+", default=None,
+                        help="task ids to measure (default: all tasks)")
+    parser.add_argument("--category", type=int, default=None,
+                        help="measure only the tasks of this category")
+    parser.add_argument("--limit", type=int, default=None,
+                        help="maximum number of arenas")
+    parser.add_argument("--resolutions", type=int, nargs="+",
+                        default=list(DEFAULT_RESOLUTIONS))
+    parser.add_argument("--top-view", choices=["off", "on", "both"], default="off",
+                        help="render the top view camera every step")
+    parser.add_argument("--steps", type=int, default=200)
+    parser.add_argument("--resets", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--startup", type=int, default=0, metavar="TRIALS",
+                        help="measure the startup time in this number of fresh processes")
+    parser.add_argument("--output", default=None,
+                        help="path of the JSON result (default: stdout)")
+    parser.add_argument("--compare", default=None,
+                        help="JSON result of a previous run to compare with")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="ratio of slowdown reported as a regression")
+    args = parser.parse_args(argv)
+
+    top_view_settings = {"off": (False,), "on": (True,), "both": (False, True)}[args.top_view]
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    output = run_benchmark(_select_infos(args),
+                           resolutions=args.resolutions,
+                           top_view_settings=top_view_settings,
+                           num_steps=args.steps,
+                           num_resets=args.resets,
+                           seed=args.seed,
+                           startup_trials=args.startup,
+                           log=log)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(output, f, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        print()
+
+    if args.compare is not None:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare_results(baseline, output, args.threshold)
+        for regression in regressions:
+            log("Regression {} {}: {:.3f} -> {:.3f} ({:.2f}x)".format(
+                regression["key"], regression["metric"], regression["baseline"],
+                regression["current"], regression["ratio"]))
+        if len(regressions) > 0:
+            return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
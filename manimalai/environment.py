@@ -1,98 +1,314 @@
 import gym
 import gym.spaces
-import rodentia
 import os
+import bisect
 import numpy as np
 
-from .arena_config import ArenaConfig, RGB, Vector3
+from .arena_config import RGB, Vector3
+from .assets import get_registry, select_lod
+from .task_catalog import get_arena
+from .object_registry import ObjectRegistry
+from .static_batch import StaticBatch
+from .observation import ScreenProcessor, LAYOUT_HWC
+from .profiling import PhaseProfiler, PHASE_ACTION, PHASE_PHYSICS, PHASE_COLLISION, \
+    PHASE_BLACKOUT, PHASE_RENDER, PHASE_OBSERVATION, PHASE_AGENT_INFO, PHASE_AUTO_RESET, \
+    PHASE_OBJECTS, EVENT_STEP, EVENT_RESET
 
 LU_TYPE_L  = 1
 LU_TYPE_L2 = 2
 LU_TYPE_U  = 3
 
+# Stage object types used in the state observation
+OBJ_TYPE_NONE            = 0
+OBJ_TYPE_GOOD_GOAL       = 1
+OBJ_TYPE_GOOD_GOAL_MULTI = 2
+OBJ_TYPE_BAD_GOAL        = 3
+OBJ_TYPE_WALL            = 4
+OBJ_TYPE_RAMP            = 5
+OBJ_TYPE_CYLINDER_TUNNEL = 6
+OBJ_TYPE_DEATH_ZONE      = 7
+OBJ_TYPE_HOT_ZONE        = 8
+OBJ_TYPE_CARDBOX1        = 9
+OBJ_TYPE_CARDBOX2        = 10
+OBJ_TYPE_LOBJECT         = 11
+OBJ_TYPE_LOBJECT2        = 12
+OBJ_TYPE_UOBJECT         = 13
+
+OBS_TYPE_SCREEN = "screen"
+OBS_TYPE_STATE  = "state"
+
+# Rendering quality settings
+RENDER_PRESET_EVAL = "eval"
+RENDER_PRESET_FAST = "fast"
+
+RENDER_PRESETS = {
+    RENDER_PRESET_EVAL: {
+        "shadow_buffer_width": 1024,
+        "shadow_rate": 0.2,
+        "top_view_shadow_buffer_width": 1024,
+    },
+    # Shadows are not visible (shadow_rate 1.0), and the shadow depth buffers
+    # which are still rendered by rodentia are kept small.
+    RENDER_PRESET_FAST: {
+        "shadow_buffer_width": 64,
+        "shadow_rate": 1.0,
+        "top_view_shadow_buffer_width": 64,
+    },
+}
+
+# Physics settings
+PHYSICS_PRESET_DEFAULT = "default"
+PHYSICS_PRESET_FAST = "fast"
+
+PHYSICS_PRESETS = {
+    PHYSICS_PRESET_DEFAULT: {
+        "agent_radius": 0.5,
+        "goal_mass": 0.5,
+        # Magnitude of the impulse of the bouncing goals
+        "goal_impulse": 10.0,
+        "cardbox1_mass": 1.0,
+        "cardbox2_mass": 2.0,
+        "luobject_mass": 1.0,
+        # Collide with the compound of boxes in cylinder.col instead of the
+        # triangle mesh of the tunnel
+        "tunnel_collision_proxy": False,
+    },
+}
+PHYSICS_PRESETS[PHYSICS_PRESET_FAST] = dict(PHYSICS_PRESETS[PHYSICS_PRESET_DEFAULT],
+                                            tunnel_collision_proxy=True)
+
+
+def _resolve_preset(presets, default_name, preset, kind):
+    # Preset name, or a dictionary overriding the values of the default preset
+    if isinstance(preset, dict):
+        unknown_keys = set(preset) - set(presets[default_name])
+        if len(unknown_keys) > 0:
+            raise ValueError("Unknown {} settings: {}".format(kind, sorted(unknown_keys)))
+        settings = dict(presets[default_name])
+        settings.update(preset)
+        return settings
+    elif preset in presets:
+        return presets[preset]
+    else:
+        raise ValueError("Unknown {}_preset: {}".format(kind, preset))
+
 
 class Blackout:
-    def __init__(self, pattern):
+    def __init__(self, pattern, max_step=None):
         self.pattern = pattern
+        self.enabled = len(pattern) > 0
+        self.periodic = len(pattern) == 1 and pattern[0] < 0
+
+        # Lookup table for the steps within an episode
+        self.schedule = None
+        if self.enabled and max_step is not None:
+            self.schedule = self._compute(np.arange(max_step+1))
+
+    def _compute(self, step_nums):
+        if self.periodic:
+            pattern_index = step_nums // (-self.pattern[0])
+        else:
+            # Number of pattern boundaries which are <= step_num
+            pattern_index = np.searchsorted(self.pattern, step_nums, side="right")
+        return pattern_index % 2 == 1
         
     def is_blacked_out(self, step_num):
-        if len(self.pattern) == 0:
+        if not self.enabled:
             return False
-        elif len(self.pattern) == 1 and self.pattern[0] < 0:
+        elif self.schedule is not None and 0 <= step_num < len(self.schedule):
+            return bool(self.schedule[step_num])
+        elif self.periodic:
             pattern_index = step_num // (-self.pattern[0])
             return pattern_index % 2 == 1
         else:
-            pattern_size = len(self.pattern)
-            pattern_index = 0
-            
-            for i in range(pattern_size-1):
-                start = self.pattern[i]
-                end   = self.pattern[i+1]
-                if start <= step_num and step_num < end:
-                    pattern_index = i + 1
-                    break
-            if step_num >= self.pattern[-1]:
-                pattern_index = len(self.pattern)
-
+            pattern_index = bisect.bisect_right(self.pattern, step_num)
             return pattern_index % 2 == 1
 
 
 class AAIEnvironment(gym.Env):
-    def __init__(self, width=256, height=256, task_id="1-1-1", arena_index=0, debug=False):
+    def __init__(self, width=256, height=256, task_id="1-1-1", arena_index=0, debug=False,
+                 incremental_reset=False, frame_skip=1, max_pool_frames=False,
+                 obs_type=OBS_TYPE_SCREEN, max_objects=256, obs_buffer=None,
+                 obs_layout=LAYOUT_HWC, obs_dtype=np.uint8, grayscale=False, downsample=1,
+                 profile=False, profile_callback=None, profile_window=1000,
+                 render_preset=RENDER_PRESET_EVAL, physics_preset=PHYSICS_PRESET_DEFAULT,
+                 seed=None, arena_generator=None, asset_dir=None, lod=None,
+                 build_lod=False, static_batching=False):
         super().__init__()
 
+        if obs_type not in (OBS_TYPE_SCREEN, OBS_TYPE_STATE):
+            raise ValueError("Unknown obs_type: {}".format(obs_type))
+
+        if frame_skip < 1:
+            raise ValueError("frame_skip must be >= 1: {}".format(frame_skip))
+
+        render_settings = _resolve_preset(RENDER_PRESETS, RENDER_PRESET_EVAL,
+                                          render_preset, "render")
+        self.render_settings = render_settings
+
+        physics_settings = _resolve_preset(PHYSICS_PRESETS, PHYSICS_PRESET_DEFAULT,
+                                           physics_preset, "physics")
+        if physics_settings["agent_radius"] <= 0.0:
+            raise ValueError("agent_radius must be > 0: {}".format(
+                physics_settings["agent_radius"]))
+        for key, value in physics_settings.items():
+            if value < 0.0:
+                raise ValueError("{} must be >= 0: {}".format(key, value))
+            if key.endswith("_mass") and value == 0.0:
+                # Mass 0 makes the object static in bullet
+                raise ValueError("{} must be > 0: {}".format(key, value))
+        self.physics_settings = physics_settings
+
         self.debug = debug
+        # When incremental_reset is True, immovable objects whose pose is fully
+        # specified are kept across episodes, and other immovable objects are
+        # recycled by relocating them instead of removing and adding again.
+        self.incremental_reset = incremental_reset
+        # When static_batching is True, the fixed stage and the immovable
+        # objects whose pose is fully specified are merged into one static
+        # body and model. (See static_batch.py) Arenas from arena_generator do
+        # not repeat, so their objects are not merged.
+        self.static_batching = static_batching
+        # Number of physics steps to repeat the action in one step() call.
+        # When max_pool_frames is True, the returned screen is the max of the
+        # last two frames.
+        self.frame_skip = frame_skip
+        self.max_pool_frames = max_pool_frames
+        # With OBS_TYPE_STATE, screen is never rendered and the observation is
+        # a dictionary of agent and object states.
+        self.obs_type = obs_type
+        self.max_objects = max_objects
+
+        # Phase timers of step() and reset(). (None when profiling is disabled)
+        self.profiler = None
+        if profile or profile_callback is not None:
+            self.profiler = PhaseProfiler(window=profile_window,
+                                          callback=profile_callback)
+
+        # Conversion of the rendered screens. When obs_buffer is given, the
+        # screen observations are written into it.
+        self.screen_processor = ScreenProcessor(width, height,
+                                                layout=obs_layout,
+                                                dtype=obs_dtype,
+                                                grayscale=grayscale,
+                                                downsample=downsample,
+                                                out=obs_buffer)
 
         # Gym setting
         self.action_space = gym.spaces.MultiDiscrete((3,3))
-        self.observation_space = gym.spaces.Box(
-            low=0,
-            high=255,
-            shape=(height,width,3)
-        )
+        if obs_type == OBS_TYPE_STATE:
+            self.observation_space = gym.spaces.Dict({
+                # pos x,y,z, rot_y, local velocity x,y,z
+                "agent": gym.spaces.Box(low=-np.inf, high=np.inf, shape=(7,),
+                                        dtype=np.float32),
+                "object_pos": gym.spaces.Box(low=-np.inf, high=np.inf,
+                                             shape=(max_objects,3),
+                                             dtype=np.float32),
+                "object_type": gym.spaces.Box(low=0, high=OBJ_TYPE_UOBJECT,
+                                              shape=(max_objects,),
+                                              dtype=np.int32),
+                "object_reward": gym.spaces.Box(low=-np.inf, high=np.inf,
+                                                shape=(max_objects,),
+                                                dtype=np.float32),
+                "object_terminal": gym.spaces.Box(low=0, high=1,
+                                                  shape=(max_objects,),
+                                                  dtype=np.int8),
+            })
+        elif not self.screen_processor.is_identity:
+            self.observation_space = self.screen_processor.observation_space()
+        else:
+            self.observation_space = gym.spaces.Box(
+                low=0,
+                high=255,
+                shape=(height,width,3),
+                dtype=np.uint8
+            )
         self.reward_range = [-np.inf, np.inf]
+
+        # Random state of the item placements which are not specified in the
+        # arena config
+        self.random = np.random.default_rng(seed)
+        # Callable returning the Arena of each episode from the random state.
+        # (e.g. ArenaGenerator)
+        self.arena_generator = arena_generator
         
-        # Load arena config yaml
-        config_path = os.path.dirname(os.path.abspath(__file__)) + \
-                      "/configurations/{}.yml".format(task_id)
-        config = ArenaConfig(config_path)
-        self.arena = config.arenas[arena_index]
+        # Load arena config from the compiled task catalog
+        self._load_task(task_id, arena_index)
+
+        # Shared screen returned while blacked out
+        self.black_screen = np.zeros((height, width, 3), dtype=np.uint8)
+        self.black_screen.flags.writeable = False
         
-        self.blackout = Blackout(self.arena.blackouts)
+        # Where model and texture data are located. (asset bundle built by
+        # "python -m manimalai.assets build" when it is up to date) Level of
+        # detail of the assets is chosen from the screen size unless given,
+        # and with build_lod its directory is built next to the bundle when
+        # missing.
+        if lod is None:
+            lod = select_lod(width, height)
+        self.lod = lod
+        self.assets = get_registry(asset_dir, lod, build_lod)
         
-        # Where model and texture data are located
-        self.data_path = os.path.dirname(
-            os.path.abspath(__file__)) + "/data/"
+        self.width = width
+        self.height = height
+        # rodentia environment is created on the first access to self.env, and
+        # the first episode starts on the first reset(), or on the first step()
+        # when reset() is not called.
+        self._env = None
+        self.needs_reset = True
+        self.step_num = 0
+
+        # Stage objects other than the fixed stage (floor, walls)
+        self.objects = ObjectRegistry()
+        # Reusable object ids for incremental reset. (obj key -> obj id list)
+        self.obj_pool = {}
+        self.obj_keys = {}
+        # Creation arguments of the stage objects (obj id -> (shape, kwargs))
+        self.obj_specs = {}
+        # Merged immovable objects of the episode, and the ids of their bodies
+        self.static_batch = None
+        self.static_batch_ids = []
+        # Batch collecting the immovable objects while locating the objects
+        self.pending_static_batch = None
         
+        # Camera for top view rendering is added on the first get_top_view()
+        self.additional_camera_id = None
+
+    @property
+    def data_path(self):
+        return self.assets.root + "/"
+
+    @property
+    def env(self):
+        if self._env is None:
+            self._build_scene()
+        return self._env
+
+    def _build_scene(self):
+        # rodentia loads OpenGL, so it is imported only when a scene is built
+        import rodentia
+
         # Create environment
-        self.env = rodentia.Environment(
-            width=width,
-            height=height,
+        self._env = rodentia.Environment(
+            width=self.width,
+            height=self.height,
             bg_color=[0.19, 0.3, 0.47],
-            shadow_buffer_width=1024,
-            agent_radius=0.5)
+            shadow_buffer_width=self.render_settings["shadow_buffer_width"],
+            agent_radius=self.physics_settings["agent_radius"])
         
         # Set light direction
-        self.env.set_light(dir=[0.5, -1.0, -0.5],
-                           color=[1.0, 1.0, 1.0],
-                           ambient_color=[0.4, 0.4, 0.4],
-                           shadow_rate=0.2)
+        self._env.set_light(dir=[0.5, -1.0, -0.5],
+                            color=[1.0, 1.0, 1.0],
+                            ambient_color=[0.4, 0.4, 0.4],
+                            shadow_rate=self.render_settings["shadow_rate"])
         
         # Prepare default stage objects (wall, floor)
         self._prepare_fixed_stage()
 
-        # Non fixed stage obj ids
-        self.stage_obj_ids = []
-        
-        # Add additional camera for top view rendering
-        self.additional_camera_id = self.env.add_camera_view(256, 256,
-                                                             bg_color=[0.19, 0.3, 0.47],
-                                                             far=50.0,
-                                                             focal_length=30.0,
-                                                             shadow_buffer_width=1024)
-        
-        # Reset stage
-        self.reset()
+    def ensure_reset(self):
+        # Starts the first episode if reset() has not been called yet
+        if self.needs_reset:
+            self.reset()
 
     def _convert_pos(self, pos, offset_y):
         if pos is not None:
@@ -100,12 +316,12 @@ class AAIEnvironment(gym.Env):
             y = pos.y
             z = pos.z
             if x < 0:
-                x = np.random.rand() * 40
+                x = self.random.random() * 40
             if z < 0:
-                z = np.random.rand() * 40
+                z = self.random.random() * 40
             return [x-20, offset_y + y, -z+20]
         else:
-            return [np.random.rand() * 40 - 20, offset_y, np.random.rand() * 40 - 20]
+            return [self.random.random() * 40 - 20, offset_y, self.random.random() * 40 - 20]
 
     def _convert_pos_inv(self, pos):
         return [pos[0]+20, pos[1], -pos[2]+20]
@@ -116,13 +332,13 @@ class AAIEnvironment(gym.Env):
         elif type(color) is Vector3:
             return [color.x/255.0, color.y/255.0, color.z/255.0]
         else:
-            return [np.random.rand(), np.random.rand(), np.random.rand()]
+            return [self.random.random(), self.random.random(), self.random.random()]
 
     def _convert_rot(self, rot):
         if rot is not None:
             rot = 2.0 * np.pi * -rot / 360.0
         else:
-            rot = np.random.rand() * 2.0 * np.pi
+            rot = self.random.random() * 2.0 * np.pi
         return rot
 
     def _convert_rot_inv(self, rot):
@@ -132,97 +348,176 @@ class AAIEnvironment(gym.Env):
         return rot
         
     def _prepare_fixed_stage(self):
-        # Floor
-        floor_texture_path = self.data_path + "stage/floor.png"
-        
-        self.env.add_box(
-            texture_path=floor_texture_path,
-            half_extent=[20.0, 1.0, 20.0],
-            pos=[0.0, -1.0, 0.0],
-            rot=0.0,
-            detect_collision=False)
-
-        # Wall
+        floor_texture_path = self.assets.path("stage/floor.png")
+        wall_texture_path = self.assets.path("stage/wall.png")
         wall_distance = 20.0
-        
-        wall_texture_path = self.data_path + "stage/wall.png"
+        invisible_wall_half_height = 10.0
 
-        # -Z
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[wall_distance+1, 1.0, 1.0],
-            pos=[0.0, 1.0, -wall_distance],
-            rot=0.0,
-            detect_collision=False)
-        # +Z
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[wall_distance+1, 1.0, 1.0],
-            pos=[0.0, 1.0, wall_distance],
-            rot=0.0,
-            detect_collision=False)
-        # -X
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[1.0, 1.0, wall_distance+1],
-            pos=[-wall_distance, 1.0, 0.0],
-            rot=0.0,
-            detect_collision=False)
-        # +X
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[1.0, 1.0, wall_distance+1],
-            pos=[wall_distance, 1.0, 0.0],
-            rot=0.0,
-            detect_collision=False)
+        # (texture path, half extent, pos, visible)
+        boxes = [
+            # Floor
+            (floor_texture_path, [20.0, 1.0, 20.0], [0.0, -1.0, 0.0], True),
+            # Wall -Z, +Z, -X, +X
+            (wall_texture_path, [wall_distance+1, 1.0, 1.0], [0.0, 1.0, -wall_distance], True),
+            (wall_texture_path, [wall_distance+1, 1.0, 1.0], [0.0, 1.0, wall_distance], True),
+            (wall_texture_path, [1.0, 1.0, wall_distance+1], [-wall_distance, 1.0, 0.0], True),
+            (wall_texture_path, [1.0, 1.0, wall_distance+1], [wall_distance, 1.0, 0.0], True),
+            # Invisible wall -Z, +Z, -X, +X
+            (wall_texture_path, [wall_distance+1, invisible_wall_half_height, 1.0],
+             [0.0, invisible_wall_half_height, -wall_distance], False),
+            (wall_texture_path, [wall_distance+1, invisible_wall_half_height, 1.0],
+             [0.0, invisible_wall_half_height, wall_distance], False),
+            (wall_texture_path, [1.0, invisible_wall_half_height, wall_distance+1],
+             [-wall_distance, invisible_wall_half_height, 0.0], False),
+            (wall_texture_path, [1.0, invisible_wall_half_height, wall_distance+1],
+             [wall_distance, invisible_wall_half_height, 0.0], False),
+        ]
 
-        invisible_wall_half_height = 10.0
-        # -Z (invisible)
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[wall_distance+1, invisible_wall_half_height, 1.0],
-            pos=[0.0, invisible_wall_half_height, -wall_distance],
-            rot=0.0,
-            detect_collision=False,
-            visible=False)
-        # +Z (invisible)
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[wall_distance+1, invisible_wall_half_height, 1.0],
-            pos=[0.0, invisible_wall_half_height, wall_distance],
-            rot=0.0,
-            detect_collision=False,
-            visible=False)
-        # -X (invisible)
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[1.0, invisible_wall_half_height, wall_distance+1],
-            pos=[-wall_distance, invisible_wall_half_height, 0.0],
-            rot=0.0,
-            detect_collision=False,
-            visible=False)
-        # +X (invisible)
-        self.env.add_box(
-            texture_path=wall_texture_path,
-            half_extent=[1.0, invisible_wall_half_height, wall_distance+1],
-            pos=[wall_distance, invisible_wall_half_height, 0.0],
-            rot=0.0,
-            detect_collision=False,
-            visible=False)
+        if self.static_batching:
+            batch = StaticBatch()
+            for texture_path, half_extent, pos, visible in boxes:
+                batch.add_box(half_extent, pos, 0.0, texture_path=texture_path,
+                              visible=visible)
+            self._add_static_batch(batch)
+            return
+
+        for texture_path, half_extent, pos, visible in boxes:
+            self.env.add_box(
+                texture_path=texture_path,
+                half_extent=half_extent,
+                pos=pos,
+                rot=0.0,
+                detect_collision=False,
+                visible=visible)
+
+    def _add_static_batch(self, batch):
+        # Returns the ids of the drawn body, and of the invisible body of the
+        # parts colliding with the triangle mesh if any
+        compound = batch.compound
+        ids = [self.env.add_model(path=batch.write(),
+                                  scale=[1.0, 1.0, 1.0],
+                                  pos=[0.0, 0.0, 0.0],
+                                  rot=0.0,
+                                  mass=0.0,
+                                  detect_collision=False,
+                                  use_mesh_collision=not compound,
+                                  use_collision_file=compound)]
+        mesh_path = batch.mesh_path
+        if mesh_path is not None:
+            ids.append(self.env.add_model(path=mesh_path,
+                                          scale=[1.0, 1.0, 1.0],
+                                          pos=[0.0, 0.0, 0.0],
+                                          rot=0.0,
+                                          mass=0.0,
+                                          detect_collision=False,
+                                          use_mesh_collision=True,
+                                          visible=False))
+        return ids
+
+    def _locate_static_batch(self, batch, reuse):
+        # Replaces the body of the last batch unless it has the same parts and
+        # can be reused
+        if len(self.static_batch_ids) > 0:
+            if reuse and batch.key == self.static_batch.key:
+                self.static_batch = batch
+                return
+            for id in self.static_batch_ids:
+                self.env.remove_obj(id)
+            self.static_batch_ids = []
+
+        self.static_batch = batch
+        if len(batch) > 0:
+            self.static_batch_ids = self._add_static_batch(batch)
         
+    def _to_obj_key(self, value):
+        if isinstance(value, (list, tuple, np.ndarray)):
+            return tuple(float(v) for v in value)
+        elif isinstance(value, (float, np.floating)):
+            return float(value)
+        return value
+
+    def _add_obj(self, shape, pos, rot, fixed=False, **kwargs):
+        if not self.incremental_reset:
+            return self._create_obj(shape, pos=pos, rot=rot, **kwargs)
+
+        # Immovable objects created with the same arguments are interchangeable,
+        # so they can be reused by relocating. Fixed objects are immovable
+        # objects whose pose never changes, and they are reused without
+        # relocating. (Movable objects are never in the pool)
+        key = (shape,) + tuple((name, self._to_obj_key(value))
+                               for name, value in sorted(kwargs.items()))
+        if fixed:
+            key += (self._to_obj_key(pos), self._to_obj_key(rot))
+
+        pooled_ids = self.obj_pool.get(key)
+        if pooled_ids:
+            obj_id = pooled_ids.pop()
+            if not fixed:
+                self.env.locate_object(obj_id, pos, rot)
+            return obj_id
+
+        obj_id = self._create_obj(shape, pos=pos, rot=rot, **kwargs)
+        self.obj_keys[obj_id] = key
+        return obj_id
+
+    def _create_obj(self, shape, pos, rot, **kwargs):
+        if shape == "box":
+            obj_id = self.env.add_box(pos=pos, rot=rot, **kwargs)
+        elif shape == "sphere":
+            obj_id = self.env.add_sphere(pos=pos, rot=rot, **kwargs)
+        else:
+            obj_id = self.env.add_model(pos=pos, rot=rot, **kwargs)
+        self.obj_specs[obj_id] = (shape, kwargs)
+        return obj_id
+
+    def _remove_obj(self, obj_id):
+        self.env.remove_obj(obj_id)
+        self.obj_specs.pop(obj_id, None)
+        self.obj_keys.pop(obj_id, None)
+
+    def _is_movable(self, obj_id):
+        return self.obj_specs[obj_id][1].get("mass", 0.0) > 0.0
+
+    def _set_obj_velocity(self, obj_id, velocity):
+        # rodentia has no API to set velocity directly, so the difference is
+        # applied as an impulse. (Only for movable objects) The impulse is
+        # applied at the center of mass, so the angular velocity can not be
+        # set, and movable objects are created again instead of being reused
+        # when they have to start at rest.
+        if not self._is_movable(obj_id):
+            return
+        mass = self.obj_specs[obj_id][1]["mass"]
+        current_velocity = self.env.get_obj_info(obj_id)["velocity"]
+        velocity_diff = np.asarray(velocity, dtype=np.float32) - current_velocity
+        if np.any(velocity_diff != 0.0):
+            self.env.apply_impulse(obj_id, mass * velocity_diff)
+
+    def _stop_agent(self):
+        # rodentia ignores impulses on the agent, and its velocity only changes
+        # in control(). Without a move action control() brakes the horizontal
+        # velocity with a clamped impulse, so it is repeated until the agent
+        # stops. (The vertical velocity is kept)
+        for i in range(100):
+            velocity = self.env.get_agent_info()["velocity"]
+            if abs(velocity[0]) < 1e-6 and abs(velocity[2]) < 1e-6:
+                break
+            self.env.env.control(id=self.env.agent_id, action=np.zeros(3, dtype=np.int32))
+
     def _locate_agent(self, pos, rot):
         pos = self._convert_pos(pos, 0.5)
         rot = self._convert_rot(rot)
         self.env.locate_agent(pos, rot_y=rot)
+        # Episodes start at rest regardless of the previous one
+        self._stop_agent()
 
     def _locate_goal_obj(self, pos, size, rot, good, bounce, multi):
         if good:
             if multi:
-                texture_path = self.data_path + "misc/good_goal_multi.png"
+                texture_path = self.assets.path("misc/good_goal_multi.png")
             else:
-                texture_path = self.data_path + "misc/good_goal.png"
+                texture_path = self.assets.path("misc/good_goal.png")
         else:
-            texture_path = self.data_path + "misc/bad_goal.png"
+            texture_path = self.assets.path("misc/bad_goal.png")
         
         radius = size.x * 0.5
         pos = self._convert_pos(pos, offset_y=radius)
@@ -230,13 +525,14 @@ class AAIEnvironment(gym.Env):
         impulse = None
         if bounce:
             rot = self._convert_rot(rot)
-            IMPULSE_MAGNITUDE = 10.0
-            impulse = [-IMPULSE_MAGNITUDE * np.sin(rot),
+            impulse_magnitude = self.physics_settings["goal_impulse"]
+            impulse = [-impulse_magnitude * np.sin(rot),
                        0,
-                       -IMPULSE_MAGNITUDE * np.cos(rot)]
+                       -impulse_magnitude * np.cos(rot)]
         
-        ball_mass = 0.5
-        obj_id = self.env.add_sphere(
+        ball_mass = self.physics_settings["goal_mass"]
+        obj_id = self._add_obj(
+            "sphere",
             texture_path=texture_path,
             radius=radius,
             pos=pos,
@@ -246,83 +542,124 @@ class AAIEnvironment(gym.Env):
 
         if impulse is not None:
             self.env.apply_impulse(obj_id, impulse)
+
+        if not good:
+            obj_type = OBJ_TYPE_BAD_GOAL
+        elif multi:
+            obj_type = OBJ_TYPE_GOOD_GOAL_MULTI
+        else:
+            obj_type = OBJ_TYPE_GOOD_GOAL
         
         # TODO: Change reward depending on the goal size?
-        if good:
-            self.reward_table[obj_id] = 1
-        if not multi:
-            self.terminate_obj_ids.add(obj_id)
-        self.stage_obj_ids.append(obj_id)
+        self.objects.add(obj_id,
+                         obj_type,
+                         reward=1 if good else 0,
+                         terminate=not multi)
 
     def _locate_wall_obj(self, pos, rot, color, size):
+        fixed = rot is not None and type(color) in (RGB, Vector3)
         pos = [pos.x-20, pos.y + size.y*0.5, -pos.z+20]
         color = self._convert_color(color)
         half_extent = [size.x*0.5, size.y*0.5, size.z*0.5]
         rot = self._convert_rot(rot)
+
+        if fixed and self.pending_static_batch is not None:
+            self.pending_static_batch.add_box(half_extent, pos, rot, color=color,
+                                              kind=OBJ_TYPE_WALL)
+            return
             
-        obj_id = self.env.add_box(
+        obj_id = self._add_obj(
+            "box",
+            fixed=fixed,
             color=color,
             half_extent=half_extent,
             pos=pos,
             rot=rot,
             mass=0.0,
             detect_collision=False)
-        self.stage_obj_ids.append(obj_id)
+        self.objects.add(obj_id, OBJ_TYPE_WALL)
 
     def _locate_ramp_obj(self, pos, rot, color, size):
+        fixed = rot is not None and type(color) in (RGB, Vector3)
         pos = [pos.x-20, pos.y, -pos.z+20]
         rot = self._convert_rot(rot)
         color = self._convert_color(color)
         scale = [size.x*0.5, size.y*0.5, size.z*0.5]
         
-        model_path = self.data_path + "immovable/ramp.obj"
-        obj_id = self.env.add_model(path=model_path,
-                                    scale=scale,
-                                    pos=pos,
-                                    rot=rot,
-                                    mass=0.0,
-                                    color=color,
-                                    detect_collision=False,
-                                    use_mesh_collision=True)
-        self.stage_obj_ids.append(obj_id)
+        model_path = self.assets.path("immovable/ramp.obj")
+        if fixed and self.pending_static_batch is not None:
+            self.pending_static_batch.add_model(model_path, scale, pos, rot, color=color,
+                                                kind=OBJ_TYPE_RAMP)
+            return
+
+        obj_id = self._add_obj("model",
+                               fixed=fixed,
+                               path=model_path,
+                               scale=scale,
+                               pos=pos,
+                               rot=rot,
+                               mass=0.0,
+                               color=color,
+                               detect_collision=False,
+                               use_mesh_collision=True)
+        self.objects.add(obj_id, OBJ_TYPE_RAMP)
 
     def _locate_cylinder_obj(self, pos, rot, size):
+        fixed = rot is not None
         pos = [pos.x-20, pos.y, -pos.z+20]
         rot = self._convert_rot(rot)
         scale = [size.x*0.5, size.y*0.5, size.z*0.5]
         
-        model_path = self.data_path + "immovable/cylinder.obj"
-        obj_id = self.env.add_model(path=model_path,
-                                    scale=scale,
-                                    pos=pos,
-                                    rot=rot,
-                                    mass=0.0,
-                                    detect_collision=False,
-                                    use_mesh_collision=True)
-        self.stage_obj_ids.append(obj_id)
+        # The simplified mesh of the level is drawn only when the boxes of its
+        # .col file collide, so that the collision does not depend on the level
+        use_proxy = self.physics_settings["tunnel_collision_proxy"]
+        if use_proxy:
+            model_path = self.assets.draw_path("immovable/cylinder.obj")
+        else:
+            model_path = self.assets.path("immovable/cylinder.obj")
+        if fixed and self.pending_static_batch is not None:
+            collision_path = os.path.splitext(model_path)[0] + ".col" if use_proxy else None
+            self.pending_static_batch.add_model(model_path, scale, pos, rot,
+                                                collision_path=collision_path,
+                                                kind=OBJ_TYPE_CYLINDER_TUNNEL)
+            return
+
+        obj_id = self._add_obj("model",
+                               fixed=fixed,
+                               path=model_path,
+                               scale=scale,
+                               pos=pos,
+                               rot=rot,
+                               mass=0.0,
+                               detect_collision=False,
+                               use_mesh_collision=not use_proxy,
+                               use_collision_file=use_proxy)
+        self.objects.add(obj_id, OBJ_TYPE_CYLINDER_TUNNEL)
 
     def _locate_zone_obj(self, pos, rot, size, death):
+        fixed = rot is not None
         pos = [pos.x-20, pos.y+0.01, -pos.z+20]
         rot = self._convert_rot(rot)
         half_extent = [size.x*0.5, 0.01, size.z*0.5]
 
         if death:
-            texture_path = self.data_path + "immovable/death_zone.png"
+            texture_path = self.assets.path("immovable/death_zone.png")
         else:
-            texture_path = self.data_path + "immovable/hot_zone.png"
+            texture_path = self.assets.path("immovable/hot_zone.png")
         
-        obj_id = self.env.add_box(
+        obj_id = self._add_obj(
+            "box",
+            fixed=fixed,
             texture_path=texture_path,
             half_extent=half_extent,
             pos=pos,
             rot=rot,
             mass=0.0,
             detect_collision=True)
-        self.stage_obj_ids.append(obj_id)
         if not death:
-            self.hot_zone_obj_ids.add(obj_id)
+            self.objects.add(obj_id, OBJ_TYPE_HOT_ZONE, hot_zone=True)
         else:
-            self.terminate_obj_ids.add(obj_id)
+            self.objects.add(obj_id, OBJ_TYPE_DEATH_ZONE, terminate=True)
 
     def _locate_cardbox_obj(self, pos, rot, size, light):
         pos = [pos.x-20, pos.y + size.y*0.5, -pos.z+20]
@@ -332,13 +669,16 @@ class AAIEnvironment(gym.Env):
         rot = self._convert_rot(rot)
         
         if light:
-            model_path = self.data_path + "movable/cardbox1.obj"
-            mass = 1.0
+            model_path = self.assets.path("movable/cardbox1.obj")
+            mass = self.physics_settings["cardbox1_mass"]
+            obj_type = OBJ_TYPE_CARDBOX1
         else:
-            model_path = self.data_path + "movable/cardbox2.obj"
-            mass = 2.0
+            model_path = self.assets.path("movable/cardbox2.obj")
+            mass = self.physics_settings["cardbox2_mass"]
+            obj_type = OBJ_TYPE_CARDBOX2
             
-        obj_id = self.env.add_model(
+        obj_id = self._add_obj(
+            "model",
             path=model_path,
             scale=scale,
             pos=pos,
@@ -346,7 +686,7 @@ class AAIEnvironment(gym.Env):
             mass=mass,
             detect_collision=False,
             use_mesh_collision=False)
-        self.stage_obj_ids.append(obj_id)
+        self.objects.add(obj_id, obj_type)
 
     def _locate_luobject_obj(self, pos, rot, size, lu_type):
         # TODO:
@@ -358,22 +698,26 @@ class AAIEnvironment(gym.Env):
                  size.z*0.3]
         
         if lu_type == LU_TYPE_L:
-            model_path = self.data_path + "movable/lobject.obj"
+            model_path = self.assets.path("movable/lobject.obj")
+            obj_type = OBJ_TYPE_LOBJECT
         elif lu_type == LU_TYPE_L2:
-            model_path = self.data_path + "movable/lobject2.obj"
+            model_path = self.assets.path("movable/lobject2.obj")
+            obj_type = OBJ_TYPE_LOBJECT2
         elif lu_type == LU_TYPE_U:
-            model_path = self.data_path + "movable/uobject.obj"
+            model_path = self.assets.path("movable/uobject.obj")
+            obj_type = OBJ_TYPE_UOBJECT
             
-        mass = 1.0
-        obj_id = self.env.add_model(path=model_path,
-                                    scale=scale,
-                                    pos=pos,
-                                    rot=rot,
-                                    mass=mass,
-                                    detect_collision=False,
-                                    use_mesh_collision=False,
-                                    use_collision_file=True)
-        self.stage_obj_ids.append(obj_id)
+        mass = self.physics_settings["luobject_mass"]
+        obj_id = self._add_obj("model",
+                               path=model_path,
+                               scale=scale,
+                               pos=pos,
+                               rot=rot,
+                               mass=mass,
+                               detect_collision=False,
+                               use_mesh_collision=False,
+                               use_collision_file=True)
+        self.objects.add(obj_id, obj_type)
 
     def get_item_element_size(self, item):
         return np.max([len(item.positions),
@@ -405,11 +749,74 @@ class AAIEnvironment(gym.Env):
         else:
             return None
 
-    def reset(self):
+    def _load_task(self, task_id, arena_index):
+        self._load_arena(get_arena(task_id, arena_index), task_id, arena_index)
+
+    def _load_arena(self, arena, task_id=None, arena_index=None):
+        # task_id and arena_index are None for the arenas not in the catalog
+        self.task_id = task_id
+        self.arena_index = arena_index
+        self.arena = arena
+        self.blackout = Blackout(arena.blackouts, arena.t)
+
+    def _select_task(self):
+        # Called before every reset to choose the task of the next episode
+        if self.arena_generator is not None:
+            self._load_arena(self.arena_generator(self.random))
+
+    def seed(self, seed=None):
+        self.random = np.random.default_rng(seed)
+        return [seed]
+
+    def set_task(self, task_id, arena_index=0):
+        # Switch to another arena reusing the rodentia environment, fixed stage
+        # and cameras. Returns the first observation of the new task.
+        self._load_task(task_id, arena_index)
+        return self._reset_with_profile()
+
+    def set_arena(self, arena):
+        # Same as set_task() with an Arena object. (e.g. from ArenaGenerator)
+        self._load_arena(arena)
+        return self._reset_with_profile()
+
+    def reset(self, arena=None):
+        if arena is not None:
+            self._load_arena(arena)
+        else:
+            self._select_task()
+        return self._reset_with_profile()
+
+    def _reset_with_profile(self):
+        if self.profiler is None:
+            return self._reset()
+
+        self.profiler.start()
+        obs = self._reset()
+        self.profiler.stop(EVENT_RESET)
+        return obs
+
+    def _mark(self, phase):
+        if self.profiler is not None:
+            self.profiler.mark(phase)
+
+    def get_profile(self):
+        # Summary of the rolling phase timings (in seconds)
+        if self.profiler is None:
+            return None
+        return self.profiler.summary()
+
+    def clear_profile(self):
+        if self.profiler is not None:
+            self.profiler.clear()
+
+    def _reset(self, render=True):
         self.step_num = 0 
+        self.needs_reset = False
         
         # First clear remaining reward objects
         self._clear_objects()
+        if self.static_batching and self.arena_generator is None:
+            self.pending_static_batch = StaticBatch()
         
         for item in self.arena.items:
             if item.name == "Agent":
@@ -495,21 +902,46 @@ class AAIEnvironment(gym.Env):
                     elif item.name == "UObject":
                         lu_type = LU_TYPE_U
                     self._locate_luobject_obj(pos, rot, size, lu_type)
+
+        if self.pending_static_batch is not None:
+            self._locate_static_batch(self.pending_static_batch,
+                                      reuse=self.incremental_reset)
+            self.pending_static_batch = None
+
+        # Remove pooled objects which were not reused in this episode
+        self._clear_obj_pool()
+        self._mark(PHASE_OBJECTS)
                 
         # Reset environment and get screen
-        obs = self.env.step(action=[0, 0, 0])
-        screen = obs["screen"]
-        return screen
+        self._step_physics(np.zeros(3, dtype=np.int32))
+        self._mark(PHASE_PHYSICS)
+        if self.obs_type == OBS_TYPE_STATE:
+            obs = self._get_state()
+        elif not render:
+            return None
+        else:
+            screen = self._render_screen()
+            self._mark(PHASE_RENDER)
+            obs = self._process_screen(screen)
+        self._mark(PHASE_OBSERVATION)
+        return obs
 
     def _clear_objects(self):
         # Remove object from the environment
-        for id in self.stage_obj_ids:
-            self.env.remove_obj(id)
+        for id in self.objects.ids.tolist():
+            if self.incremental_reset and not self._is_movable(id):
+                # Keep the object for reuse in the next episode
+                self.obj_pool.setdefault(self.obj_keys[id], []).append(id)
+            else:
+                self._remove_obj(id)
+
+        self.objects.clear()
 
-        self.stage_obj_ids = []
-        self.reward_table = {}
-        self.terminate_obj_ids = set()
-        self.hot_zone_obj_ids = set()
+    def _clear_obj_pool(self):
+        for obj_ids in self.obj_pool.values():
+            for id in obj_ids:
+                self._remove_obj(id)
+        self.obj_pool = {}
 
     def _calc_hotzone_damage(self):
         # TODO: Calculate damage based on elapsed time.
@@ -542,42 +974,165 @@ class AAIEnvironment(gym.Env):
             self._convert_pos_inv(global_pos), \
             self._convert_rot_inv(global_rot_y)
         
+    def _step_physics(self, real_action):
+        # Same as rodentia.Environment.step() except that the screen is not
+        # rendered. Returns the ids of the objects collided with the agent.
+        self.env.env.control(id=self.env.agent_id, action=real_action)
+        collision_ids = self.env.env.step()
+        return collision_ids.get(self.env.agent_id, [])
+
+    def _render_screen(self):
+        agent_info = self.env.get_agent_info()
+        ret = self.env.render(self.env.main_camera_id,
+                              pos=agent_info["pos"],
+                              rot=agent_info["rot"],
+                              ignore_ids=[self.env.agent_id])
+        return ret["screen"]
+
+    def _get_raw_screen(self):
+        blacked_out = self.blackout.is_blacked_out(self.step_num)
+        self._mark(PHASE_BLACKOUT)
+        if blacked_out:
+            # Black out screen without rendering
+            return None
+        screen = self._render_screen()
+        self._mark(PHASE_RENDER)
+        return screen
+
+    def _get_screen(self, prev_screen=None):
+        screen = self._get_raw_screen()
+        # Blacked out last step is black without pooling the previous one
+        if prev_screen is not None and screen is not None:
+            screen = np.maximum(screen, prev_screen)
+        return self._process_screen(screen)
+
+    def _process_screen(self, screen):
+        # screen is None when blacked out
+        if self.screen_processor.is_identity:
+            if screen is None:
+                return self.black_screen
+            return screen
+        if screen is None:
+            return self.screen_processor.process_black()
+        return self.screen_processor.process(screen)
+
+    def set_obs_buffer(self, obs_buffer):
+        # Screen observations will be written into obs_buffer. (None to disable)
+        self.screen_processor.set_buffer(obs_buffer)
+
+    def _get_state(self):
+        agent_local_velociy, agent_global_pos, agent_global_rot_y = self._get_agent_info()
+
+        agent = np.empty(7, dtype=np.float32)
+        agent[0:3] = agent_global_pos
+        agent[3] = agent_global_rot_y
+        agent[4:7] = agent_local_velociy
+
+        object_pos = np.zeros((self.max_objects, 3), dtype=np.float32)
+        object_type = np.zeros(self.max_objects, dtype=np.int32)
+        object_reward = np.zeros(self.max_objects, dtype=np.float32)
+        object_terminal = np.zeros(self.max_objects, dtype=np.int8)
+
+        objects = self.objects.as_arrays()
+        ids = objects["id"][:self.max_objects]
+        num_objects = len(ids)
+        object_type[:num_objects] = objects["kind"][:num_objects]
+        object_reward[:num_objects] = objects["reward"][:num_objects]
+        object_terminal[:num_objects] = objects["terminate"][:num_objects]
+        for i, id in enumerate(ids.tolist()):
+            obj_info = self.env.get_obj_info(id)
+            object_pos[i] = self._convert_pos_inv(obj_info["pos"])
+
+        # Objects merged into the static batch follow the other objects
+        if self.static_batch is not None and len(self.static_batch.kinds) > 0:
+            num_batched = min(len(self.static_batch.kinds), self.max_objects - num_objects)
+            batched = slice(num_objects, num_objects + num_batched)
+            object_type[batched] = self.static_batch.kinds[:num_batched]
+            for i, pos in enumerate(self.static_batch.positions[:num_batched]):
+                object_pos[num_objects + i] = self._convert_pos_inv(pos)
+
+        state = {}
+        state["agent"] = agent
+        state["object_pos"] = object_pos
+        state["object_type"] = object_type
+        state["object_reward"] = object_reward
+        state["object_terminal"] = object_terminal
+        return state
+
+    def _process_collisions(self, collided):
+        if len(collided) == 0:
+            return 0, False
+
+        reward, terminal, collected_ids, num_hot_zones = \
+            self.objects.process_collisions(collided)
+
+        for id in collected_ids.tolist():
+            # Remove object from the environment
+            self.objects.remove(id)
+            self._remove_obj(id)
+
+        if num_hot_zones > 0:
+            reward -= self._calc_hotzone_damage() * num_hot_zones
+
+        return reward, terminal
+
     def step(self, action):
+        self.ensure_reset()
+
+        profiler = self.profiler
+        if profiler is not None:
+            profiler.start()
+
         real_action = self._convert_to_real_action(action)
-        obs = self.env.step(action=real_action)
-        self.step_num += 1
-        
-        screen = obs["screen"]
-        collided = obs["collided"]
-        
-        # Check collision
+        self._mark(PHASE_ACTION)
+
         reward = 0
         terminal = False
-        
-        if len(collided) != 0:
-            for id in collided:
-                if id in self.reward_table:
-                    reward += self.reward_table[id]
-                    # Remove from reward table
-                    del self.reward_table[id]
-                    # Remove from stage object ids
-                    self.stage_obj_ids.remove(id)
-                    # Remove object from the environment
-                    self.env.remove_obj(id)
-                    
-                if id in self.hot_zone_obj_ids:
-                    reward -= self._calc_hotzone_damage()
-                if id in self.terminate_obj_ids:
-                    terminal = True
-
-        if not terminal and self.step_num >= self.arena.t:
-            # Time out
-            terminal = True
-            
+        prev_screen = None
+
+        # Repeat the action for frame_skip physics steps. The screen is rendered
+        # only for the last step (and the one before it when max pooling).
+        for i in range(self.frame_skip):
+            collided = self._step_physics(real_action)
+            self.step_num += 1
+            self._mark(PHASE_PHYSICS)
+
+            # Check collision
+            step_reward, terminal = self._process_collisions(collided)
+            reward += step_reward
+            self._mark(PHASE_COLLISION)
+
+            if not terminal and self.step_num >= self.arena.t:
+                # Time out
+                terminal = True
+
+            if terminal:
+                break
+
+            if self.max_pool_frames and self.obs_type == OBS_TYPE_SCREEN and \
+               i == self.frame_skip - 2:
+                prev_screen = self._get_raw_screen()
+
         if terminal:
-            screen = self.reset()
+            # Phases of the auto reset are counted as one phase
+            if profiler is not None:
+                profiler.enter()
+            self._select_task()
+            if self.obs_type == OBS_TYPE_SCREEN and self.blackout.is_blacked_out(0):
+                self._reset(render=False)
+                obs = self._process_screen(None)
+            else:
+                obs = self._reset()
+            if profiler is not None:
+                profiler.exit(PHASE_AUTO_RESET)
+        elif self.obs_type == OBS_TYPE_STATE:
+            obs = self._get_state()
+        else:
+            obs = self._get_screen(prev_screen)
+        self._mark(PHASE_OBSERVATION)
 
         agent_local_velociy, agent_global_pos, agent_global_rot_y = self._get_agent_info()
+        self._mark(PHASE_AGENT_INFO)
         
         info = {}
         info["local_velocity"] = agent_local_velociy
@@ -585,15 +1140,101 @@ class AAIEnvironment(gym.Env):
             # Set global position and rotation for debug purpose
             info["global_pos"] = agent_global_pos
             info["global_rot"] = agent_global_rot_y
+
+        if profiler is not None:
+            profiler.stop(EVENT_STEP)
         
-        if self.blackout.is_blacked_out(self.step_num):
-            # Black out screen
-            screen = np.zeros_like(screen)
-        
-        return screen, reward, terminal, info
+        return obs, reward, terminal, info
     
 
+    def save_state(self):
+        """ Returns a snapshot of the current episode for restore_state(). """
+        self.ensure_reset()
+        agent_info = self.env.get_agent_info()
+
+        objects = []
+        for id in self.objects.ids.tolist():
+            obj_info = self.env.get_obj_info(id)
+            objects.append((id,
+                            self.obj_specs[id],
+                            self.obj_keys.get(id),
+                            self.objects.get(id),
+                            obj_info["pos"],
+                            obj_info["rot"],
+                            obj_info["velocity"]))
+
+        state = {}
+        state["task_id"] = self.task_id
+        state["arena_index"] = self.arena_index
+        state["arena"] = self.arena
+        state["step_num"] = self.step_num
+        state["agent_pos"] = agent_info["pos"]
+        state["agent_rot_y"] = agent_info["rot_y"]
+        state["agent_velocity"] = agent_info["velocity"]
+        state["objects"] = objects
+        state["static_batch"] = self.static_batch
+        state["random_state"] = self.random.bit_generator.state
+        return state
+
+    def restore_state(self, state):
+        """
+        Restores a snapshot taken by save_state().
+        Objects removed after the snapshot are created again. The restore is
+        exact for a snapshot of the agent and the objects at rest, and
+        approximate otherwise: the agent is restored at rest, and movable
+        objects are created again with their linear velocity but without spin.
+        """
+        if state["arena"] is not self.arena:
+            self._load_arena(state["arena"], state["task_id"], state["arena_index"])
+
+        # Immovable objects which still exist are relocated, and the others are
+        # created again. (Movable objects can not be relocated without spin)
+        reused_ids = set()
+        for obj in state["objects"]:
+            id, spec = obj[0], obj[1]
+            if id in self.objects and self.obj_specs.get(id) == spec and \
+               not self._is_movable(id):
+                reused_ids.add(id)
+
+        for id in self.objects.ids.tolist():
+            if id not in reused_ids:
+                self._remove_obj(id)
+        self.objects.clear()
+
+        for id, spec, key, properties, pos, rot, velocity in state["objects"]:
+            if id in reused_ids:
+                self.env.locate_object(id, pos, rot)
+            else:
+                shape, kwargs = spec
+                id = self._create_obj(shape, pos=pos, rot=rot, **kwargs)
+                if key is not None:
+                    self.obj_keys[id] = key
+            kind, reward, terminate, hot_zone = properties
+            self.objects.add(id, kind, reward=reward, terminate=terminate,
+                             hot_zone=hot_zone)
+            self._set_obj_velocity(id, velocity)
+
+        if state["static_batch"] is not None:
+            self._locate_static_batch(state["static_batch"], reuse=True)
+
+        self.env.locate_agent(state["agent_pos"], rot_y=state["agent_rot_y"])
+        self._stop_agent()
+        self.step_num = state["step_num"]
+        self.needs_reset = False
+        self.random.bit_generator.state = state["random_state"]
+
     def get_top_view(self):
+        self.ensure_reset()
+        if self.additional_camera_id is None:
+            # Add additional camera for top view rendering
+            shadow_buffer_width = self.render_settings["top_view_shadow_buffer_width"]
+            self.additional_camera_id = self.env.add_camera_view(
+                256, 256,
+                bg_color=[0.19, 0.3, 0.47],
+                far=50.0,
+                focal_length=30.0,
+                shadow_buffer_width=shadow_buffer_width)
+
         # Capture stage image from the top view
         pos = [0, 40, 0]
         rot_x = -np.pi * 0.5
@@ -601,3 +1242,38 @@ class AAIEnvironment(gym.Env):
 
         ret = self.env.render(self.additional_camera_id, pos, rot)
         return ret["screen"]
+
+
+class MultiTaskAAIEnvironment(AAIEnvironment):
+    """
+    Environment which samples the task of each episode from a list of tasks.
+    Each element of tasks is a task_id or a (task_id, arena_index) tuple.
+    """
+
+    def __init__(self, tasks, seed=None, **kwargs):
+        if len(tasks) == 0:
+            raise ValueError("tasks must not be empty")
+        self.tasks = [(task, 0) if isinstance(task, str) else tuple(task)
+                      for task in tasks]
+        self.task_random = np.random.default_rng(seed)
+
+        task_id, arena_index = self.tasks[0]
+        super().__init__(task_id=task_id, arena_index=arena_index, seed=seed, **kwargs)
+
+    def seed(self, seed=None):
+        self.task_random = np.random.default_rng(seed)
+        return super().seed(seed)
+
+    def save_state(self):
+        state = super().save_state()
+        state["task_random_state"] = self.task_random.bit_generator.state
+        return state
+
+    def restore_state(self, state):
+        super().restore_state(state)
+        self.task_random.bit_generator.state = state["task_random_state"]
+
+    def _select_task(self):
+        task_id, arena_index = self.tasks[self.task_random.integers(len(self.tasks))]
+        if task_id != self.task_id or arena_index != self.arena_index:
+            self._load_task(task_id, arena_index)
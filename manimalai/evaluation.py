@@ -0,0 +1,309 @@
+"""
+Evaluation of a policy over the arena configurations.
+
+    python -m manimalai.evaluation my_agent:make_policy --policy-id ckpt100 --workers 8
+
+Each episode is scored against the pass_mark of its arena. Results are cached
+per (task, arena, seed, policy id, env_kwargs), so an interrupted evaluation
+resumes from the remaining episodes when it is run again.
+"""
+import argparse
+import concurrent.futures
+import importlib
+import json
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+from .environment import AAIEnvironment
+from .task_catalog import get_catalog, get_cache_dir
+
+
+def load_policy_factory(spec):
+    """ Returns the object named by "module:attr". """
+    module_name, _, attr = spec.partition(":")
+    if attr == "":
+        raise ValueError("Policy must be given as module:attr: {}".format(spec))
+    module = importlib.import_module(module_name)
+    return getattr(module, attr)
+
+
+class RandomPolicy:
+    """ Baseline policy choosing uniformly random actions. """
+
+    def __init__(self, seed=None):
+        self.random = np.random.RandomState(seed)
+
+    def reset(self, seed=None):
+        if seed is not None:
+            self.random.seed(seed)
+
+    def __call__(self, observation):
+        return self.random.randint(0, 3, size=2)
+
+
+def is_passed(episode_return, pass_mark):
+    return episode_return >= pass_mark
+
+
+def get_max_return(info):
+    """
+    Largest return of the arena of info (ArenaInfo). Each good goal gives 1.
+    Touching a GoodGoal ends the episode, so only one of them counts, after
+    all the GoodGoalMulti.
+    """
+    counts = info.item_counts
+    num_multi = counts.get("GoodGoalMulti", 0) + counts.get("GoodGoalMultiBounce", 0)
+    num_single = counts.get("GoodGoal", 0) + counts.get("GoodGoalBounce", 0)
+    return float(num_multi + min(num_single, 1))
+
+
+def is_reachable(info):
+    # Whether the pass_mark of the arena can be reached at all
+    return is_passed(get_max_return(info), info.pass_mark)
+
+
+def get_episode_seed(task_id, arena_index, seed):
+    # Seed of an episode derived from its result key, so that an episode runs
+    # the same in any worker and after any other episodes
+    return zlib.crc32("{}_{}_{}".format(task_id, arena_index, seed).encode("utf-8"))
+
+
+def run_episode(env, policy, task_id, arena_index, seed):
+    # Seed of the random item placements and of the policy
+    episode_seed = get_episode_seed(task_id, arena_index, seed)
+    env.seed(episode_seed)
+    observation = env.set_task(task_id, arena_index)
+    if hasattr(policy, "reset"):
+        policy.reset(episode_seed)
+
+    episode_return = 0.0
+    steps = 0
+    while True:
+        action = policy(observation)
+        observation, reward, terminal, _ = env.step(action)
+        episode_return += reward
+        steps += 1
+        if terminal:
+            break
+    return float(episode_return), steps
+
+
+# Objects of each worker process
+_worker_env = None
+_worker_policy = None
+
+
+def _init_worker(policy_spec, env_kwargs):
+    global _worker_env, _worker_policy
+    factory = load_policy_factory(policy_spec) if isinstance(policy_spec, str) \
+        else policy_spec
+    _worker_policy = factory()
+    _worker_env = AAIEnvironment(**env_kwargs)
+
+
+def _evaluate_job(job):
+    task_id, arena_index, seed = job
+    start = time.perf_counter()
+    episode_return, steps = run_episode(_worker_env, _worker_policy,
+                                        task_id, arena_index, seed)
+    return episode_return, steps, time.perf_counter() - start
+
+
+class Evaluator:
+    """
+    Runs a policy on a process pool over the given arenas and seeds.
+
+    policy is a "module:attr" string or a picklable callable, which is called
+    once in each worker to create the policy. The policy maps an observation
+    to an action, and its reset(seed) is called at the start of each episode
+    if it exists, with the seed of the episode (get_episode_seed()) to seed
+    its random numbers.
+    """
+
+    def __init__(self,
+                 policy,
+                 policy_id=None,
+                 result_dir=None,
+                 num_workers=None,
+                 env_kwargs=None):
+        if policy_id is None:
+            if not isinstance(policy, str):
+                raise ValueError("policy_id is required when policy is not a string")
+            policy_id = policy
+        self.policy = policy
+        self.policy_id = policy_id
+        if result_dir is None:
+            result_dir = os.path.join(get_cache_dir(), "evaluation")
+        self.num_workers = num_workers or os.cpu_count()
+        self.env_kwargs = dict(env_kwargs or {})
+        # Results of other environment settings are kept apart
+        key = zlib.crc32(repr(sorted(self.env_kwargs.items())).encode("utf-8"))
+        self.result_dir = os.path.join(result_dir, policy_id.replace(os.sep, "_"),
+                                       "env-{:08x}".format(key))
+
+    def _result_path(self, task_id, arena_index, seed):
+        return os.path.join(self.result_dir,
+                            "{}_{}_{}.json".format(task_id, arena_index, seed))
+
+    def load_result(self, task_id, arena_index, seed):
+        path = self._result_path(task_id, arena_index, seed)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except ValueError:
+            # Broken file of an interrupted write is evaluated again
+            return None
+
+    def _save_result(self, result):
+        os.makedirs(self.result_dir, exist_ok=True)
+        path = self._result_path(result["task_id"], result["arena_index"], result["seed"])
+        tmp_path = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp_path, "w") as f:
+            json.dump(result, f)
+        os.replace(tmp_path, path)
+
+    def run(self, infos, seeds=(0,), log=None):
+        """ Evaluates the arenas of infos (ArenaInfo list) and returns the results. """
+        results = []
+        jobs = []
+        for info in infos:
+            for seed in seeds:
+                result = self.load_result(info.task_id, info.arena_index, seed)
+                if result is not None:
+                    results.append(result)
+                else:
+                    jobs.append((info, seed))
+
+        if log is not None:
+            log("{} episodes cached, {} to run".format(len(results), len(jobs)))
+        if len(jobs) == 0:
+            return results
+
+        with concurrent.futures.ProcessPoolExecutor(
+                max_workers=min(self.num_workers, len(jobs)),
+                initializer=_init_worker,
+                initargs=(self.policy, self.env_kwargs)) as executor:
+            futures = {executor.submit(_evaluate_job,
+                                       (info.task_id, info.arena_index, seed)): (info, seed)
+                       for info, seed in jobs}
+            for future in concurrent.futures.as_completed(futures):
+                info, seed = futures[future]
+                episode_return, steps, elapsed = future.result()
+                result = {
+                    "task_id": info.task_id,
+                    "arena_index": info.arena_index,
+                    "category": info.category,
+                    "seed": seed,
+                    "episode_seed": get_episode_seed(info.task_id, info.arena_index, seed),
+                    "policy_id": self.policy_id,
+                    "return": episode_return,
+                    "steps": steps,
+                    "pass_mark": info.pass_mark,
+                    "max_return": get_max_return(info),
+                    "reachable": is_reachable(info),
+                    "passed": is_passed(episode_return, info.pass_mark),
+                    "time": elapsed,
+                }
+                # Saved as soon as finished so that the run can be resumed
+                self._save_result(result)
+                results.append(result)
+                if log is not None:
+                    log("{} [{}] seed={}: return={:.3f} passed={}".format(
+                        info.task_id, info.arena_index, seed, episode_return,
+                        result["passed"]))
+        return results
+
+
+def summarize(results):
+    """
+    Pass rates and mean returns per category and in total. Episodes of the
+    arenas whose pass_mark can not be reached are excluded from the pass
+    rates, and listed in "unreachable".
+    """
+    def stats(group):
+        scored = [r for r in group if r["reachable"]]
+        return {
+            "num_episodes": len(group),
+            "num_unreachable": len(group) - len(scored),
+            "num_passed": sum(1 for r in scored if r["passed"]),
+            "pass_rate": float(np.mean([r["passed"] for r in scored]))
+                         if len(scored) > 0 else None,
+            "mean_return": float(np.mean([r["return"] for r in group])),
+        }
+
+    categories = {}
+    for result in results:
+        categories.setdefault(result["category"], []).append(result)
+
+    summary = {"categories": {}}
+    for category in sorted(categories.keys(), key=int):
+        summary["categories"][category] = stats(categories[category])
+    if len(results) > 0:
+        summary["total"] = stats(results)
+    unreachable = sorted(set((r["task_id"], r["arena_index"], r["pass_mark"], r["max_return"])
+                             for r in results if not r["reachable"]))
+    summary["unreachable"] = [{"task_id": task_id,
+                               "arena_index": arena_index,
+                               "pass_mark": pass_mark,
+                               "max_return": max_return}
+                              for task_id, arena_index, pass_mark, max_return in unreachable]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate a policy over the ManimalAI tasks")
+    parser.add_argument("policy",
+                        help="module:attr of a callable creating the policy "
+                        "(e.g. manimalai.evaluation:RandomPolicy)")
+    parser.add_argument("--policy-id", default=None,
+                        help="name of the results cache (default: policy)")
+    parser.add_argument("--tasks", nargs="+", default=None)
+    parser.add_argument("--category", type=int, default=None)
+    parser.add_argument("--seeds", type=int, nargs="+", default=[0])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--width", type=int, default=84)
+    parser.add_argument("--height", type=int, default=84)
+    parser.add_argument("--result-dir", default=None,
+                        help="directory of the cached results "
+                        "(default: evaluation in the manimalai cache directory)")
+    parser.add_argument("--output", default=None,
+                        help="path of the JSON summary (default: stdout)")
+    args = parser.parse_args(argv)
+
+    catalog = get_catalog()
+    if args.tasks:
+        infos = [catalog.get_info(task_id, arena_index)
+                 for task_id in args.tasks
+                 for arena_index in catalog.arena_indices(task_id)]
+    else:
+        infos = catalog.all_infos(args.category)
+
+    sys.path.insert(0, os.getcwd())
+    evaluator = Evaluator(args.policy,
+                          policy_id=args.policy_id,
+                          result_dir=args.result_dir,
+                          num_workers=args.workers,
+                          env_kwargs={"width": args.width, "height": args.height})
+
+    def log(message):
+        print(message, file=sys.stderr)
+
+    results = evaluator.run(infos, seeds=args.seeds, log=log)
+    summary = summarize(results)
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        print()
+
+
+if __name__ == '__main__':
+    main()
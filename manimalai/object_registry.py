@@ -0,0 +1,166 @@
+import numpy as np
+
+
+class ObjectRegistry:
+    """
+    Properties of the stage objects stored in dense arrays.
+
+    Each object id is mapped to a slot in registration order with an int
+    array over the range of the ids added since the last clear(), so the
+    queries are array lookups. Removed objects leave their slot dead in the
+    liveness mask, and the dead slots are compacted away when the slots run
+    out (the arrays grow by doubling when they are mostly alive).
+    Objects with non-zero reward are collected (removed) when the agent touches
+    them.
+    """
+
+    def __init__(self, capacity=64):
+        self.capacity = 0
+        # Number of the used slots, including the dead ones
+        self.size = 0
+        self.num_alive = 0
+        self.slot_ids = np.zeros(0, dtype=np.int64)
+        self.alive = np.zeros(0, dtype=np.bool_)
+        self.kinds = np.zeros(0, dtype=np.int32)
+        self.rewards = np.zeros(0, dtype=np.float32)
+        self.terminates = np.zeros(0, dtype=np.bool_)
+        self.hot_zones = np.zeros(0, dtype=np.bool_)
+        self._grow(max(capacity, 1))
+        # Slot of id (id_base + i) at i, -1 when it is not registered
+        self.id_base = 0
+        self.id_slots = np.full(0, -1, dtype=np.int64)
+
+    def _arrays(self):
+        return (self.slot_ids, self.alive, self.kinds, self.rewards, self.terminates,
+                self.hot_zones)
+
+    def _set_arrays(self, arrays):
+        self.slot_ids, self.alive, self.kinds, self.rewards, self.terminates, \
+            self.hot_zones = arrays
+
+    def _grow(self, capacity):
+        def resize(array):
+            new_array = np.zeros(capacity, dtype=array.dtype)
+            new_array[:self.size] = array[:self.size]
+            return new_array
+
+        self._set_arrays([resize(array) for array in self._arrays()])
+        self.capacity = capacity
+
+    def _compact(self):
+        # Dead slots are dropped keeping the order of the alive ones
+        alive = self.alive[:self.size].copy()
+        for array in self._arrays():
+            array[:self.num_alive] = array[:self.size][alive]
+        self.alive[self.num_alive:self.size] = False
+        self.size = self.num_alive
+        self.id_slots[self.slot_ids[:self.size] - self.id_base] = np.arange(self.size)
+
+    def _slot_index(self, obj_id):
+        # Index of the id in id_slots, which is extended to cover it
+        if self.size == 0:
+            self.id_base = obj_id
+        low = min(self.id_base, obj_id)
+        high = max(self.id_base + len(self.id_slots), obj_id + 1)
+        if low < self.id_base or high > self.id_base + len(self.id_slots):
+            length = max(high - low, 2 * len(self.id_slots))
+            if low < self.id_base:
+                low = high - length
+            id_slots = np.full(length, -1, dtype=np.int64)
+            offset = self.id_base - low
+            id_slots[offset:offset + len(self.id_slots)] = self.id_slots
+            self.id_base = low
+            self.id_slots = id_slots
+        return obj_id - self.id_base
+
+    def _slot(self, obj_id):
+        index = obj_id - self.id_base
+        if 0 <= index < len(self.id_slots):
+            return int(self.id_slots[index])
+        return -1
+
+    def add(self, obj_id, kind, reward=0.0, terminate=False, hot_zone=False):
+        if obj_id in self:
+            self.remove(obj_id)
+        index = self._slot_index(obj_id)
+        if self.size >= self.capacity:
+            if self.num_alive * 2 <= self.capacity:
+                self._compact()
+            else:
+                self._grow(self.capacity * 2)
+
+        slot = self.size
+        self.slot_ids[slot] = obj_id
+        self.alive[slot] = True
+        self.kinds[slot] = kind
+        self.rewards[slot] = reward
+        self.terminates[slot] = terminate
+        self.hot_zones[slot] = hot_zone
+        self.id_slots[index] = slot
+        self.size += 1
+        self.num_alive += 1
+
+    def remove(self, obj_id):
+        slot = self._slot(obj_id)
+        if slot < 0:
+            raise KeyError(obj_id)
+        self.alive[slot] = False
+        self.id_slots[obj_id - self.id_base] = -1
+        self.num_alive -= 1
+
+    def clear(self):
+        self.alive[:self.size] = False
+        self.id_slots.fill(-1)
+        self.size = 0
+        self.num_alive = 0
+
+    @property
+    def ids(self):
+        # Ids of the alive objects in registration order
+        return self.slot_ids[:self.size][self.alive[:self.size]]
+
+    def __len__(self):
+        return self.num_alive
+
+    def __contains__(self, obj_id):
+        return self._slot(obj_id) >= 0
+
+    def get(self, obj_id):
+        # Returns (kind, reward, terminate, hot_zone) of the object
+        slot = self._slot(obj_id)
+        if slot < 0:
+            raise KeyError(obj_id)
+        return (int(self.kinds[slot]),
+                float(self.rewards[slot]),
+                bool(self.terminates[slot]),
+                bool(self.hot_zones[slot]))
+
+    def process_collisions(self, collided):
+        """
+        Looks up the objects collided with the agent. Returns the sum of their
+        rewards, the terminal flag, the ids to collect and the number of the
+        hot zones touched.
+        """
+        # Collisions with the fixed stage and unknown objects are ignored
+        indices = np.asarray(collided, dtype=np.int64) - self.id_base
+        indices = indices[(indices >= 0) & (indices < len(self.id_slots))]
+        slots = np.take(self.id_slots, indices)
+        slots = np.unique(slots[slots >= 0])
+
+        rewards = self.rewards[slots]
+        collected = rewards != 0.0
+        collected_ids = np.sort(self.slot_ids[slots][collected])
+        terminal = bool(np.any(self.terminates[slots]))
+        num_hot_zones = int(np.count_nonzero(self.hot_zones[slots]))
+        return float(np.sum(rewards)), terminal, collected_ids, num_hot_zones
+
+    def as_arrays(self):
+        # Properties of the alive objects in registration order
+        alive = self.alive[:self.size]
+        return {
+            "id": self.slot_ids[:self.size][alive],
+            "kind": self.kinds[:self.size][alive],
+            "reward": self.rewards[:self.size][alive],
+            "terminate": self.terminates[:self.size][alive],
+            "hot_zone": self.hot_zones[:self.size][alive],
+        }
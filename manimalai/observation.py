@@ -0,0 +1,106 @@
+import gym
+import gym.spaces
+import numpy as np
+
+LAYOUT_HWC = "HWC"
+LAYOUT_CHW = "CHW"
+
+# ITU-R BT.601 luma weights
+GRAYSCALE_WEIGHTS = np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+class ScreenProcessor:
+    """
+    Converts rendered (height, width, 3) uint8 screens to the requested
+    observation format, optionally writing into a preallocated array.
+    """
+
+    def __init__(self, width, height, layout=LAYOUT_HWC, dtype=np.uint8,
+                 grayscale=False, downsample=1, out=None):
+        if layout not in (LAYOUT_HWC, LAYOUT_CHW):
+            raise ValueError("Unknown layout: {}".format(layout))
+        if downsample < 1 or width % downsample != 0 or height % downsample != 0:
+            raise ValueError("downsample has to be a divisor of width and height: {}".format(
+                downsample))
+
+        self.layout = layout
+        self.dtype = np.dtype(dtype)
+        if self.dtype != np.uint8 and self.dtype.kind != "f":
+            raise ValueError("dtype has to be uint8 or float: {}".format(self.dtype))
+        self.grayscale = grayscale
+        self.downsample = downsample
+
+        out_height = height // downsample
+        out_width = width // downsample
+        channels = 1 if grayscale else 3
+        if layout == LAYOUT_CHW:
+            self.shape = (channels, out_height, out_width)
+        else:
+            self.shape = (out_height, out_width, channels)
+
+        if self.dtype == np.uint8:
+            self.scale = None
+            self.high = 255
+        else:
+            # Float observations are normalized to [0, 1]
+            self.scale = 1.0 / 255.0
+            self.high = 1.0
+
+        self.weights = GRAYSCALE_WEIGHTS
+        if self.scale is not None:
+            self.weights = self.weights * self.scale
+
+        self.out = None
+        self.set_buffer(out)
+
+        # Returned while blacked out when no buffer is given
+        self.black = np.zeros(self.shape, dtype=self.dtype)
+        self.black.flags.writeable = False
+
+    @property
+    def is_identity(self):
+        return self.layout == LAYOUT_HWC and self.dtype == np.uint8 and \
+            not self.grayscale and self.downsample == 1 and self.out is None
+
+    def observation_space(self):
+        return gym.spaces.Box(low=0,
+                              high=self.high,
+                              shape=self.shape,
+                              dtype=self.dtype)
+
+    def set_buffer(self, out):
+        if out is not None:
+            if out.shape != self.shape or out.dtype != self.dtype:
+                raise ValueError("Buffer must have shape {} and dtype {}: got {} {}".format(
+                    self.shape, self.dtype, out.shape, out.dtype))
+        self.out = out
+
+    def _hwc_view(self, out):
+        # View of the output array in (height, width, channel) order
+        if self.layout == LAYOUT_CHW:
+            return out.transpose(1, 2, 0)
+        return out
+
+    def process(self, screen):
+        out = self.out
+        if out is None:
+            out = np.empty(self.shape, dtype=self.dtype)
+        dst = self._hwc_view(out)
+
+        if self.downsample > 1:
+            screen = screen[::self.downsample, ::self.downsample]
+
+        if self.grayscale:
+            gray = np.dot(screen, self.weights)
+            np.copyto(dst[:, :, 0], gray, casting="unsafe")
+        elif self.scale is not None:
+            np.multiply(screen, self.scale, out=dst, casting="unsafe")
+        else:
+            np.copyto(dst, screen)
+        return out
+
+    def process_black(self):
+        if self.out is None:
+            return self.black
+        self.out.fill(0)
+        return self.out
@@ -0,0 +1,123 @@
+import time
+
+import numpy as np
+
+# Phases of step() and reset()
+PHASE_ACTION = "action"
+PHASE_PHYSICS = "physics"
+PHASE_COLLISION = "collision"
+PHASE_BLACKOUT = "blackout"
+PHASE_RENDER = "render"
+PHASE_OBSERVATION = "observation"
+PHASE_AGENT_INFO = "agent_info"
+PHASE_AUTO_RESET = "auto_reset"
+PHASE_OBJECTS = "objects"
+PHASE_TOTAL = "total"
+
+EVENT_STEP = "step"
+EVENT_RESET = "reset"
+
+
+class RollingHistogram:
+    """ Keeps the last window values of a duration (in seconds). """
+
+    def __init__(self, window=1000):
+        self.values = np.zeros(window, dtype=np.float64)
+        self.window = window
+        self.count = 0
+
+    def add(self, value):
+        self.values[self.count % self.window] = value
+        self.count += 1
+
+    def get_values(self):
+        return self.values[:min(self.count, self.window)]
+
+    def histogram(self, bins=20):
+        # Log scale bins from 1us to 1s
+        values = self.get_values()
+        if isinstance(bins, int):
+            bins = np.logspace(-6, 0, bins + 1)
+        return np.histogram(values, bins=bins)
+
+    def summary(self):
+        values = self.get_values()
+        if len(values) == 0:
+            return {"count": self.count}
+        p50, p90, p99 = np.percentile(values, [50, 90, 99])
+        return {
+            "count": self.count,
+            "mean": float(np.mean(values)),
+            "p50": float(p50),
+            "p90": float(p90),
+            "p99": float(p99),
+            "max": float(np.max(values)),
+        }
+
+
+class PhaseProfiler:
+    """
+    Measures the duration of each phase of step() and reset().
+
+    mark(phase) adds the time since the previous mark to the phase. Marks
+    between enter() and exit(phase) are ignored, and the whole section is
+    counted as one phase. When an event finishes, the durations are added to
+    the rolling histograms and passed to callback(event, durations).
+    """
+
+    def __init__(self, window=1000, callback=None):
+        self.window = window
+        self.callback = callback
+        # event -> phase -> RollingHistogram
+        self.histograms = {}
+        self.durations = {}
+        self.start_time = 0.0
+        self.last_time = 0.0
+        self.depth = 0
+
+    def start(self):
+        self.durations = {}
+        self.depth = 0
+        self.start_time = self.last_time = time.perf_counter()
+
+    def mark(self, phase):
+        if self.depth > 0:
+            return
+        now = time.perf_counter()
+        self.durations[phase] = self.durations.get(phase, 0.0) + now - self.last_time
+        self.last_time = now
+
+    def enter(self):
+        self.depth += 1
+
+    def exit(self, phase):
+        self.depth -= 1
+        if self.depth == 0:
+            self.mark(phase)
+
+    def stop(self, event):
+        durations = self.durations
+        durations[PHASE_TOTAL] = time.perf_counter() - self.start_time
+
+        histograms = self.histograms.get(event)
+        if histograms is None:
+            histograms = self.histograms[event] = {}
+        for phase, duration in durations.items():
+            histogram = histograms.get(phase)
+            if histogram is None:
+                histogram = histograms[phase] = RollingHistogram(self.window)
+            histogram.add(duration)
+
+        if self.callback is not None:
+            self.callback(event, durations)
+
+    def get_histogram(self, event, phase):
+        return self.histograms[event][phase]
+
+    def summary(self):
+        return {event: {phase: histogram.summary()
+                        for phase, histogram in histograms.items()}
+                for event, histograms in self.histograms.items()}
+
+    def clear(self):
+        self.histograms = {}
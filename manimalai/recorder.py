@@ -0,0 +1,354 @@
+import json
+import os
+import queue
+import threading
+
+import gym
+import numpy as np
+
+INDEX_FILE_NAME = "index.json"
+
+# Action recorded for the first frame of an episode started by reset()
+RESET_ACTION = -1
+
+# What EpisodeRecorder does with a record when max_queue_size records are
+# already waiting for the writer thread
+ON_FULL_DROP = "drop"
+ON_FULL_RAISE = "raise"
+
+
+class _Chunk:
+    def __init__(self, path, chunk_size, screen_shape, screen_dtype, info_shapes, compress):
+        self.path = path
+        self.chunk_size = chunk_size
+        self.length = 0
+        self.compress = compress
+
+        if not compress:
+            os.makedirs(path, exist_ok=True)
+
+        self.arrays = {}
+        self.arrays["screens"] = self._allocate("screens", screen_shape, screen_dtype)
+        self.arrays["actions"] = self._allocate("actions", (2,), np.int32)
+        self.arrays["rewards"] = self._allocate("rewards", (), np.float32)
+        self.arrays["terminals"] = self._allocate("terminals", (), np.bool_)
+        for key, shape in info_shapes.items():
+            self.arrays["info_" + key] = self._allocate("info_" + key, shape, np.float32)
+
+    def _allocate(self, name, shape, dtype):
+        shape = (self.chunk_size,) + tuple(shape)
+        if self.compress:
+            # Compressed chunks are kept in memory and written when finished
+            return np.zeros(shape, dtype=dtype)
+        return np.lib.format.open_memmap(os.path.join(self.path, name + ".npy"),
+                                         mode="w+", dtype=dtype, shape=shape)
+
+    def append(self, record):
+        screen, action, reward, terminal, info = record
+        index = self.length
+        self.arrays["screens"][index] = screen
+        self.arrays["actions"][index] = action
+        self.arrays["rewards"][index] = reward
+        self.arrays["terminals"][index] = terminal
+        for key, value in info.items():
+            name = "info_" + key
+            if name not in self.arrays:
+                # Rows before the first appearance stay 0
+                self.arrays[name] = self._allocate(name, value.shape, np.float32)
+            self.arrays[name][index] = value
+        self.length += 1
+
+    def flush(self):
+        # Rows appended so far are written to the files (memory-mapped only)
+        if not self.compress:
+            for array in self.arrays.values():
+                array.flush()
+
+    def finish(self):
+        if self.compress:
+            arrays = {name: array[:self.length] for name, array in self.arrays.items()}
+            np.savez_compressed(self.path + ".npz", **arrays)
+        else:
+            for array in self.arrays.values():
+                array.flush()
+        self.arrays = None
+
+
+class EpisodeRecorder(gym.Wrapper):
+    """
+    Records (screen, action, reward, terminal, info) of every step into chunked
+    array files.
+
+    Records are written on a background thread, so step() and reset() never wait
+    for disk I/O. Each chunk holds chunk_size rows, stored as memory-mapped .npy
+    files, or as a compressed .npz file when compress is True. index.json lists
+    the chunks and the episodes, and it is replaced after every episode and
+    chunk with the episodes whose rows are on disk. (Rows of the unfinished compressed
+    chunk are written when the chunk is finished)
+
+    At most max_queue_size records wait for the writer thread, so the memory
+    use is bounded. When the writer falls behind, step() and reset() never
+    wait: with on_full ON_FULL_DROP the record is dropped and counted in the
+    "num_dropped" of its episode and of the index, and with ON_FULL_RAISE
+    RuntimeError is raised. (Episodes with dropped rows are missing those
+    frames, so they are shorter than the steps taken)
+
+    The first frame of every episode is recorded with action RESET_ACTION.
+    Because AAIEnvironment resets itself on terminal, the screen returned on
+    terminal is the first frame of the next episode, and it is recorded as
+    such. The terminal frame is not rendered by the environment, so the
+    terminal row repeats the last screen of the episode.
+    """
+
+    def __init__(self, env, directory, chunk_size=1024, compress=False,
+                 info_keys=("local_velocity",), max_queue_size=256, on_full=ON_FULL_DROP):
+        super().__init__(env)
+
+        if on_full not in (ON_FULL_DROP, ON_FULL_RAISE):
+            raise ValueError("Unknown on_full: {}".format(on_full))
+
+        self.directory = directory
+        self.chunk_size = chunk_size
+        self.compress = compress
+        self.info_keys = tuple(info_keys)
+
+        os.makedirs(directory, exist_ok=True)
+
+        # Records hold a slot until written. (End of episode and close
+        # markers are not counted)
+        self.queue = queue.Queue()
+        self.slots = threading.Semaphore(max_queue_size)
+        self.on_full = on_full
+        self.error = None
+
+        # Episode bookkeeping on the caller thread
+        self.num_rows = 0
+        self.episode_start = None
+        self.episode_return = 0.0
+        self.episode_dropped = 0
+        self.num_dropped = 0
+        self.episodes = []
+        self.last_screen = None
+
+        # State owned by the writer thread
+        self.chunks = []
+        self.chunk = None
+        self.screen_shape = None
+        self.screen_dtype = None
+        # Shapes of the info arrays seen so far
+        self.info_shapes = {}
+        # Episodes received by the writer thread
+        self.written_episodes = []
+
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+        self.closed = False
+
+    def _check_error(self):
+        if self.error is not None:
+            raise RuntimeError("Recorder writer failed") from self.error
+
+    def _enqueue(self, record):
+        # Returns False when the record is dropped
+        self._check_error()
+        if not self.slots.acquire(blocking=False):
+            if self.on_full == ON_FULL_RAISE:
+                raise RuntimeError("Recorder queue is full")
+            return False
+        self.queue.put_nowait(record)
+        return True
+
+    def _put(self, screen, action, reward, terminal, info):
+        if not isinstance(screen, np.ndarray):
+            raise ValueError("EpisodeRecorder only supports screen observations")
+
+        # Screens may be reused buffers, so they have to be copied here.
+        if screen is not self.last_screen:
+            screen = np.array(screen, copy=True)
+        info = {key: np.array(info[key], dtype=np.float32)
+                for key in self.info_keys if key in info}
+        self.last_screen = screen
+        if self._enqueue((screen, action, reward, terminal, info)):
+            self.num_rows += 1
+        else:
+            self.episode_dropped += 1
+            self.num_dropped += 1
+
+    def _start_episode(self, screen):
+        self.episode_start = self.num_rows
+        self._put(screen, (RESET_ACTION, RESET_ACTION), 0.0, False, {})
+
+    def _end_episode(self):
+        if self.episode_start is not None and \
+           self.num_rows + self.episode_dropped > self.episode_start:
+            episode = {"start": self.episode_start,
+                       "length": self.num_rows - self.episode_start,
+                       "return": self.episode_return,
+                       "num_dropped": self.episode_dropped}
+            self.episodes.append(episode)
+            self._check_error()
+            self.queue.put_nowait(episode)
+        self.episode_start = None
+        self.episode_return = 0.0
+        self.episode_dropped = 0
+
+    def reset(self, **kwargs):
+        screen = self.env.reset(**kwargs)
+        self._end_episode()
+        self._start_episode(screen)
+        return screen
+
+    def step(self, action):
+        screen, reward, terminal, info = self.env.step(action)
+
+        if self.episode_start is None:
+            # Episode started by the first step() without reset()
+            self.episode_start = self.num_rows
+        action = np.asarray(action, dtype=np.int32)
+        self.episode_return += reward
+
+        if terminal:
+            # Environment has already been reset, and the screen is the first
+            # frame of the next episode
+            if self.last_screen is not None:
+                self._put(self.last_screen, action, reward, terminal, info)
+            else:
+                self._put(screen, action, reward, terminal, info)
+            self._end_episode()
+            self._start_episode(screen)
+        else:
+            self._put(screen, action, reward, terminal, info)
+
+        return screen, reward, terminal, info
+
+    def _new_chunk(self, record):
+        screen = record[0]
+        if self.screen_shape is None:
+            self.screen_shape = screen.shape
+            self.screen_dtype = screen.dtype
+        name = "chunk_{:05d}".format(len(self.chunks))
+        return _Chunk(os.path.join(self.directory, name),
+                      self.chunk_size,
+                      self.screen_shape,
+                      self.screen_dtype,
+                      self.info_shapes,
+                      self.compress)
+
+    def _finish_chunk(self):
+        self.chunk.finish()
+        self.chunks.append({"name": os.path.basename(self.chunk.path),
+                            "length": self.chunk.length})
+        self.chunk = None
+
+    def _run(self):
+        try:
+            while True:
+                record = self.queue.get()
+                if record is None:
+                    break
+                if isinstance(record, dict):
+                    # End of an episode
+                    self.written_episodes.append(record)
+                    self._write_index()
+                    continue
+                if self.chunk is None:
+                    self.chunk = self._new_chunk(record)
+                for key, value in record[4].items():
+                    self.info_shapes[key] = value.shape
+                self.chunk.append(record)
+                self.slots.release()
+                if self.chunk.length == self.chunk_size:
+                    self._finish_chunk()
+                    # Episodes waiting for the rows of the chunk
+                    self._write_index()
+            if self.chunk is not None:
+                self._finish_chunk()
+            self._write_index()
+        except Exception as e:
+            self.error = e
+
+    def _write_index(self):
+        # Called on the writer thread. Lists the chunks on disk, including the
+        # unfinished memory-mapped chunk, and the episodes within them.
+        chunks = list(self.chunks)
+        if self.chunk is not None and not self.compress and self.chunk.length > 0:
+            self.chunk.flush()
+            chunks.append({"name": os.path.basename(self.chunk.path),
+                           "length": self.chunk.length})
+        num_rows = sum(chunk["length"] for chunk in chunks)
+        episodes = [episode for episode in self.written_episodes
+                    if episode["start"] + episode["length"] <= num_rows]
+
+        index = {
+            "chunk_size": self.chunk_size,
+            "compress": self.compress,
+            "num_rows": num_rows,
+            "num_dropped": sum(episode["num_dropped"] for episode in self.written_episodes),
+            "chunks": chunks,
+            "episodes": episodes,
+        }
+        path = os.path.join(self.directory, INDEX_FILE_NAME)
+        with open(path + ".tmp", "w") as f:
+            json.dump(index, f)
+        os.replace(path + ".tmp", path)
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            self._end_episode()
+            self.queue.put_nowait(None)
+            self.thread.join()
+            self._check_error()
+        finally:
+            self.env.close()
+
+
+class Recording:
+    """ Reads the data written by EpisodeRecorder. """
+
+    def __init__(self, directory):
+        self.directory = directory
+        with open(os.path.join(directory, INDEX_FILE_NAME)) as f:
+            self.index = json.load(f)
+        self.chunks = self.index["chunks"]
+        self.episodes = self.index["episodes"]
+        self.chunk_starts = np.cumsum([0] + [chunk["length"] for chunk in self.chunks])
+
+    def __len__(self):
+        return int(self.chunk_starts[-1])
+
+    def load_chunk(self, chunk_index):
+        chunk = self.chunks[chunk_index]
+        length = chunk["length"]
+        path = os.path.join(self.directory, chunk["name"])
+        if self.index["compress"]:
+            with np.load(path + ".npz") as data:
+                return {name: data[name] for name in data.files}
+        arrays = {}
+        for file_name in sorted(os.listdir(path)):
+            if file_name.endswith(".npy"):
+                array = np.load(os.path.join(path, file_name), mmap_mode="r")
+                arrays[file_name[:-4]] = array[:length]
+        return arrays
+
+    def get_rows(self, start, end):
+        parts = []
+        first = int(np.searchsorted(self.chunk_starts, start, side="right")) - 1
+        for chunk_index in range(max(first, 0), len(self.chunks)):
+            chunk_start = self.chunk_starts[chunk_index]
+            if chunk_start >= end:
+                break
+            arrays = self.load_chunk(chunk_index)
+            begin = max(start - chunk_start, 0)
+            stop = min(end - chunk_start, self.chunks[chunk_index]["length"])
+            parts.append({name: array[begin:stop] for name, array in arrays.items()})
+        if len(parts) == 1:
+            return parts[0]
+        return {name: np.concatenate([part[name] for part in parts])
+                for name in parts[0].keys()}
+
+    def get_episode(self, episode_index):
+        episode = self.episodes[episode_index]
+        return self.get_rows(episode["start"], episode["start"] + episode["length"])
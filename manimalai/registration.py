@@ -0,0 +1,20 @@
+# Gym ids of the environments, and their entry points
+ENV_ENTRY_POINTS = {
+    'ManimalAI-v0': 'manimalai.environment:AAIEnvironment',
+    'ManimalAIMultiTask-v0': 'manimalai.environment:MultiTaskAAIEnvironment',
+}
+
+
+def register_envs():
+    """
+    Registers the gym ids. Called by gym (>= 0.24) through the "gym.envs"
+    entry point of the installed package, and by the package import when gym
+    is already imported. Ids which are already registered are skipped.
+    """
+    from gym.envs.registration import register, registry
+
+    # dict since gym 0.24, EnvRegistry before it
+    env_specs = getattr(registry, "env_specs", registry)
+    for env_id, entry_point in ENV_ENTRY_POINTS.items():
+        if env_id not in env_specs:
+            register(id=env_id, entry_point=entry_point)
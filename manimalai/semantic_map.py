@@ -0,0 +1,279 @@
+import os
+
+import gym
+import gym.spaces
+import numpy as np
+
+from .environment import OBJ_TYPE_GOOD_GOAL, OBJ_TYPE_GOOD_GOAL_MULTI, OBJ_TYPE_BAD_GOAL, \
+    OBJ_TYPE_WALL, OBJ_TYPE_RAMP, OBJ_TYPE_CYLINDER_TUNNEL, OBJ_TYPE_DEATH_ZONE, \
+    OBJ_TYPE_HOT_ZONE, OBJ_TYPE_CARDBOX1, OBJ_TYPE_CARDBOX2, OBJ_TYPE_LOBJECT, \
+    OBJ_TYPE_LOBJECT2, OBJ_TYPE_UOBJECT
+
+CHANNEL_WALL = 0
+CHANNEL_RAMP = 1
+CHANNEL_TUNNEL = 2
+CHANNEL_DEATH_ZONE = 3
+CHANNEL_HOT_ZONE = 4
+CHANNEL_GOOD_GOAL = 5
+CHANNEL_BAD_GOAL = 6
+CHANNEL_MOVABLE = 7
+CHANNEL_AGENT = 8
+
+CHANNEL_NAMES = ("wall", "ramp", "tunnel", "death_zone", "hot_zone",
+                 "good_goal", "bad_goal", "movable", "agent")
+NUM_CHANNELS = len(CHANNEL_NAMES)
+
+KIND_CHANNELS = {
+    OBJ_TYPE_GOOD_GOAL: CHANNEL_GOOD_GOAL,
+    OBJ_TYPE_GOOD_GOAL_MULTI: CHANNEL_GOOD_GOAL,
+    OBJ_TYPE_BAD_GOAL: CHANNEL_BAD_GOAL,
+    OBJ_TYPE_WALL: CHANNEL_WALL,
+    OBJ_TYPE_RAMP: CHANNEL_RAMP,
+    OBJ_TYPE_CYLINDER_TUNNEL: CHANNEL_TUNNEL,
+    OBJ_TYPE_DEATH_ZONE: CHANNEL_DEATH_ZONE,
+    OBJ_TYPE_HOT_ZONE: CHANNEL_HOT_ZONE,
+    OBJ_TYPE_CARDBOX1: CHANNEL_MOVABLE,
+    OBJ_TYPE_CARDBOX2: CHANNEL_MOVABLE,
+    OBJ_TYPE_LOBJECT: CHANNEL_MOVABLE,
+    OBJ_TYPE_LOBJECT2: CHANNEL_MOVABLE,
+    OBJ_TYPE_UOBJECT: CHANNEL_MOVABLE,
+}
+
+# Model path -> (box centers, box half sizes) in the model's xz plane
+_model_footprints = {}
+
+
+def _load_model_footprint(path):
+    footprint = _model_footprints.get(path)
+    if footprint is not None:
+        return footprint
+
+    col_path = os.path.splitext(path)[0] + ".col"
+    if os.path.exists(col_path):
+        # Compound of the collision boxes ("b px py pz hx hy hz")
+        boxes = []
+        with open(col_path) as f:
+            for line in f.read().replace("b ", "\nb ").splitlines():
+                values = line.split()
+                if len(values) == 7 and values[0] == "b":
+                    boxes.append([float(v) for v in values[1:]])
+        boxes = np.array(boxes, dtype=np.float32)
+        footprint = (boxes[:, [0, 2]], boxes[:, [3, 5]])
+    else:
+        # Bounding box of the vertices
+        vertices = []
+        with open(path) as f:
+            for line in f:
+                if line.startswith("v "):
+                    vertices.append([float(v) for v in line.split()[1:4]])
+        vertices = np.array(vertices, dtype=np.float32)
+        min_pos = vertices.min(axis=0)
+        max_pos = vertices.max(axis=0)
+        footprint = (((min_pos + max_pos) * 0.5)[None, [0, 2]],
+                     ((max_pos - min_pos) * 0.5)[None, [0, 2]])
+
+    _model_footprints[path] = footprint
+    return footprint
+
+
+def _spec_footprint(shape, kwargs):
+    # Returns (centers, half sizes, round) of the footprint in the object's frame
+    if shape == "box":
+        half_extent = kwargs["half_extent"]
+        return np.zeros((1, 2), dtype=np.float32), \
+            np.array([[half_extent[0], half_extent[2]]], dtype=np.float32), False
+    elif shape == "sphere":
+        radius = kwargs["radius"]
+        return np.zeros((1, 2), dtype=np.float32), \
+            np.array([[radius, radius]], dtype=np.float32), True
+    else:
+        centers, half_sizes = _load_model_footprint(kwargs["path"])
+        scale = np.array(kwargs.get("scale", [1.0, 1.0, 1.0]), dtype=np.float32)[[0, 2]]
+        return centers * scale, half_sizes * np.abs(scale), False
+
+
+def _quat_to_xz_axes(rot):
+    # Local x and z axes of the rotation projected on the xz plane
+    x, y, z, w = rot[..., 0], rot[..., 1], rot[..., 2], rot[..., 3]
+    axis_x = np.stack([1.0 - 2.0 * (y * y + z * z), 2.0 * (x * z - w * y)], axis=-1)
+    axis_z = np.stack([2.0 * (x * z + w * y), 1.0 - 2.0 * (x * x + y * y)], axis=-1)
+    return axis_x, axis_z
+
+
+class SemanticMap:
+    """
+    Top-down semantic grid of the arena computed from the object poses and
+    sizes without rendering.
+
+    The grid covers [-extent/2, extent/2] of the world x and z axes with
+    resolution cells per side, and has one channel per CHANNEL_NAMES. Rows
+    go along the world z axis and columns along the x axis, which is the same
+    orientation as get_top_view(). A cell is set when its center is inside a
+    footprint, or when it contains the center of the footprint.
+    """
+
+    def __init__(self, resolution=128, extent=40.0):
+        self.resolution = resolution
+        self.extent = extent
+        self.cell_size = extent / resolution
+        # World coordinate of the cell centers
+        self.cell_centers = (np.arange(resolution, dtype=np.float32) + 0.5) * \
+            self.cell_size - extent * 0.5
+        # Object footprints in the object frame (obj id -> footprint) for the
+        # objects seen so far
+        self.footprints = {}
+
+    @property
+    def shape(self):
+        return (NUM_CHANNELS, self.resolution, self.resolution)
+
+    def observation_space(self):
+        return gym.spaces.Box(low=0, high=1, shape=self.shape, dtype=np.bool_)
+
+    def _get_footprint(self, env, obj_id):
+        spec = env.obj_specs[obj_id]
+        footprint = self.footprints.get(obj_id)
+        if footprint is None or footprint[0] is not spec:
+            footprint = (spec,) + _spec_footprint(*spec)
+            self.footprints[obj_id] = footprint
+        return footprint[1:]
+
+    def collect(self, env):
+        """
+        Returns the world footprints of the objects and the agent as arrays of
+        centers (K, 2), local x axes (K, 2), local z axes (K, 2),
+        half sizes (K, 2), round flags (K,) and channels (K,).
+        """
+        env.ensure_reset()
+        objects = env.objects.as_arrays()
+
+        centers = []
+        half_sizes = []
+        rounds = []
+        channels = []
+        positions = []
+        rotations = []
+        for obj_id, kind in zip(objects["id"].tolist(), objects["kind"].tolist()):
+            channel = KIND_CHANNELS.get(kind)
+            if channel is None:
+                continue
+            box_centers, box_half_sizes, round_shape = self._get_footprint(env, obj_id)
+            obj_info = env.env.get_obj_info(obj_id)
+            num_boxes = len(box_centers)
+            centers.append(box_centers)
+            half_sizes.append(box_half_sizes)
+            rounds.append(np.full(num_boxes, round_shape))
+            channels.append(np.full(num_boxes, channel))
+            positions.append(np.repeat(obj_info["pos"][None, [0, 2]], num_boxes, axis=0))
+            rotations.append(np.repeat(obj_info["rot"][None], num_boxes, axis=0))
+
+        # Objects merged into the static batch
+        batch = env.static_batch
+        if batch is not None:
+            for kind, spec, pos, rot in zip(batch.kinds, batch.specs,
+                                            batch.positions, batch.rotations):
+                box_centers, box_half_sizes, round_shape = _spec_footprint(*spec)
+                num_boxes = len(box_centers)
+                centers.append(box_centers)
+                half_sizes.append(box_half_sizes)
+                rounds.append(np.full(num_boxes, round_shape))
+                channels.append(np.full(num_boxes, KIND_CHANNELS[kind]))
+                positions.append(np.repeat(np.array([[pos[0], pos[2]]]), num_boxes, axis=0))
+                rotations.append(np.repeat(np.array([rot]), num_boxes, axis=0))
+
+        agent_info = env.env.get_agent_info()
+        centers.append(np.zeros((1, 2), dtype=np.float32))
+        half_sizes.append(np.full((1, 2), env.physics_settings["agent_radius"],
+                                  dtype=np.float32))
+        rounds.append(np.array([True]))
+        channels.append(np.array([CHANNEL_AGENT]))
+        positions.append(agent_info["pos"][None, [0, 2]])
+        rotations.append(agent_info["rot"][None])
+
+        centers = np.concatenate(centers).astype(np.float32)
+        half_sizes = np.concatenate(half_sizes).astype(np.float32)
+        positions = np.concatenate(positions).astype(np.float32)
+        rotations = np.concatenate(rotations).astype(np.float32)
+
+        axis_x, axis_z = _quat_to_xz_axes(rotations)
+        # Offsets of the boxes in the object frame rotated into the world
+        world_centers = positions + \
+            centers[:, 0:1] * axis_x + \
+            centers[:, 1:2] * axis_z
+        return world_centers, axis_x, axis_z, half_sizes, \
+            np.concatenate(rounds), np.concatenate(channels)
+
+    def rasterize(self, centers, axis_x, axis_z, half_sizes, rounds, channels, out=None):
+        resolution = self.resolution
+        num_shapes = len(centers)
+
+        # Row intervals of every shape: (K, rows)
+        dz = self.cell_centers[None, :] - centers[:, 1:2]
+
+        x_min = np.full((num_shapes, resolution), -np.inf, dtype=np.float32)
+        x_max = np.full((num_shapes, resolution), np.inf, dtype=np.float32)
+
+        # Rotated rectangles: |t*a + dz*b| <= half for both local axes,
+        # where t is the x offset from the center.
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for axis, half in ((axis_x, half_sizes[:, 0]), (axis_z, half_sizes[:, 1])):
+                a = axis[:, 0:1]
+                b = dz * axis[:, 1:2]
+                h = half[:, None]
+                t0 = (-h - b) / a
+                t1 = (h - b) / a
+                parallel = np.abs(a) < 1e-6
+                inside = np.abs(b) <= h
+                lo = np.where(parallel, np.where(inside, -np.inf, np.inf), np.minimum(t0, t1))
+                hi = np.where(parallel, np.where(inside, np.inf, -np.inf), np.maximum(t0, t1))
+                x_min = np.maximum(x_min, lo)
+                x_max = np.minimum(x_max, hi)
+
+            # Discs
+            radius = half_sizes[:, 0:1]
+            half_chord = np.sqrt(np.maximum(radius * radius - dz * dz, 0.0))
+            half_chord = np.where(np.abs(dz) <= radius, half_chord, -np.inf)
+            round_shapes = rounds[:, None]
+            x_min = np.where(round_shapes, -half_chord, x_min)
+            x_max = np.where(round_shapes, half_chord, x_max)
+
+        x_min = x_min + centers[:, 0:1]
+        x_max = x_max + centers[:, 0:1]
+
+        # Columns whose centers are inside the intervals
+        origin = -self.extent * 0.5
+        col_begin = np.ceil((x_min - origin) / self.cell_size - 0.5)
+        col_end = np.floor((x_max - origin) / self.cell_size - 0.5) + 1
+        col_begin = np.clip(col_begin, 0, resolution).astype(np.int64)
+        col_end = np.clip(col_end, 0, resolution).astype(np.int64)
+        valid = col_begin < col_end
+
+        # Fill the row spans with a difference array
+        shape_index, row = np.nonzero(valid)
+        channel = channels[shape_index]
+        row_offset = (channel * resolution + row) * (resolution + 1)
+        width = resolution + 1
+        size = NUM_CHANNELS * resolution * width
+        diff = np.bincount(row_offset + col_begin[shape_index, row], minlength=size) - \
+            np.bincount(row_offset + col_end[shape_index, row], minlength=size)
+        diff = diff.reshape(NUM_CHANNELS, resolution, width)
+        grid = np.cumsum(diff, axis=2)[:, :, :resolution] > 0
+
+        # Shapes smaller than a cell still occupy the cell of their center
+        center_cells = np.floor((centers - origin) / self.cell_size).astype(np.int64)
+        inside = np.all((center_cells >= 0) & (center_cells < resolution), axis=1)
+        grid[channels[inside], center_cells[inside, 1], center_cells[inside, 0]] = True
+
+        if out is None:
+            return grid
+        np.copyto(out, grid, casting="unsafe")
+        return out
+
+    def render(self, env, out=None):
+        """ Returns the (NUM_CHANNELS, resolution, resolution) grid of the env. """
+        # Drop footprints of the removed objects
+        if len(self.footprints) > 2 * len(env.obj_specs) + 64:
+            self.footprints = {obj_id: footprint
+                               for obj_id, footprint in self.footprints.items()
+                               if obj_id in env.obj_specs}
+        return self.rasterize(*self.collect(env), out=out)
@@ -0,0 +1,276 @@
+"""
+Local environment server.
+
+    python -m manimalai.server --address /tmp/manimalai.sock --num-envs 8 --num-workers 4
+
+Hosts AAIVectorEnv behind a Unix domain socket. Clients send batched step and
+reset requests for any subset of the envs in one round trip, and read the
+screens from the shared memory of the vector env, so only actions, rewards
+and terminals go through the socket.
+
+Connections are authenticated with a random key, which the server writes to
+the file "<address>.key" readable only by its user, unless an authkey is
+given.
+"""
+import argparse
+import os
+import socket
+import threading
+import traceback
+from multiprocessing import AuthenticationError, resource_tracker
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+from .vector_env import AAIVectorEnv, SharedArray
+
+DEFAULT_ADDRESS = "/tmp/manimalai.sock"
+
+AUTHKEY_SIZE = 32
+
+
+def get_key_path(address):
+    return address + ".key"
+
+
+def _is_listening(address):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(address)
+        return True
+    except (ConnectionRefusedError, FileNotFoundError):
+        return False
+    finally:
+        sock.close()
+
+
+class EnvServer:
+    """
+    Serves the envs of an AAIVectorEnv to local clients.
+
+    Requests from the clients are processed one at a time, so clients stepping
+    disjoint sets of envs can share one server. The "call" requests run any
+    method of the envs, so the clients are authenticated with authkey, or with
+    a random key written to get_key_path(address) when it is None.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None, **vector_env_kwargs):
+        self.address = address
+        self.key_path = None
+        if authkey is None:
+            authkey = os.urandom(AUTHKEY_SIZE)
+            self.key_path = get_key_path(address)
+        self.authkey = authkey
+        self.vector_env = AAIVectorEnv(**vector_env_kwargs)
+        self.lock = threading.Lock()
+        self.listener = None
+        self.threads = []
+        self.closed = False
+
+    @property
+    def info(self):
+        vector_env = self.vector_env
+        return {
+            "num_envs": vector_env.num_envs,
+            "screens": vector_env.buffers.screens.spec,
+            "observation_shape": vector_env.single_observation_space.shape,
+            "observation_dtype": np.dtype(vector_env.single_observation_space.dtype).str,
+        }
+
+    def _handle(self, command, data):
+        vector_env = self.vector_env
+        if command == "info":
+            return self.info
+        elif command == "step":
+            env_ids, actions = data
+            _, rewards, terminals, info = vector_env.step(actions, env_ids)
+            return rewards, terminals, info["local_velocity"]
+        elif command == "reset":
+            vector_env.reset(data)
+            return None
+        elif command == "call":
+            name, args, kwargs = data
+            return vector_env.call(name, *args, **kwargs)
+        else:
+            raise ValueError("Unknown command: {}".format(command))
+
+    def _serve_connection(self, connection):
+        with connection:
+            while True:
+                try:
+                    command, data = connection.recv()
+                except (EOFError, OSError):
+                    break
+
+                if command == "close":
+                    connection.send((True, None))
+                    break
+                if command == "shutdown":
+                    connection.send((True, None))
+                    self.shutdown()
+                    break
+
+                try:
+                    with self.lock:
+                        result = self._handle(command, data)
+                    connection.send((True, result))
+                except Exception:
+                    connection.send((False, traceback.format_exc()))
+
+    def _write_key(self):
+        # Only the user of the server can read the key
+        if os.path.exists(self.key_path):
+            os.unlink(self.key_path)
+        fd = os.open(self.key_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+        with os.fdopen(fd, "wb") as f:
+            f.write(self.authkey)
+
+    def serve_forever(self):
+        if os.path.exists(self.address):
+            if _is_listening(self.address):
+                raise RuntimeError("Server is already running on {}".format(self.address))
+            # Stale socket file of a previous server
+            os.unlink(self.address)
+        if self.key_path is not None:
+            self._write_key()
+        self.listener = Listener(self.address, family="AF_UNIX", authkey=self.authkey)
+
+        while not self.closed:
+            try:
+                connection = self.listener.accept()
+            except (EOFError, ConnectionError, AuthenticationError):
+                # Client failed the authentication or went away
+                continue
+            except OSError:
+                # Listener closed by shutdown()
+                break
+            thread = threading.Thread(target=self._serve_connection,
+                                      args=(connection,),
+                                      daemon=True)
+            thread.start()
+            self.threads.append(thread)
+
+        self.close()
+
+    def shutdown(self):
+        self.closed = True
+        if self.listener is not None:
+            # Wake up accept() in serve_forever()
+            try:
+                Client(self.address, family="AF_UNIX", authkey=self.authkey).close()
+            except OSError:
+                pass
+
+    def close(self):
+        self.closed = True
+        if self.listener is not None:
+            self.listener.close()
+            self.listener = None
+            if self.key_path is not None and os.path.exists(self.key_path):
+                os.unlink(self.key_path)
+        with self.lock:
+            self.vector_env.close()
+
+
+class EnvClient:
+    """
+    Client of EnvServer.
+
+    When env_ids is None, the screens returned by step() and reset() are a view
+    of the server's shared buffer and are overwritten by the next request.
+    Otherwise they are copies of the rows of env_ids.
+    The key is read from get_key_path(address) when authkey is None.
+    """
+
+    def __init__(self, address=DEFAULT_ADDRESS, authkey=None):
+        if authkey is None:
+            with open(get_key_path(address), "rb") as f:
+                authkey = f.read()
+        self.connection = Client(address, family="AF_UNIX", authkey=authkey)
+        info = self._request("info")
+        self.num_envs = info["num_envs"]
+        self.observation_shape = tuple(info["observation_shape"])
+        self.observation_dtype = np.dtype(info["observation_dtype"])
+
+        self.screen_buffer = SharedArray.attach(info["screens"])
+        # The server owns the shared memory. Without unregistering, the
+        # resource tracker of this process would unlink it on exit.
+        resource_tracker.unregister(self.screen_buffer.shm._name, "shared_memory")
+        self.screens = self.screen_buffer.array
+
+    def _request(self, command, data=None):
+        self.connection.send((command, data))
+        success, result = self.connection.recv()
+        if not success:
+            raise RuntimeError("Server failed:\n{}".format(result))
+        return result
+
+    def _screens(self, env_ids):
+        if env_ids is None:
+            return self.screens
+        return self.screens[env_ids]
+
+    def reset(self, env_ids=None):
+        if env_ids is not None:
+            env_ids = [int(env_id) for env_id in env_ids]
+        self._request("reset", env_ids)
+        return self._screens(env_ids)
+
+    def step(self, actions, env_ids=None):
+        if env_ids is not None:
+            env_ids = [int(env_id) for env_id in env_ids]
+        num_envs = self.num_envs if env_ids is None else len(env_ids)
+        actions = np.asarray(actions, dtype=np.int32).reshape(num_envs, 2)
+        rewards, terminals, velocities = self._request("step", (env_ids, actions))
+        info = {"local_velocity": velocities}
+        return self._screens(env_ids), rewards, terminals, info
+
+    def call(self, name, *args, **kwargs):
+        return self._request("call", (name, args, kwargs))
+
+    def shutdown(self):
+        # Stop the server
+        self._request("shutdown")
+        self.close()
+
+    def close(self):
+        if self.connection is None:
+            return
+        try:
+            self._request("close")
+        except (EOFError, OSError, RuntimeError):
+            pass
+        self.connection.close()
+        self.connection = None
+        self.screens = None
+        self.screen_buffer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="ManimalAI environment server")
+    parser.add_argument("--address", default=DEFAULT_ADDRESS,
+                        help="path of the Unix domain socket")
+    parser.add_argument("--num-envs", type=int, default=1)
+    parser.add_argument("--num-workers", type=int, default=None)
+    parser.add_argument("--width", type=int, default=256)
+    parser.add_argument("--height", type=int, default=256)
+    parser.add_argument("--task-id", nargs="+", default=["1-1-1"],
+                        help="one task id for all envs or one per env")
+    args = parser.parse_args(argv)
+
+    task_id = args.task_id[0] if len(args.task_id) == 1 else args.task_id
+    server = EnvServer(address=args.address,
+                       num_envs=args.num_envs,
+                       num_workers=args.num_workers,
+                       width=args.width,
+                       height=args.height,
+                       task_id=task_id)
+    print("Serving {} envs on {}".format(args.num_envs, args.address))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.close()
+
+
+if __name__ == '__main__':
+    main()
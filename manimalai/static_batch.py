@@ -0,0 +1,477 @@
+"""
+Static geometry batching.
+
+Immovable parts whose poses never change (the fixed stage, and the walls,
+ramps and tunnels fully specified in the arena config) are merged into one
+.obj model, which rodentia adds as a single static body and draws with one
+mesh face per texture.
+
+The model is written into the cache directory with the hash of its parts as
+the name, so it is generated once for each arena, and the least recently used
+models are removed beyond MAX_CACHED_BATCHES. The body collides with a compound
+of boxes (.col file) made of the axis aligned boxes, and of the collision
+boxes of the models which have them (e.g. the tunnels with
+tunnel_collision_proxy) in quarter turns. The other parts (ramps, rotated
+walls) are written into a second model, which is added as an invisible body
+colliding with its triangle mesh. When no part has boxes, the model itself
+collides with its triangle mesh.
+"""
+import hashlib
+import os
+
+import numpy as np
+
+from .assets import encode_png
+from .task_catalog import get_cache_dir
+
+# Bump when the generated models change
+BATCH_VERSION = 2
+
+# Number of the models kept in the batch directory
+MAX_CACHED_BATCHES = 256
+
+# Suffix of the model of the parts colliding with the triangle mesh
+MESH_SUFFIX = "_mesh"
+
+# Unit box mesh of rodentia. (MeshManager.cpp) Position, normal and uv of the
+# 4 corners of the 6 faces.
+_BOX_VERTICES = np.array([
+    # +z
+    [[-1, -1,  1,  0,  0,  1, 0, 0],
+     [ 1, -1,  1,  0,  0,  1, 1, 0],
+     [ 1,  1,  1,  0,  0,  1, 1, 1],
+     [-1,  1,  1,  0,  0,  1, 0, 1]],
+    # -z
+    [[-1, -1, -1,  0,  0, -1, 1, 0],
+     [-1,  1, -1,  0,  0, -1, 1, 1],
+     [ 1,  1, -1,  0,  0, -1, 0, 1],
+     [ 1, -1, -1,  0,  0, -1, 0, 0]],
+    # +y
+    [[-1,  1, -1,  0,  1,  0, 0, 0],
+     [-1,  1,  1,  0,  1,  0, 1, 0],
+     [ 1,  1,  1,  0,  1,  0, 1, 1],
+     [ 1,  1, -1,  0,  1,  0, 0, 1]],
+    # -y
+    [[-1, -1, -1,  0, -1,  0, 0, 0],
+     [ 1, -1, -1,  0, -1,  0, 1, 0],
+     [ 1, -1,  1,  0, -1,  0, 1, 1],
+     [-1, -1,  1,  0, -1,  0, 0, 1]],
+    # +x
+    [[ 1, -1, -1,  1,  0,  0, 1, 0],
+     [ 1,  1, -1,  1,  0,  0, 1, 1],
+     [ 1,  1,  1,  1,  0,  0, 0, 1],
+     [ 1, -1,  1,  1,  0,  0, 0, 0]],
+    # -x
+    [[-1, -1, -1, -1,  0,  0, 0, 0],
+     [-1, -1,  1, -1,  0,  0, 1, 0],
+     [-1,  1,  1, -1,  0,  0, 1, 1],
+     [-1,  1, -1, -1,  0,  0, 0, 1]],
+], dtype=np.float64)
+# Axes of the half extent scaling u and v of each face, so that textures
+# repeat as on the boxes of rodentia
+_BOX_UV_AXES = np.array([[0, 1], [0, 1], [2, 0], [2, 0], [2, 1], [2, 1]])
+# Corners of the two triangles of a face
+_QUAD_TRIANGLES = np.array([0, 1, 2, 0, 2, 3])
+
+# Same as the color textures of rodentia
+COLOR_TEXTURE_SIZE = 8
+WHITE = (255, 255, 255)
+
+
+def get_batch_dir():
+    return os.path.join(get_cache_dir(), "static_batches")
+
+
+def _color_key(color):
+    # 8 bit color quantized in the same way as rodentia
+    return tuple(int(np.float32(255.0) * np.float32(c)) for c in color)
+
+
+def _rotation_y(rot):
+    c = np.cos(rot)
+    s = np.sin(rot)
+    return np.array([[c, 0.0, s],
+                     [0.0, 1.0, 0.0],
+                     [-s, 0.0, c]])
+
+
+def _quarter_turns(rot):
+    # Number of the quarter turns of the rotation, or None for other angles
+    quarter_turns = rot / (0.5 * np.pi)
+    if abs(quarter_turns - round(quarter_turns)) > 1e-6:
+        return None
+    return int(round(quarter_turns))
+
+
+def _aligned_box(half_extent, pos, rot):
+    # (center, half extent) of the box in the world frame, or None when the box
+    # is not aligned with the axes
+    quarter_turns = _quarter_turns(rot)
+    if quarter_turns is None:
+        return None
+    hx, hy, hz = half_extent
+    if quarter_turns % 2 == 1:
+        hx, hz = hz, hx
+    return pos, (hx, hy, hz)
+
+
+# Collision file path -> (centers, half extents) of its boxes
+_collision_boxes = {}
+
+
+def _load_col(path):
+    boxes = _collision_boxes.get(path)
+    if boxes is None:
+        with open(path) as f:
+            rows = [[float(v) for v in line.split()[1:7]]
+                    for line in f if line.startswith("b ")]
+        rows = np.array(rows, dtype=np.float64).reshape(-1, 6)
+        boxes = (rows[:, 0:3], rows[:, 3:6])
+        _collision_boxes[path] = boxes
+    return boxes
+
+
+def _aligned_model_boxes(collision_path, scale, pos, rot):
+    # Boxes of the collision file in the world frame, or None when the model
+    # is not turned by quarter turns
+    if _quarter_turns(rot) is None:
+        return None
+    centers, half_extents = _load_col(collision_path)
+    scale = np.asarray(scale, dtype=np.float64)
+    centers = (centers * scale) @ _rotation_y(rot).T + np.asarray(pos, dtype=np.float64)
+    boxes = []
+    for center, half_extent in zip(centers.tolist(), (half_extents * scale).tolist()):
+        boxes.append(_aligned_box(half_extent, center, rot))
+    return boxes
+
+
+def _parse_index(value, count):
+    # 1-based, or negative from the end
+    if value == "":
+        return -1
+    index = int(value)
+    return index - 1 if index > 0 else count + index
+
+
+def _load_mtl(path):
+    # Material name -> texture path
+    textures = {}
+    name = None
+    with open(path) as f:
+        for line in f:
+            values = line.split()
+            if len(values) < 2:
+                continue
+            if values[0] == "newmtl":
+                name = values[1]
+                textures[name] = ""
+            elif values[0] == "map_Kd" and name is not None:
+                textures[name] = os.path.join(os.path.dirname(path), values[1])
+    return textures
+
+
+# Model path -> {texture path: corners}
+_model_corners = {}
+
+
+def _load_obj(path):
+    """
+    Returns the triangle corners of an .obj file grouped by the texture path
+    ("" for no texture). Corners are (positions, normals, uvs) arrays.
+    """
+    groups = _model_corners.get(path)
+    if groups is not None:
+        return groups
+
+    vertices = []
+    texcoords = []
+    normals = []
+    textures = {}
+    indices = {}
+    face_indices = indices.setdefault("", [])
+    with open(path) as f:
+        for line in f:
+            values = line.split()
+            if len(values) == 0:
+                continue
+            if values[0] == "v":
+                vertices.append([float(v) for v in values[1:4]])
+            elif values[0] == "vt":
+                texcoords.append([float(v) for v in values[1:3]])
+            elif values[0] == "vn":
+                normals.append([float(v) for v in values[1:4]])
+            elif values[0] == "mtllib":
+                textures.update(_load_mtl(os.path.join(os.path.dirname(path), values[1])))
+            elif values[0] == "usemtl":
+                face_indices = indices.setdefault(textures.get(values[1], ""), [])
+            elif values[0] == "f":
+                corners = []
+                for value in values[1:]:
+                    v, vt, vn = (value.split("/") + ["", ""])[:3]
+                    corners.append((_parse_index(v, len(vertices)),
+                                    _parse_index(vt, len(texcoords)),
+                                    _parse_index(vn, len(normals))))
+                # Polygons are split into fans of triangles
+                for i in range(1, len(corners) - 1):
+                    face_indices.extend([corners[0], corners[i], corners[i + 1]])
+
+    # Missing texture coordinates and normals are zero
+    vertices = np.array(vertices + [[0.0] * 3], dtype=np.float64)
+    texcoords = np.array(texcoords + [[0.0] * 2], dtype=np.float64)
+    normals = np.array(normals + [[0.0] * 3], dtype=np.float64)
+
+    groups = {}
+    for texture_path, face_indices in indices.items():
+        if len(face_indices) == 0:
+            continue
+        face_indices = np.array(face_indices, dtype=np.int64)
+        groups[texture_path] = (vertices[face_indices[:, 0]],
+                                normals[face_indices[:, 2]],
+                                texcoords[face_indices[:, 1]])
+    _model_corners[path] = groups
+    return groups
+
+
+def _transform(corners, scale, pos, rot):
+    positions, normals, uvs = corners
+    rotation = _rotation_y(rot)
+    scale = np.asarray(scale, dtype=np.float64)
+    positions = (positions * scale) @ rotation.T + np.asarray(pos, dtype=np.float64)
+    # Same as the normal matrix of rodentia (model matrix without translation)
+    normals = (normals * scale) @ rotation.T
+    lengths = np.linalg.norm(normals, axis=1, keepdims=True)
+    normals = normals / np.where(lengths > 0.0, lengths, 1.0)
+    return positions, normals, uvs
+
+
+def _box_corners(half_extent, pos, rot):
+    half_extent = np.asarray(half_extent, dtype=np.float64)
+    vertices = _BOX_VERTICES[:, _QUAD_TRIANGLES]
+    uv_loops = half_extent[_BOX_UV_AXES]
+    corners = (vertices[:, :, 0:3].reshape(-1, 3),
+               vertices[:, :, 3:6].reshape(-1, 3),
+               (vertices[:, :, 6:8] * uv_loops[:, None, :]).reshape(-1, 2))
+    return _transform(corners, half_extent, pos, rot)
+
+
+def _format_rows(prefix, rows):
+    return "".join("{} {}\n".format(prefix, " ".join("{:.6f}".format(v) for v in row))
+                   for row in rows.tolist())
+
+
+def _part_boxes(part):
+    # Collision boxes of the part in the world frame, or None when the part
+    # collides with its triangle mesh
+    if part[0] == "box":
+        _, half_extent, pos, rot = part[:4]
+        box = _aligned_box(half_extent, pos, rot)
+        return None if box is None else [box]
+    _, model_path, scale, pos, rot, material, collision_path = part
+    if collision_path is None:
+        return None
+    return _aligned_model_boxes(collision_path, scale, pos, rot)
+
+
+def _write_file(path, data):
+    # Written next to the file and swapped in, so that other processes never
+    # see a partial file
+    tmp_path = "{}.{}.tmp".format(path, os.getpid())
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class StaticBatch:
+    """
+    Immovable parts merged into one model.
+
+    Boxes have a color or a texture, and models (.obj files) are drawn with
+    their own textures unless a color is given. Invisible boxes only collide,
+    and they need the compound of boxes. Parts added with a kind are listed
+    in kinds, specs, positions and rotations, which stand in for the objects
+    in the state observation and the semantic map.
+    """
+
+    def __init__(self, directory=None):
+        if directory is None:
+            directory = get_batch_dir()
+        self.directory = directory
+        # Arguments of the parts, which determine the model
+        self.parts = []
+        self.kinds = []
+        # (shape, kwargs) in the same form as the specs of the stage objects
+        self.specs = []
+        # World positions and rotation quaternions (x, y, z, w)
+        self.positions = []
+        self.rotations = []
+        self._key = None
+
+    def __len__(self):
+        return len(self.parts)
+
+    def _add(self, part, kind, spec, pos, rot):
+        self.parts.append(part)
+        self._key = None
+        if kind is not None:
+            self.kinds.append(kind)
+            self.specs.append(spec)
+            self.positions.append([float(v) for v in pos])
+            self.rotations.append([0.0, float(np.sin(rot * 0.5)), 0.0, float(np.cos(rot * 0.5))])
+
+    def add_box(self, half_extent, pos, rot, color=None, texture_path=None, visible=True,
+                kind=None):
+        half_extent = tuple(float(v) for v in half_extent)
+        if texture_path is not None:
+            material = texture_path
+        elif color is not None:
+            material = _color_key(color)
+        else:
+            material = WHITE
+        part = ("box", half_extent, tuple(float(v) for v in pos), float(rot), material,
+                bool(visible))
+        self._add(part, kind, ("box", {"half_extent": list(half_extent)}), pos, rot)
+
+    def add_model(self, path, scale, pos, rot, color=None, collision_path=None, kind=None):
+        # collision_path is a .col file of boxes which stands in for the mesh
+        # in the collision when the model is turned by quarter turns
+        scale = tuple(float(v) for v in scale)
+        material = None if color is None else _color_key(color)
+        part = ("model", path, scale, tuple(float(v) for v in pos), float(rot), material,
+                collision_path)
+        self._add(part, kind, ("model", {"path": path, "scale": list(scale)}), pos, rot)
+
+    @property
+    def key(self):
+        """ Hash of the parts, which is the name of the model. """
+        if self._key is None:
+            description = repr((BATCH_VERSION, self.parts)).encode("utf-8")
+            self._key = hashlib.sha1(description).hexdigest()
+        return self._key
+
+    @property
+    def compound(self):
+        """ Whether the body collides with a compound of boxes. """
+        return any(_part_boxes(part) is not None for part in self.parts)
+
+    @property
+    def mesh_path(self):
+        """
+        Path of the model of the parts colliding with the triangle mesh, which
+        is added as an invisible body next to the compound of boxes, or None.
+        """
+        if not self.compound or all(_part_boxes(part) is not None for part in self.parts):
+            return None
+        return os.path.join(self.directory, self.key + MESH_SUFFIX + ".obj")
+
+    def _material_texture(self, material):
+        # Path of the texture in the .mtl file, relative to the model
+        if isinstance(material, tuple):
+            name = "color_{:02x}{:02x}{:02x}.png".format(*material)
+            path = os.path.join(self.directory, name)
+            if not os.path.exists(path):
+                image = np.empty((COLOR_TEXTURE_SIZE, COLOR_TEXTURE_SIZE, 3), dtype=np.uint8)
+                image[:, :] = material
+                _write_file(path, encode_png(image))
+            return name
+        return os.path.relpath(material, self.directory)
+
+    def _write_model(self, name, groups):
+        # Writes the .mtl and .obj files of the corners grouped by material
+        mtl_lines = []
+        obj_chunks = ["mtllib {}.mtl\n".format(name)]
+        num_corners = 0
+        for i, (material, corners) in enumerate(groups.items()):
+            mtl_lines.append("newmtl m{}\nmap_Kd {}\n".format(i, self._material_texture(material)))
+            positions, normals, uvs = (np.concatenate(arrays) for arrays in zip(*corners))
+            obj_chunks.append(_format_rows("v", positions))
+            obj_chunks.append(_format_rows("vt", uvs))
+            obj_chunks.append(_format_rows("vn", normals))
+            obj_chunks.append("usemtl m{}\n".format(i))
+            indices = np.arange(num_corners + 1, num_corners + len(positions) + 1)
+            obj_chunks.append("".join("f {0}/{0}/{0} {1}/{1}/{1} {2}/{2}/{2}\n".format(*face)
+                                      for face in indices.reshape(-1, 3).tolist()))
+            num_corners += len(positions)
+
+        _write_file(os.path.join(self.directory, name + ".mtl"),
+                    "".join(mtl_lines).encode("utf-8"))
+        _write_file(os.path.join(self.directory, name + ".obj"),
+                    "".join(obj_chunks).encode("utf-8"))
+
+    def write(self):
+        """ Writes the models unless they exist, and returns the path of the .obj file. """
+        path = os.path.join(self.directory, self.key + ".obj")
+        if os.path.exists(path):
+            # Marks the model as recently used
+            try:
+                os.utime(path)
+            except OSError:
+                pass
+            return path
+
+        compound = self.compound
+        # Material (color or texture path) -> transformed corners, of the drawn
+        # model and of the model colliding with the triangle mesh
+        groups = {}
+        mesh_groups = {}
+        boxes = []
+        for part in self.parts:
+            part_boxes = _part_boxes(part) if compound else None
+            if part[0] == "box":
+                _, half_extent, pos, rot, material, visible = part
+                if not visible and not compound:
+                    raise ValueError("Invisible parts need a compound of boxes")
+                part_corners = {material: [_box_corners(half_extent, pos, rot)]}
+            else:
+                _, model_path, scale, pos, rot, material, _ = part
+                visible = True
+                part_corners = {}
+                for texture_path, corners in _load_obj(model_path).items():
+                    if material is not None:
+                        key = material
+                    else:
+                        key = texture_path or WHITE
+                    part_corners.setdefault(key, []).append(_transform(corners, scale, pos, rot))
+
+            if part_boxes is not None:
+                boxes.extend(part_boxes)
+            elif compound:
+                # Only collides, so the material does not matter
+                for corners in part_corners.values():
+                    mesh_groups.setdefault(WHITE, []).extend(corners)
+            if visible:
+                for key, corners in part_corners.items():
+                    groups.setdefault(key, []).extend(corners)
+
+        os.makedirs(self.directory, exist_ok=True)
+        name = self.key
+        if compound:
+            col_lines = ["b {:.6f} {:.6f} {:.6f} {:.6f} {:.6f} {:.6f}\n".format(
+                *(tuple(pos) + tuple(half))) for pos, half in boxes]
+            _write_file(os.path.join(self.directory, name + ".col"),
+                        "".join(col_lines).encode("utf-8"))
+        if len(mesh_groups) > 0:
+            self._write_model(name + MESH_SUFFIX, mesh_groups)
+        # The drawn .obj file is written last, as it marks the complete models
+        self._write_model(name, groups)
+        _evict(self.directory, MAX_CACHED_BATCHES)
+        return path
+
+
+def _evict(directory, max_batches):
+    # Removes the least recently used models beyond max_batches
+    paths = []
+    for entry in os.scandir(directory):
+        if entry.name.endswith(".obj") and not entry.name.endswith(MESH_SUFFIX + ".obj"):
+            try:
+                paths.append((entry.stat().st_mtime_ns, entry.path))
+            except OSError:
+                pass
+    paths.sort()
+    for _, path in paths[:max(len(paths) - max_batches, 0)]:
+        base = path[:-len(".obj")]
+        # The .obj file is removed first, as it marks the complete models
+        for suffix in (".obj", ".mtl", ".col", MESH_SUFFIX + ".obj", MESH_SUFFIX + ".mtl"):
+            try:
+                os.remove(base + suffix)
+            except OSError:
+                pass
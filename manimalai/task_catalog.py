@@ -0,0 +1,288 @@
+import json
+import os
+import threading
+import warnings
+import zlib
+
+from .arena_config import ArenaConfig, Arena, Item, Vector3, RGB
+
+CONFIG_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configurations")
+
+# Bump when the layout of the cached data changes
+CACHE_VERSION = 2
+
+# Classes of the arena objects stored in the cache
+_ARENA_TYPES = {cls.__name__: cls for cls in (Arena, Item, Vector3, RGB)}
+
+
+def get_cache_dir():
+    cache_dir = os.environ.get("MANIMALAI_CACHE_DIR")
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.expanduser("~"), ".cache", "manimalai")
+    return cache_dir
+
+
+class ArenaInfo:
+    """ Metadata of one arena which can be queried without building the arena. """
+
+    def __init__(self, task_id, arena_index, t, pass_mark, blackouts, item_counts):
+        self.task_id = task_id
+        self.arena_index = arena_index
+        self.t = t
+        self.pass_mark = pass_mark
+        self.blackouts = blackouts
+        # Dictionary of item name to the number of its elements
+        self.item_counts = item_counts
+
+    @property
+    def category(self):
+        return self.task_id.split("-")[0]
+
+    @property
+    def num_items(self):
+        return sum(self.item_counts.values())
+
+    def __repr__(self):
+        return "ArenaInfo(task_id={!r}, arena_index={}, t={}, pass_mark={})".format(
+            self.task_id, self.arena_index, self.t, self.pass_mark)
+
+
+def _item_element_size(item):
+    return max(len(item.positions),
+               len(item.rotations),
+               len(item.sizes),
+               len(item.colors))
+
+
+def _encode_arena_object(obj):
+    name = type(obj).__name__
+    if name not in _ARENA_TYPES:
+        raise TypeError("Can not store {} in the catalog".format(name))
+    fields = dict(vars(obj))
+    fields["__type__"] = name
+    return fields
+
+
+def _decode_arena_object(fields):
+    name = fields.pop("__type__", None)
+    if name is None:
+        return fields
+    # Fields are set as they are, like the yaml loader does
+    obj = _ARENA_TYPES[name].__new__(_ARENA_TYPES[name])
+    obj.__dict__.update(fields)
+    return obj
+
+
+def _dump_arenas(arenas):
+    return json.dumps(sorted(arenas.items()), default=_encode_arena_object)
+
+
+def _load_arenas(data):
+    return {index: arena
+            for index, arena in json.loads(data, object_hook=_decode_arena_object)}
+
+
+def _compile_config(path):
+    # Parse a yaml file into the compact form stored in the cache.
+    # The arenas are kept as a JSON string so that loading the catalog does not
+    # have to rebuild every arena object.
+    arenas = ArenaConfig(path).arenas
+
+    infos = []
+    for arena_index in sorted(arenas.keys()):
+        arena = arenas[arena_index]
+        item_counts = {}
+        for item in arena.items:
+            item_counts[item.name] = item_counts.get(item.name, 0) + \
+                                     _item_element_size(item)
+        infos.append((arena_index,
+                      arena.t,
+                      arena.pass_mark,
+                      tuple(arena.blackouts),
+                      item_counts))
+
+    return infos, _dump_arenas(arenas)
+
+
+class TaskCatalog:
+    """
+    Catalog of the arena configurations compiled into a binary cache.
+
+    Each yaml file is parsed once and the result is stored in the JSON cache
+    file together with the file's mtime and size. Entries whose files changed
+    are recompiled on the next load. Files which can not be parsed are left
+    out of the catalog with a warning, and their errors are kept in errors.
+    """
+
+    def __init__(self, config_dir=CONFIG_DIR, cache_path=None, use_cache=True):
+        self.config_dir = config_dir
+
+        if cache_path is None and use_cache:
+            key = zlib.crc32(os.path.abspath(config_dir).encode("utf-8"))
+            cache_path = os.path.join(get_cache_dir(),
+                                      "catalog-v{}-{:08x}.json".format(CACHE_VERSION, key))
+        self.cache_path = cache_path
+
+        self.lock = threading.Lock()
+        # task_id -> (stamp, infos, arenas in JSON)
+        self.entries = {}
+        # task_id -> error message of the files which can not be parsed
+        self.errors = {}
+        # (task_id, arena_index) -> Arena
+        self.arena_cache = {}
+        # task_id -> {arena_index: ArenaInfo}
+        self.info_cache = {}
+
+        self._load()
+
+    def _scan(self):
+        stamps = {}
+        for entry in os.scandir(self.config_dir):
+            if entry.is_file() and entry.name.endswith(".yml"):
+                stat = entry.stat()
+                stamps[entry.name[:-4]] = [stat.st_mtime_ns, stat.st_size]
+        return stamps
+
+    def _read_cache(self):
+        if self.cache_path is None or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r") as f:
+                cache = json.load(f)
+            if cache["version"] != CACHE_VERSION:
+                return {}
+            return {task_id: tuple(entry) for task_id, entry in cache["entries"].items()}
+        except Exception:
+            # Broken cache is simply rebuilt
+            return {}
+
+    def _write_cache(self):
+        if self.cache_path is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+            tmp_path = "{}.{}.tmp".format(self.cache_path, os.getpid())
+            with open(tmp_path, "w") as f:
+                json.dump({"version": CACHE_VERSION, "entries": self.entries}, f)
+            # Atomic replace so that concurrent processes never see a partial file
+            os.replace(tmp_path, self.cache_path)
+        except OSError:
+            # Read-only home directory etc. The catalog still works without cache.
+            pass
+
+    def _load(self):
+        stamps = self._scan()
+        cached_entries = self._read_cache()
+
+        updated = False
+
+        for task_id, stamp in stamps.items():
+            entry = cached_entries.get(task_id)
+            if entry is None or entry[0] != stamp:
+                path = os.path.join(self.config_dir, task_id + ".yml")
+                try:
+                    infos, data = _compile_config(path)
+                except Exception as e:
+                    self.errors[task_id] = "{}: {}".format(type(e).__name__, e)
+                    warnings.warn("Skipped {}: {}".format(path, self.errors[task_id]))
+                    continue
+                entry = (stamp, infos, data)
+                updated = True
+            self.entries[task_id] = entry
+
+        if updated or set(cached_entries) != set(self.entries):
+            self._write_cache()
+
+    def _get_entry(self, task_id):
+        entry = self.entries.get(task_id)
+        if entry is None:
+            raise KeyError("Unknown task_id: {}".format(task_id))
+        return entry
+
+    def task_ids(self, category=None):
+        task_ids = sorted(self.entries.keys())
+        if category is not None:
+            category = str(category)
+            task_ids = [task_id for task_id in task_ids
+                        if task_id.split("-")[0] == category]
+        return task_ids
+
+    def __contains__(self, task_id):
+        return task_id in self.entries
+
+    def __len__(self):
+        return len(self.entries)
+
+    def num_arenas(self, task_id):
+        return len(self._get_entry(task_id)[1])
+
+    def arena_indices(self, task_id):
+        return [info[0] for info in self._get_entry(task_id)[1]]
+
+    def get_infos(self, task_id):
+        infos = self.info_cache.get(task_id)
+        if infos is None:
+            infos = {}
+            for arena_index, t, pass_mark, blackouts, item_counts in \
+                self._get_entry(task_id)[1]:
+                infos[arena_index] = ArenaInfo(task_id, arena_index, t, pass_mark,
+                                               tuple(blackouts), item_counts)
+            self.info_cache[task_id] = infos
+        return infos
+
+    def get_info(self, task_id, arena_index=0):
+        infos = self.get_infos(task_id)
+        if arena_index not in infos:
+            raise KeyError("Unknown arena_index {} for task_id {}".format(arena_index,
+                                                                         task_id))
+        return infos[arena_index]
+
+    def all_infos(self, category=None):
+        infos = []
+        for task_id in self.task_ids(category):
+            task_infos = self.get_infos(task_id)
+            for arena_index in sorted(task_infos.keys()):
+                infos.append(task_infos[arena_index])
+        return infos
+
+    def get_arena(self, task_id, arena_index=0):
+        # Returned arena is shared within the process, so it must be treated
+        # as read-only.
+        key = (task_id, arena_index)
+        arena = self.arena_cache.get(key)
+        if arena is not None:
+            return arena
+
+        with self.lock:
+            arena = self.arena_cache.get(key)
+            if arena is None:
+                arenas = _load_arenas(self._get_entry(task_id)[2])
+                for index, task_arena in arenas.items():
+                    self.arena_cache[(task_id, index)] = task_arena
+                arena = self.arena_cache.get(key)
+        if arena is None:
+            raise KeyError("Unknown arena_index {} for task_id {}".format(arena_index,
+                                                                         task_id))
+        return arena
+
+
+_catalog = None
+_catalog_lock = threading.Lock()
+
+
+def get_catalog():
+    """ Returns the process-wide catalog of the bundled configurations. """
+    global _catalog
+    if _catalog is None:
+        with _catalog_lock:
+            if _catalog is None:
+                _catalog = TaskCatalog()
+    return _catalog
+
+
+def get_arena(task_id, arena_index=0):
+    return get_catalog().get_arena(task_id, arena_index)
+
+
+def get_info(task_id, arena_index=0):
+    return get_catalog().get_info(task_id, arena_index)
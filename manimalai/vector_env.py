@@ -0,0 +1,417 @@
+import multiprocessing as mp
+import traceback
+from multiprocessing import shared_memory
+
+import gym
+import gym.spaces
+import numpy as np
+
+from .environment import AAIEnvironment, MultiTaskAAIEnvironment
+from .observation import ScreenProcessor
+
+
+class SharedArray:
+    """ numpy array backed by a named shared memory block. """
+
+    def __init__(self, shape, dtype, name=None):
+        self.shape = tuple(shape)
+        self.dtype = np.dtype(dtype)
+
+        if name is None:
+            size = max(int(np.prod(self.shape)) * self.dtype.itemsize, 1)
+            self.shm = shared_memory.SharedMemory(create=True, size=size)
+            self.owner = True
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+            self.owner = False
+
+        self.array = np.ndarray(self.shape, dtype=self.dtype, buffer=self.shm.buf)
+
+    @property
+    def spec(self):
+        # Everything needed to attach the same block from another process
+        return (self.shape, self.dtype.str, self.shm.name)
+
+    @classmethod
+    def attach(cls, spec):
+        shape, dtype, name = spec
+        return cls(shape, dtype, name=name)
+
+    def close(self):
+        if self.shm is None:
+            return
+        # Drop the view before closing, otherwise the buffer is still exported
+        self.array = None
+        try:
+            self.shm.close()
+        except BufferError:
+            # Views are still referenced by the caller. The mapping is
+            # released together with them.
+            pass
+        if self.owner:
+            self.shm.unlink()
+        self.shm = None
+
+
+class VectorBuffers:
+    """ Shared batch buffers for screens, actions, rewards, terminals and velocities. """
+
+    NAMES = ("screens", "actions", "rewards", "terminals", "velocities")
+
+    def __init__(self, arrays):
+        self.screens    = arrays["screens"]
+        self.actions    = arrays["actions"]
+        self.rewards    = arrays["rewards"]
+        self.terminals  = arrays["terminals"]
+        self.velocities = arrays["velocities"]
+
+    @classmethod
+    def create(cls, num_envs, screen_shape, screen_dtype=np.uint8):
+        return cls({
+            "screens": SharedArray((num_envs,) + tuple(screen_shape), screen_dtype),
+            "actions": SharedArray((num_envs, 2), np.int32),
+            "rewards": SharedArray((num_envs,), np.float32),
+            "terminals": SharedArray((num_envs,), np.bool_),
+            "velocities": SharedArray((num_envs, 3), np.float32),
+        })
+
+    @classmethod
+    def attach(cls, specs):
+        return cls({name: SharedArray.attach(specs[name]) for name in cls.NAMES})
+
+    @property
+    def specs(self):
+        return {name: getattr(self, name).spec for name in self.NAMES}
+
+    def close(self):
+        for name in self.NAMES:
+            getattr(self, name).close()
+
+
+def _worker_loop(remote, env_indices, env_kwargs_list, buffers):
+    screens    = buffers.screens.array
+    actions    = buffers.actions.array
+    rewards    = buffers.rewards.array
+    terminals  = buffers.terminals.array
+    velocities = buffers.velocities.array
+
+    envs = []
+    try:
+        for env_kwargs in env_kwargs_list:
+            if "tasks" in env_kwargs:
+                envs.append(MultiTaskAAIEnvironment(**env_kwargs))
+            else:
+                envs.append(AAIEnvironment(**env_kwargs))
+
+        # Envs write their screens directly into the shared batch array
+        slots = [screens[index] for index in env_indices]
+        for env, slot in zip(envs, slots):
+            env.set_obs_buffer(slot)
+    except Exception:
+        remote.send((False, traceback.format_exc()))
+        for env in envs:
+            env.close()
+        return
+
+    remote.send((True, None))
+
+    while True:
+        try:
+            command, data = remote.recv()
+        except EOFError:
+            break
+
+        try:
+            if command in ("step", "reset"):
+                # data is the set of env indices to process (None for all)
+                targets = [(index, env, slot)
+                           for index, env, slot in zip(env_indices, envs, slots)
+                           if data is None or index in data]
+
+            if command == "step":
+                for index, env, slot in targets:
+                    screen, reward, terminal, info = env.step(actions[index])
+                    if screen is not slot:
+                        slot[...] = screen
+                    rewards[index] = reward
+                    terminals[index] = terminal
+                    velocities[index] = info["local_velocity"]
+                remote.send((True, None))
+            elif command == "reset":
+                for index, env, slot in targets:
+                    screen = env.reset()
+                    if screen is not slot:
+                        slot[...] = screen
+                    rewards[index] = 0.0
+                    terminals[index] = False
+                    velocities[index] = 0.0
+                remote.send((True, None))
+            elif command == "call":
+                name, args, kwargs = data
+                results = [getattr(env, name)(*args, **kwargs) for env in envs]
+                remote.send((True, results))
+            elif command == "close":
+                remote.send((True, None))
+                break
+            else:
+                raise ValueError("Unknown command: {}".format(command))
+        except Exception:
+            remote.send((False, traceback.format_exc()))
+
+    for env in envs:
+        env.close()
+
+
+def _worker(remote, parent_remote, env_indices, env_kwargs_list, buffer_specs):
+    parent_remote.close()
+
+    buffers = None
+    try:
+        buffers = VectorBuffers.attach(buffer_specs)
+        # Views of the shared memory are released when the loop returns
+        _worker_loop(remote, env_indices, env_kwargs_list, buffers)
+    except Exception:
+        remote.send((False, traceback.format_exc()))
+    finally:
+        if buffers is not None:
+            buffers.close()
+        remote.close()
+
+
+class AAIVectorEnv:
+    """
+    Runs num_envs AAIEnvironment instances on a pool of worker processes.
+
+    Screens are written by the workers directly into one shared batch array
+    of shape (num_envs, height, width, 3), and rewards, terminals and
+    local velocities are returned as contiguous numpy arrays. Only small
+    command messages go through the pipes.
+
+    When env_kwargs contains tasks, MultiTaskAAIEnvironment is used and
+    task_id and arena_index are ignored. When env_kwargs contains seed, env i
+    is seeded with seed + i so that the envs draw different item placements.
+
+    reset(), step_async() and step() take an optional list of env indices to
+    process only a subset of the envs. The returned arrays then contain the
+    rows of those envs.
+    """
+
+    def __init__(self,
+                 num_envs,
+                 num_workers=None,
+                 width=256,
+                 height=256,
+                 task_id="1-1-1",
+                 arena_index=0,
+                 env_kwargs=None,
+                 copy=False,
+                 context=None):
+        self.num_envs = num_envs
+        self.width = width
+        self.height = height
+        # When copy is False, returned screens are views of the shared buffer
+        # and will be overwritten by the next step or reset.
+        self.copy = copy
+
+        if num_workers is None:
+            num_workers = min(num_envs, mp.cpu_count())
+        num_workers = max(1, min(num_workers, num_envs))
+
+        env_kwargs = dict(env_kwargs or {})
+        if "obs_buffer" in env_kwargs:
+            raise ValueError("obs_buffer can not be used with AAIVectorEnv")
+        if env_kwargs.get("obs_type", "screen") != "screen":
+            raise ValueError("AAIVectorEnv only supports screen observations")
+
+        # Screen format after the conversion in each env
+        processor = ScreenProcessor(width, height,
+                                    layout=env_kwargs.get("obs_layout", "HWC"),
+                                    dtype=env_kwargs.get("obs_dtype", np.uint8),
+                                    grayscale=env_kwargs.get("grayscale", False),
+                                    downsample=env_kwargs.get("downsample", 1))
+
+        task_ids = self._expand(task_id)
+        arena_indices = self._expand(arena_index)
+
+        env_kwargs_list = []
+        for i in range(num_envs):
+            kwargs = dict(env_kwargs)
+            kwargs.update(width=width, height=height)
+            if "tasks" not in env_kwargs:
+                # Tasks are sampled by MultiTaskAAIEnvironment when tasks is given
+                kwargs.update(task_id=task_ids[i], arena_index=arena_indices[i])
+            if env_kwargs.get("seed") is not None:
+                kwargs["seed"] = env_kwargs["seed"] + i
+            env_kwargs_list.append(kwargs)
+
+        # Gym setting
+        self.single_action_space = gym.spaces.MultiDiscrete((3,3))
+        self.single_observation_space = processor.observation_space()
+        self.action_space = gym.spaces.MultiDiscrete(
+            np.full((num_envs, 2), 3, dtype=np.int64))
+        self.observation_space = gym.spaces.Box(
+            low=0,
+            high=processor.high,
+            shape=(num_envs,) + processor.shape,
+            dtype=processor.dtype
+        )
+
+        self.buffers = VectorBuffers.create(num_envs, processor.shape, processor.dtype)
+
+        ctx = mp.get_context(context)
+        self.worker_env_indices = np.array_split(np.arange(num_envs), num_workers)
+        # Worker index of each env
+        self.env_workers = np.zeros(num_envs, dtype=np.int64)
+        for worker_index, env_indices in enumerate(self.worker_env_indices):
+            self.env_workers[env_indices] = worker_index
+        self.remotes = []
+        self.processes = []
+
+        for env_indices in self.worker_env_indices:
+            remote, worker_remote = ctx.Pipe()
+            process = ctx.Process(
+                target=_worker,
+                args=(worker_remote,
+                      remote,
+                      env_indices.tolist(),
+                      [env_kwargs_list[i] for i in env_indices],
+                      self.buffers.specs),
+                daemon=True)
+            process.start()
+            worker_remote.close()
+            self.remotes.append(remote)
+            self.processes.append(process)
+
+        self.waiting = False
+        self.waiting_remotes = None
+        self.waiting_env_ids = None
+        self.closed = False
+        self._receive_all()
+
+    def _expand(self, value):
+        if isinstance(value, (list, tuple)):
+            if len(value) != self.num_envs:
+                raise ValueError("Expected {} values, got {}".format(self.num_envs,
+                                                                     len(value)))
+            return list(value)
+        return [value] * self.num_envs
+
+    def _receive_all(self, remotes=None):
+        results = []
+        errors = []
+        for remote in (self.remotes if remotes is None else remotes):
+            success, result = remote.recv()
+            if success:
+                results.append(result)
+            else:
+                errors.append(result)
+        if len(errors) > 0:
+            raise RuntimeError("Worker failed:\n{}".format(errors[0]))
+        return results
+
+    def _send_all(self, command, data=None):
+        for remote in self.remotes:
+            remote.send((command, data))
+
+    def _send_envs(self, command, env_ids):
+        # Send the command only to the workers owning env_ids.
+        # Returns the remotes to receive from.
+        if env_ids is None:
+            self._send_all(command)
+            return self.remotes
+        worker_indices = sorted(set(self.env_workers[env_ids].tolist()))
+        env_ids = set(env_ids.tolist())
+        remotes = [self.remotes[i] for i in worker_indices]
+        for remote in remotes:
+            remote.send((command, env_ids))
+        return remotes
+
+    def _check_env_ids(self, env_ids):
+        if env_ids is None:
+            return None
+        env_ids = np.asarray(env_ids, dtype=np.int64)
+        if env_ids.ndim != 1 or len(np.unique(env_ids)) != len(env_ids):
+            raise ValueError("env_ids must be a list of unique env indices")
+        if len(env_ids) > 0 and (env_ids.min() < 0 or env_ids.max() >= self.num_envs):
+            raise ValueError("env_ids out of range: {}".format(env_ids))
+        return env_ids
+
+    def _output(self, array, env_ids=None):
+        if env_ids is not None:
+            # Fancy indexing always copies
+            return array[env_ids]
+        if self.copy:
+            return array.copy()
+        return array
+
+    def reset(self, env_ids=None):
+        env_ids = self._check_env_ids(env_ids)
+        remotes = self._send_envs("reset", env_ids)
+        self._receive_all(remotes)
+        return self._output(self.buffers.screens.array, env_ids)
+
+    def step_async(self, actions, env_ids=None):
+        if self.waiting:
+            raise RuntimeError("step_async() called while waiting for step_wait()")
+        env_ids = self._check_env_ids(env_ids)
+        if env_ids is None:
+            self.buffers.actions.array[:] = actions
+        else:
+            self.buffers.actions.array[env_ids] = actions
+        self.waiting_remotes = self._send_envs("step", env_ids)
+        self.waiting_env_ids = env_ids
+        self.waiting = True
+
+    def step_wait(self):
+        if not self.waiting:
+            raise RuntimeError("step_wait() called without step_async()")
+        self._receive_all(self.waiting_remotes)
+        self.waiting = False
+        env_ids = self.waiting_env_ids
+
+        info = {}
+        info["local_velocity"] = self._output(self.buffers.velocities.array, env_ids)
+
+        return self._output(self.buffers.screens.array, env_ids), \
+            self._output(self.buffers.rewards.array, env_ids), \
+            self._output(self.buffers.terminals.array, env_ids), \
+            info
+
+    def step(self, actions, env_ids=None):
+        self.step_async(actions, env_ids)
+        return self.step_wait()
+
+    def call(self, name, *args, **kwargs):
+        # Call a method on every env and return the results in env order
+        self._send_all("call", (name, args, kwargs))
+        results = []
+        for worker_results in self._receive_all():
+            results.extend(worker_results)
+        return results
+
+    def get_profile(self):
+        # Phase timings of each env. (env_kwargs has to enable profile)
+        return self.call("get_profile")
+
+    def close(self):
+        if self.closed:
+            return
+        if self.waiting:
+            self._receive_all(self.waiting_remotes)
+            self.waiting = False
+        for remote in self.remotes:
+            try:
+                remote.send(("close", None))
+                remote.recv()
+            except (BrokenPipeError, EOFError):
+                pass
+        for process in self.processes:
+            process.join()
+        for remote in self.remotes:
+            remote.close()
+        self.buffers.close()
+        self.closed = True
+
+    def __del__(self):
+        if not getattr(self, "closed", True):
+            self.close()
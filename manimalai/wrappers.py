@@ -0,0 +1,117 @@
+import gym
+import gym.spaces
+import numpy as np
+
+
+class FrameStack(gym.Wrapper):
+    """
+    Stacks the last num_frames screens into an array of shape
+    (num_frames,) + screen shape, oldest first.
+
+    Frames are kept in a ring buffer of 2 * num_frames frames where every frame
+    is written twice, num_frames apart, so that the last num_frames frames are
+    always a contiguous slice. The returned stack is a view of the buffer and
+    will be overwritten by the following steps unless copy is True.
+
+    AAIEnvironment renders the next frame directly into the buffer. When an
+    episode ends, the observation returned by step() is the first frame of the
+    next episode (automatic reset), and the stack is cleared with it. With
+    zero_fill, the older frames of a new episode are zeros instead of copies of
+    the first frame.
+    """
+
+    def __init__(self, env, num_frames=4, copy=False, zero_fill=False):
+        super().__init__(env)
+
+        space = env.observation_space
+        if not isinstance(space, gym.spaces.Box):
+            raise ValueError("FrameStack only supports screen observations")
+        if num_frames < 1:
+            raise ValueError("num_frames must be >= 1: {}".format(num_frames))
+
+        self.num_frames = num_frames
+        self.copy = copy
+        self.zero_fill = zero_fill
+        self.frame_shape = space.shape
+
+        self.buffer = np.zeros((2 * num_frames,) + space.shape, dtype=space.dtype)
+        # Stack is buffer[start:start+num_frames]
+        self.start = 0
+
+        low = np.broadcast_to(space.low, space.shape)
+        high = np.broadcast_to(space.high, space.shape)
+        self.observation_space = gym.spaces.Box(
+            low=np.repeat(low[None], num_frames, axis=0),
+            high=np.repeat(high[None], num_frames, axis=0),
+            dtype=space.dtype)
+
+        # Write screens directly into the ring buffer when the env supports it
+        self.direct = False
+        unwrapped = env.unwrapped
+        if hasattr(unwrapped, "set_obs_buffer") and \
+           unwrapped.observation_space.shape == space.shape and \
+           unwrapped.observation_space.dtype == space.dtype:
+            try:
+                unwrapped.set_obs_buffer(self.buffer[0])
+                unwrapped.set_obs_buffer(None)
+                self.direct = True
+            except ValueError:
+                pass
+
+    def _next_index(self):
+        # Index of the slot receiving the next frame
+        return (self.start + 1) % self.num_frames + self.num_frames - 1
+
+    def _mirror_index(self, index):
+        if index >= self.num_frames:
+            return index - self.num_frames
+        return index + self.num_frames
+
+    def _prepare_slot(self, index):
+        if self.direct:
+            self.env.unwrapped.set_obs_buffer(self.buffer[index])
+
+    def _write_frame(self, index, frame):
+        slot = self.buffer[index]
+        if frame is not slot:
+            slot[...] = frame
+        self.buffer[self._mirror_index(index)] = slot
+
+    def _stack(self):
+        stack = self.buffer[self.start:self.start + self.num_frames]
+        if self.copy:
+            return stack.copy()
+        return stack
+
+    def _clear(self, index):
+        # Fill the stack ending at index with the frame at index
+        frame = self.buffer[index]
+        fill = 0 if self.zero_fill else frame
+        self.buffer[:index] = fill
+        self.buffer[index + 1:] = fill
+        self.buffer[self._mirror_index(index)] = frame
+
+    def reset(self, **kwargs):
+        index = self._next_index()
+        self._prepare_slot(index)
+        frame = self.env.reset(**kwargs)
+        self.start = index - self.num_frames + 1
+        self._write_frame(index, frame)
+        self._clear(index)
+        return self._stack()
+
+    def step(self, action):
+        index = self._next_index()
+        self._prepare_slot(index)
+        frame, reward, terminal, info = self.env.step(action)
+        self.start = index - self.num_frames + 1
+        self._write_frame(index, frame)
+        if terminal:
+            # Frame is the first one of the next episode
+            self._clear(index)
+        return self._stack(), reward, terminal, info
+
+    def close(self):
+        if self.direct:
+            self.env.unwrapped.set_obs_buffer(None)
+        return super().close()
@@ -27,8 +27,12 @@ setup(
     author_email='miyosuda@gmail.com',
 
     install_requires=['gym(>=0.18.0)', 'rodentia(>=0.0.8)', 'PyYAML(>=5.3)'],
+    # Pillow downscales the textures of the lower levels of detail
+    extras_require={'lod': ['Pillow']},
     packages=['manimalai'],
     package_dir={'manimalai': 'manimalai'},
+    # gym (>= 0.24) registers the ids on import without importing manimalai
+    entry_points={'gym.envs': ['__root__ = manimalai.registration:register_envs']},
     package_data={'manimalai': ['data/*/*.obj',
                                 'data/*/*.mtl',
                                 'data/*/*.png',
@@ -0,0 +1,111 @@
+import unittest
+
+import numpy as np
+
+from manimalai.arena_generator import ArenaGenerator, ItemSpec, ARENA_SIZE
+from manimalai.environment import AAIEnvironment, OBS_TYPE_STATE, OBJ_TYPE_GOOD_GOAL, \
+    OBJ_TYPE_WALL, OBJ_TYPE_CARDBOX1
+
+
+def _circles(arena):
+    circles = []
+    for item in arena.items:
+        for i, pos in enumerate(item.positions):
+            if i < len(item.sizes):
+                size = item.sizes[i]
+                radius = 0.5 * np.hypot(size.x, size.z)
+            else:
+                radius = 0.5
+            circles.append((pos.x, pos.z, radius))
+    return np.array(circles)
+
+
+class ArenaGeneratorTest(unittest.TestCase):
+    def setUp(self):
+        self.specs = [
+            ItemSpec("Wall", count=(2, 6), size_min=(1, 1, 1), size_max=(6, 3, 1)),
+            ItemSpec("GoodGoal", count=1, size_min=(1, 1, 1), size_max=(3, 3, 3),
+                     rotate=False),
+            ItemSpec("Cardbox1", count=(0, 3), size_min=(1, 1, 1), size_max=(2, 2, 2),
+                     color=(255, 0, 0)),
+        ]
+
+    def test_no_overlap(self):
+        generator = ArenaGenerator(self.specs, seed=0)
+        for i in range(50):
+            arena = generator.generate()
+            self.assertEqual(arena.items[0].name, "Agent")
+            circles = _circles(arena)
+            centers = circles[:, :2]
+            radii = circles[:, 2]
+            # Inside the outer walls
+            self.assertTrue(np.all(centers - radii[:, None] >= 0.0))
+            self.assertTrue(np.all(centers + radii[:, None] <= ARENA_SIZE))
+            distances = np.linalg.norm(centers[:, None] - centers[None], axis=2)
+            min_distances = radii[:, None] + radii[None]
+            np.fill_diagonal(distances, np.inf)
+            self.assertTrue(np.all(distances >= min_distances))
+
+    def test_seed(self):
+        arena0 = ArenaGenerator(self.specs, seed=3).generate()
+        arena1 = ArenaGenerator(self.specs, seed=3).generate()
+        np.testing.assert_array_equal(_circles(arena0), _circles(arena1))
+
+        arena2 = ArenaGenerator(self.specs, seed=4).generate()
+        self.assertFalse(np.array_equal(_circles(arena0), _circles(arena2)))
+
+    def test_crowded(self):
+        # Items which do not fit are skipped, but the agent is always placed
+        specs = [ItemSpec("Wall", count=200, size_min=(4, 1, 4))]
+        arena = ArenaGenerator(specs, seed=0).generate()
+        self.assertEqual(arena.items[0].name, "Agent")
+        num_walls = len(arena.items[1].positions)
+        self.assertGreater(num_walls, 0)
+        self.assertLess(num_walls, 200)
+
+        # No room for the agent
+        with self.assertRaises(ValueError):
+            ArenaGenerator(specs, margin=20.0, seed=0).generate()
+
+    def test_item_name(self):
+        with self.assertRaises(ValueError):
+            ItemSpec("CardBox1")
+        with self.assertRaises(ValueError):
+            ItemSpec("Agent")
+
+    def test_environment(self):
+        generator = ArenaGenerator(self.specs, t=100, seed=0)
+        env = AAIEnvironment(obs_type=OBS_TYPE_STATE)
+
+        arena = generator.generate()
+        env.reset(arena=arena)
+        self.assertIs(env.arena, arena)
+        self.assertIsNone(env.task_id)
+        kinds = env.objects.as_arrays()["kind"]
+        self.assertEqual(np.sum(kinds == OBJ_TYPE_GOOD_GOAL), 1)
+        self.assertEqual(np.sum(kinds == OBJ_TYPE_WALL), len(arena.items[1].positions))
+        self.assertEqual(np.sum(kinds == OBJ_TYPE_CARDBOX1),
+                         sum(len(item.positions) for item in arena.items
+                             if item.name == "Cardbox1"))
+
+        # The generated arena is kept across the episodes
+        env.reset()
+        self.assertIs(env.arena, arena)
+        env.close()
+
+        # New arena for every episode from the random state of the env
+        env0 = AAIEnvironment(obs_type=OBS_TYPE_STATE, arena_generator=generator, seed=1)
+        env1 = AAIEnvironment(obs_type=OBS_TYPE_STATE, arena_generator=generator, seed=1)
+        arena0 = env0.arena
+        env0.reset()
+        self.assertIsNot(env0.arena, arena0)
+        env1.reset()
+        np.testing.assert_array_equal(_circles(env0.arena), _circles(env1.arena))
+        np.testing.assert_allclose(env0._get_state()["object_pos"],
+                                   env1._get_state()["object_pos"])
+        env0.close()
+        env1.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
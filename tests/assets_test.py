@@ -0,0 +1,160 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+import unittest.mock
+import zlib
+
+from manimalai import assets
+from manimalai.assets import AssetRegistry, build_bundle, ensure_bundle, is_up_to_date, \
+    repack_png, select_lod, get_lod_dir, _read_png_chunks, _load_pillow, DATA_DIR
+from manimalai.environment import AAIEnvironment, PHYSICS_PRESET_DEFAULT, PHYSICS_PRESET_FAST
+
+
+def _image_data(data):
+    return zlib.decompress(b"".join(body for chunk_type, body in _read_png_chunks(data)
+                                    if chunk_type == b"IDAT"))
+
+
+class AssetsTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_repack_png(self):
+        with open(os.path.join(DATA_DIR, "misc", "good_goal.png"), "rb") as f:
+            data = f.read()
+        repacked = repack_png(data)
+        chunks = _read_png_chunks(repacked)
+        self.assertEqual(chunks[0], _read_png_chunks(data)[0])
+        self.assertEqual(chunks[-1][0], b"IEND")
+        self.assertEqual(_image_data(repacked), _image_data(data))
+
+    def test_bundle(self):
+        data_dir = os.path.join(self.tmp_dir, "data")
+        shutil.copytree(DATA_DIR, data_dir)
+        bundle_dir = os.path.join(self.tmp_dir, "bundle")
+
+        # Data directory is used until the bundle is built
+        registry = AssetRegistry(bundle_dir, data_dir=data_dir)
+        self.assertFalse(registry.use_bundle)
+        self.assertEqual(registry.path("stage/floor.png"),
+                         os.path.join(data_dir, "stage/floor.png"))
+
+        manifest = build_bundle(bundle_dir, data_dir=data_dir)
+        self.assertIn("movable/lobject.col", manifest["sizes"])
+        self.assertTrue(is_up_to_date(bundle_dir, data_dir))
+        registry = AssetRegistry(bundle_dir, data_dir=data_dir)
+        self.assertTrue(registry.use_bundle)
+        path = registry.path("movable/cardbox1.obj")
+        self.assertEqual(path, os.path.join(bundle_dir, "movable/cardbox1.obj"))
+        self.assertTrue(os.path.exists(path))
+
+        # Changed source makes the bundle stale
+        with open(os.path.join(data_dir, "stage", "wall.png"), "ab") as f:
+            f.write(b"\0")
+        self.assertFalse(is_up_to_date(bundle_dir, data_dir))
+        self.assertFalse(AssetRegistry(bundle_dir, data_dir=data_dir).use_bundle)
+
+    def test_lod(self):
+        self.assertEqual(select_lod(256, 256), 0)
+        self.assertEqual(select_lod(128, 96), 1)
+        self.assertEqual(select_lod(84, 84), 2)
+
+        data_dir = os.path.join(self.tmp_dir, "data")
+        shutil.copytree(DATA_DIR, data_dir)
+        bundle_dir = os.path.join(self.tmp_dir, "bundle")
+
+        # Level of detail is not built unless asked
+        registry = AssetRegistry(bundle_dir, data_dir=data_dir, lod=2)
+        self.assertFalse(registry.use_bundle)
+        self.assertFalse(os.path.exists(get_lod_dir(bundle_dir, 2)))
+
+        # Level of detail is built on the first use
+        registry = AssetRegistry(bundle_dir, data_dir=data_dir, lod=2, build=True)
+        path = registry.draw_path("immovable/cylinder.obj")
+        self.assertTrue(registry.use_bundle)
+        self.assertEqual(path, os.path.join(get_lod_dir(bundle_dir, 2),
+                                            "immovable/cylinder_lod1.obj"))
+        self.assertEqual(registry.path("immovable/cylinder.obj"),
+                         os.path.join(get_lod_dir(bundle_dir, 2), "immovable/cylinder.obj"))
+        self.assertTrue(is_up_to_date(get_lod_dir(bundle_dir, 2), data_dir, lod=2))
+        self.assertFalse(os.path.exists(bundle_dir))
+
+        with open(path) as f:
+            num_vertices = sum(1 for line in f if line.startswith("v "))
+        self.assertEqual(num_vertices, 96)
+        with open(registry.path("immovable/cylinder.obj")) as f:
+            num_vertices = sum(1 for line in f if line.startswith("v "))
+        self.assertGreater(num_vertices, 96)
+
+        with open(registry.path("stage/floor.png"), "rb") as f:
+            ihdr = _read_png_chunks(f.read())[0][1]
+        width = int.from_bytes(ihdr[0:4], "big")
+        self.assertEqual(width, 64 if _load_pillow() is not None else 1024)
+
+        with self.assertRaises(ValueError):
+            AssetRegistry(bundle_dir, data_dir=data_dir, lod=3)
+
+        # Simplified mesh of the data directory has its collision file
+        # when the level can not be built
+        blocked_dir = os.path.join(self.tmp_dir, "file", "bundle")
+        with open(os.path.join(self.tmp_dir, "file"), "w") as f:
+            f.write("")
+        registry = AssetRegistry(blocked_dir, data_dir=data_dir, lod=1, build=True)
+        path = registry.draw_path("immovable/cylinder.obj")
+        self.assertFalse(registry.use_bundle)
+        self.assertEqual(path, os.path.join(data_dir, "immovable/cylinder_lod1.obj"))
+        self.assertTrue(os.path.exists(os.path.splitext(path)[0] + ".col"))
+
+    def test_concurrent_build(self):
+        bundle_dir = os.path.join(self.tmp_dir, "bundle")
+        build_bundle_orig = assets._build_bundle
+        num_builds = []
+
+        def build_bundle_counted(*args):
+            num_builds.append(1)
+            return build_bundle_orig(*args)
+
+        # The level is built once, and the others wait for it and use it
+        with unittest.mock.patch.object(assets, "_build_bundle", build_bundle_counted):
+            threads = [threading.Thread(target=ensure_bundle, args=(bundle_dir,),
+                                        kwargs={"lod": 2})
+                       for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(len(num_builds), 1)
+            self.assertTrue(is_up_to_date(get_lod_dir(bundle_dir, 2), lod=2))
+
+            ensure_bundle(bundle_dir, lod=2)
+            self.assertEqual(len(num_builds), 1)
+
+    def test_environment_lod(self):
+        env = AAIEnvironment(width=64, height=64, asset_dir=self.tmp_dir)
+        self.assertEqual(env.lod, 2)
+        env.close()
+        self.assertFalse(os.path.exists(get_lod_dir(self.tmp_dir, 2)))
+        env = AAIEnvironment(width=64, height=64, lod=0, asset_dir=self.tmp_dir)
+        self.assertEqual(env.assets.lod, 0)
+        env.close()
+
+    def test_environment_lod_collision(self):
+        # Tunnel collides with the full mesh at every level, and the simplified
+        # mesh is drawn only with the boxes of its collision file
+        for physics_preset, lod, name in [(PHYSICS_PRESET_DEFAULT, 0, "cylinder.obj"),
+                                          (PHYSICS_PRESET_DEFAULT, 2, "cylinder.obj"),
+                                          (PHYSICS_PRESET_FAST, 2, "cylinder_lod1.obj")]:
+            env = AAIEnvironment(task_id="3-15-1", width=64, height=64, lod=lod,
+                                 physics_preset=physics_preset)
+            with unittest.mock.patch.object(env, "_add_obj", wraps=env._add_obj) as add_obj:
+                env.reset()
+            paths = [call[1]["path"] for call in add_obj.call_args_list
+                     if "cylinder" in call[1].get("path", "")]
+            self.assertEqual(len(paths), 3)
+            self.assertEqual(set(os.path.basename(path) for path in paths), {name})
+            env.close()
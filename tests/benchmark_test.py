@@ -0,0 +1,57 @@
+import copy
+import subprocess
+import sys
+import unittest
+
+from manimalai.benchmark import run_benchmark, compare_results, benchmark_startup
+from manimalai.task_catalog import get_catalog
+
+
+class BenchmarkTest(unittest.TestCase):
+    def test_run_benchmark(self):
+        infos = [get_catalog().get_info("1-1-1", 0)]
+        output = run_benchmark(infos,
+                               resolutions=[32],
+                               top_view_settings=(False, True),
+                               num_steps=5,
+                               num_resets=2)
+
+        self.assertEqual(len(output["results"]), 2)
+        result = output["results"][0]
+        self.assertEqual(result["task_id"], "1-1-1")
+        self.assertEqual(result["width"], 32)
+        self.assertGreater(result["steps_per_sec"], 0.0)
+        self.assertGreater(result["first_reset_ms"], 0.0)
+        self.assertIn("GoodGoal", output["by_item_type"])
+        self.assertIn("32x32+top_view", output["by_setting"])
+
+        # Same results have no regression
+        self.assertEqual(compare_results(output, output), [])
+
+        slower = copy.deepcopy(output)
+        slower["results"][0]["steps_per_sec"] *= 0.5
+        regressions = compare_results(output, slower, threshold=0.1)
+        self.assertEqual(len(regressions), 1)
+        self.assertEqual(regressions[0]["metric"], "steps_per_sec")
+
+    def test_startup(self):
+        result = benchmark_startup("1-1-1", width=16, height=16, num_trials=1)
+        for metric in ("import_ms", "env_import_ms", "construct_ms", "first_reset_ms"):
+            self.assertGreater(result[metric], 0.0)
+
+        output = {"results": [], "startup": result}
+        slower = copy.deepcopy(output)
+        slower["startup"]["import_ms"] *= 2.0
+        regressions = compare_results(output, slower)
+        self.assertEqual([r["metric"] for r in regressions], ["import_ms"])
+
+    def test_lazy_import(self):
+        # Importing the package loads neither gym nor numpy
+        script = "import sys, manimalai; print('gym' in sys.modules, 'numpy' in sys.modules)"
+        output = subprocess.run([sys.executable, "-c", script], check=True,
+                                stdout=subprocess.PIPE, universal_newlines=True).stdout
+        self.assertEqual(output.split(), ["False", "False"])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,17 @@
+import os
+import subprocess
+import sys
 import unittest
 
-from manimalai.environment import Blackout, AAIEnvironment
+import numpy as np
+
+from manimalai.environment import Blackout, AAIEnvironment, MultiTaskAAIEnvironment
+from manimalai.environment import OBS_TYPE_STATE, OBJ_TYPE_GOOD_GOAL, OBJ_TYPE_NONE, \
+    OBJ_TYPE_CYLINDER_TUNNEL, OBJ_TYPE_WALL, OBJ_TYPE_RAMP
+from manimalai.environment import PHYSICS_PRESETS, PHYSICS_PRESET_DEFAULT, \
+    PHYSICS_PRESET_FAST
 from manimalai.arena_config import Vector3
+from manimalai.arena_generator import ArenaGenerator, ItemSpec
 
 
 class EnvironmentTest(unittest.TestCase):
@@ -34,6 +44,43 @@ class EnvironmentTest(unittest.TestCase):
         for i in range(25, 30):
             ret = blackout1.is_blacked_out(i)
             self.assertEqual(ret, True)
+
+        # Precomputed schedule has to match the step by step calculation.
+        for pattern in [[], [-20], [5,10,15,20,25], [0, 50], [15, 60]]:
+            blackout = Blackout(pattern)
+            scheduled_blackout = Blackout(pattern, max_step=100)
+            for i in range(200):
+                self.assertEqual(blackout.is_blacked_out(i),
+                                 scheduled_blackout.is_blacked_out(i))
+
+    def test_blackout_screen(self):
+        # Task with [-20] blackout pattern
+        env = AAIEnvironment(width=32, height=32, task_id="7-1-1")
+        for i in range(40):
+            screen, _, _, _ = env.step([1, 1])
+            step_num = i + 1
+            if (step_num % 40) >= 20:
+                self.assertTrue(screen is env.black_screen)
+                self.assertFalse(screen.flags.writeable)
+                self.assertEqual(screen.max(), 0)
+            else:
+                self.assertFalse(screen is env.black_screen)
+        env.close()
+
+    def test_blackout_max_pool(self):
+        # Pooled observation is black when the last of the skipped steps is
+        # blacked out, and the rendered last step when the one before it is.
+        env = AAIEnvironment(width=32, height=32, task_id="7-1-1", frame_skip=2,
+                             max_pool_frames=True)
+        for i in range(20):
+            screen, _, _, _ = env.step([1, 1])
+            step_num = (i + 1) * 2
+            if (step_num % 40) >= 20:
+                self.assertTrue(screen is env.black_screen)
+            else:
+                self.assertFalse(screen is env.black_screen)
+                self.assertGreater(screen.max(), 0)
+        env.close()
             
             
     def test_convert_pos(self):
@@ -59,6 +106,375 @@ class EnvironmentTest(unittest.TestCase):
         self.assertAlmostEqual(r1, 358)
         
         env.close()
+
+    def test_incremental_reset(self):
+        env = AAIEnvironment(width=32, height=32, task_id="10-25-1",
+                             incremental_reset=True)
+        env.reset()
+        obj_ids0 = set(env.objects.ids.tolist())
+        movable_ids0 = set(id for id in obj_ids0 if env._is_movable(id))
+        # Goal and cardboxes
+        self.assertEqual(len(movable_ids0), 3)
+        env.reset()
+        obj_ids1 = set(env.objects.ids.tolist())
+        # All the immovable objects are reused, and the movable objects are
+        # created again to start without angular velocity
+        self.assertEqual(obj_ids0 - movable_ids0, obj_ids1 & obj_ids0)
+        self.assertEqual(len(obj_ids1), len(obj_ids0))
+        self.assertEqual(len(env.obj_pool), 0)
+        env.close()
+
+        env = AAIEnvironment(width=32, height=32, task_id="10-25-1")
+        env.reset()
+        obj_ids0 = set(env.objects.ids.tolist())
+        env.reset()
+        obj_ids1 = set(env.objects.ids.tolist())
+        self.assertEqual(len(obj_ids0 & obj_ids1), 0)
+        env.close()
+
+    def test_frame_skip(self):
+        env = AAIEnvironment(width=32, height=32, task_id="1-1-1", frame_skip=4)
+
+        # Time out has to happen exactly at arena.t even if it is not
+        # a multiple of frame_skip.
+        t = env.arena.t
+        for i in range((t + 3) // 4 - 1):
+            screen, reward, terminal, _ = env.step([1, 1])
+            self.assertFalse(terminal)
+            self.assertEqual(env.step_num, (i+1) * 4)
+            self.assertEqual(screen.shape, (32, 32, 3))
+
+        screen, reward, terminal, _ = env.step([1, 1])
+        self.assertTrue(terminal)
+        self.assertEqual(env.step_num, 0)
+        env.close()
+
+        with self.assertRaises(ValueError):
+            AAIEnvironment(frame_skip=0)
+
+
+    def test_state_observation(self):
+        env = AAIEnvironment(task_id="1-1-1", obs_type=OBS_TYPE_STATE, max_objects=4)
+
+        state = env.reset()
+        self.assertTrue(env.observation_space.contains(state))
+
+        self.assertAlmostEqual(state["agent"][0], 20.0, places=3)
+        self.assertAlmostEqual(state["agent"][2], 20.0, places=3)
+
+        self.assertEqual(state["object_type"][0], OBJ_TYPE_GOOD_GOAL)
+        self.assertEqual(state["object_type"][1], OBJ_TYPE_NONE)
+        self.assertAlmostEqual(state["object_pos"][0][0], 20.0, places=1)
+        self.assertAlmostEqual(state["object_pos"][0][2], 22.0, places=1)
+        self.assertEqual(state["object_reward"][0], 1.0)
+        self.assertEqual(state["object_terminal"][0], 1)
+
+        state, reward, terminal, info = env.step([1, 1])
+        self.assertEqual(state["agent"].shape, (7,))
+        env.close()
+
+    def test_profile(self):
+        events = []
+        env = AAIEnvironment(width=32, height=32, task_id="1-1-1",
+                             profile_callback=lambda event, durations: events.append(
+                                 (event, durations)))
+        # First reset is deferred until it is called
+        self.assertEqual(len(events), 0)
+        env.reset()
+        self.assertEqual(events[0][0], "reset")
+
+        for i in range(3):
+            env.step([0, 1])
+        self.assertEqual(events[-1][0], "step")
+        for phase in ["action", "physics", "collision", "blackout", "render",
+                      "observation", "agent_info", "total"]:
+            self.assertIn(phase, events[-1][1])
+
+        profile = env.get_profile()
+        self.assertEqual(profile["step"]["physics"]["count"], 3)
+        self.assertEqual(profile["reset"]["total"]["count"], 1)
+        self.assertGreaterEqual(profile["step"]["total"]["max"],
+                                profile["step"]["physics"]["max"])
+        env.close()
+
+        env = AAIEnvironment(width=32, height=32, task_id="1-1-1")
+        self.assertIsNone(env.get_profile())
+        env.close()
+
+    def test_render_preset(self):
+        env = AAIEnvironment(width=32, height=32, render_preset="fast")
+        self.assertEqual(env.render_settings["shadow_rate"], 1.0)
+        # Top view camera is created on demand
+        self.assertIsNone(env.additional_camera_id)
+        top_view = env.get_top_view()
+        self.assertEqual(top_view.shape, (256, 256, 3))
+        camera_id = env.additional_camera_id
+        self.assertIsNotNone(camera_id)
+        env.get_top_view()
+        self.assertEqual(env.additional_camera_id, camera_id)
+        env.close()
+
+        env = AAIEnvironment(width=32, height=32,
+                             render_preset={"shadow_buffer_width": 256})
+        self.assertEqual(env.render_settings["shadow_buffer_width"], 256)
+        self.assertEqual(env.render_settings["shadow_rate"], 0.2)
+        env.close()
+
+        with self.assertRaises(ValueError):
+            AAIEnvironment(render_preset="unknown")
+        with self.assertRaises(ValueError):
+            AAIEnvironment(render_preset={"unknown": 1})
+
+    def test_physics_preset(self):
+        env = AAIEnvironment(task_id="1-1-1", obs_type=OBS_TYPE_STATE)
+        self.assertEqual(env.physics_settings, PHYSICS_PRESETS[PHYSICS_PRESET_DEFAULT])
+        env.reset()
+        goal_id = env.objects.ids[0]
+        self.assertEqual(env.obj_specs[goal_id][1]["mass"], 0.5)
+        env.close()
+
+        env = AAIEnvironment(task_id="1-1-1", obs_type=OBS_TYPE_STATE,
+                             physics_preset={"goal_mass": 2.0})
+        env.reset()
+        goal_id = env.objects.ids[0]
+        self.assertEqual(env.obj_specs[goal_id][1]["mass"], 2.0)
+        self.assertEqual(env.physics_settings["agent_radius"], 0.5)
+        env.close()
+
+        # Tunnels collide with the box compound of cylinder.col
+        env = AAIEnvironment(task_id="3-13-1", obs_type=OBS_TYPE_STATE,
+                             physics_preset="fast")
+        env.reset()
+        tunnel_ids = env.objects.ids[env.objects.as_arrays()["kind"] ==
+                                     OBJ_TYPE_CYLINDER_TUNNEL]
+        self.assertGreater(len(tunnel_ids), 0)
+        _, kwargs = env.obj_specs[tunnel_ids[0]]
+        self.assertTrue(kwargs["use_collision_file"])
+        self.assertFalse(kwargs["use_mesh_collision"])
+
+        # Boxes of the proxy stay out of the passage of the tunnel
+        col_path = os.path.splitext(kwargs["path"])[0] + ".col"
+        with open(col_path) as f:
+            boxes = np.array([[float(v) for v in line.split()[1:]]
+                              for line in f if line.startswith("b ")])
+        env.close()
+        nearest_x = np.maximum(np.abs(boxes[:, 0]) - boxes[:, 3], 0.0)
+        nearest_y = np.maximum(np.abs(boxes[:, 1]) - boxes[:, 4], 0.0)
+        self.assertTrue(np.all(np.hypot(nearest_x, nearest_y) >= 0.818 - 1e-3))
+
+        with self.assertRaises(ValueError):
+            AAIEnvironment(physics_preset="unknown")
+        with self.assertRaises(ValueError):
+            AAIEnvironment(physics_preset={"timestep": 0.1})
+        with self.assertRaises(ValueError):
+            AAIEnvironment(physics_preset={"agent_radius": 0.0})
+        with self.assertRaises(ValueError):
+            AAIEnvironment(physics_preset={"cardbox1_mass": 0.0})
+
+    def test_static_batching(self):
+        # Maze of fully specified walls and a ramp
+        env = AAIEnvironment(task_id="8-10-1", obs_type=OBS_TYPE_STATE)
+        state = env.reset()
+        env.close()
+
+        batched_env = AAIEnvironment(task_id="8-10-1", obs_type=OBS_TYPE_STATE,
+                                     static_batching=True, incremental_reset=True)
+        batched_state = batched_env.reset()
+        kinds = batched_env.objects.as_arrays()["kind"]
+        self.assertNotIn(OBJ_TYPE_WALL, kinds)
+        self.assertNotIn(OBJ_TYPE_RAMP, kinds)
+        self.assertEqual(len(batched_env.static_batch), 154)
+        # Walls collide with the compound of boxes, and the ramp with the
+        # triangle mesh of a second, invisible body
+        self.assertTrue(batched_env.static_batch.compound)
+        self.assertIsNotNone(batched_env.static_batch.mesh_path)
+        self.assertEqual(len(batched_env.static_batch_ids), 2)
+
+        # Batched objects are still in the state observation
+        def sorted_objects(state):
+            objects = np.concatenate([state["object_type"][:, None],
+                                      state["object_pos"]], axis=1)
+            return objects[np.lexsort(objects.T[::-1])]
+        np.testing.assert_allclose(sorted_objects(batched_state),
+                                   sorted_objects(state), atol=1e-4)
+
+        # The body is kept across the episodes
+        batch_ids = batched_env.static_batch_ids
+        batched_env.reset()
+        self.assertEqual(batched_env.static_batch_ids, batch_ids)
+
+        saved = batched_env.save_state()
+        batched_env.set_task("1-1-1")
+        self.assertEqual(batched_env.static_batch_ids, [])
+        batched_env.restore_state(saved)
+        self.assertEqual(len(batched_env.static_batch_ids), 2)
+        self.assertIs(batched_env.static_batch, saved["static_batch"])
+        batched_env.close()
+
+        # Tunnels of the fast physics preset collide with their boxes
+        env = AAIEnvironment(task_id="3-15-1", obs_type=OBS_TYPE_STATE,
+                             static_batching=True, physics_preset=PHYSICS_PRESET_FAST)
+        env.reset()
+        self.assertEqual(env.static_batch.kinds, [OBJ_TYPE_CYLINDER_TUNNEL] * 3)
+        self.assertTrue(env.static_batch.compound)
+        self.assertIsNone(env.static_batch.mesh_path)
+        env.close()
+
+        # Generated arenas are not merged
+        generator = ArenaGenerator([ItemSpec("Wall", count=3, rotate=False,
+                                             color=(100, 100, 100))], seed=0)
+        env = AAIEnvironment(obs_type=OBS_TYPE_STATE, static_batching=True,
+                             arena_generator=generator)
+        env.reset()
+        self.assertEqual(len(env.static_batch_ids), 0)
+        self.assertEqual(np.sum(env.objects.as_arrays()["kind"] == OBJ_TYPE_WALL), 3)
+        env.close()
+
+    def test_lazy_scene(self):
+        env = AAIEnvironment(width=16, height=16)
+        self.assertIsNone(env._env)
+        self.assertTrue(env.needs_reset)
+
+        # First step starts the episode
+        env.step([1, 1])
+        self.assertIsNotNone(env._env)
+        self.assertFalse(env.needs_reset)
+        self.assertEqual(env.step_num, 1)
+        env.close()
+
+        # rodentia is not imported until a scene is built
+        code = ("import sys, manimalai, manimalai.semantic_map, manimalai.vector_env\n"
+                "env = manimalai.environment.AAIEnvironment(width=16, height=16)\n"
+                "assert 'rodentia' not in sys.modules\n"
+                "env.reset()\n"
+                "assert 'rodentia' in sys.modules\n")
+        subprocess.run([sys.executable, "-c", code], check=True)
+
+    def test_physics_preset_episodes(self):
+        # Rewards and terminations of the "fast" preset are the same as the
+        # default on a sample of the shipped arenas with tunnels
+        actions = np.random.default_rng(0).integers(0, 3, size=(300, 2))
+        for task_id in ["3-13-1", "3-15-2", "5-7-1", "5-11-3", "5-12-1"]:
+            episodes = []
+            for physics_preset in (PHYSICS_PRESET_DEFAULT, PHYSICS_PRESET_FAST):
+                env = AAIEnvironment(task_id=task_id, obs_type=OBS_TYPE_STATE,
+                                     physics_preset=physics_preset, seed=0)
+                episode = []
+                for action in actions:
+                    _, reward, terminal, _ = env.step(action)
+                    episode.append((reward, terminal))
+                    if terminal:
+                        break
+                episodes.append(episode)
+                env.close()
+            self.assertEqual(episodes[1], episodes[0], task_id)
+
+    def test_set_task(self):
+        env = AAIEnvironment(task_id="1-1-1", obs_type=OBS_TYPE_STATE)
+        rodentia_env = env.env
+
+        state = env.set_task("7-1-1")
+        self.assertIs(env.env, rodentia_env)
+        self.assertEqual(env.task_id, "7-1-1")
+        self.assertEqual(env.step_num, 0)
+        self.assertTrue(env.blackout.enabled)
+
+        # Objects of the previous task are removed
+        env.set_task("1-1-1")
+        self.assertEqual(len(env.objects), 1)
+        self.assertEqual(env.objects.as_arrays()["kind"][0], OBJ_TYPE_GOOD_GOAL)
+        env.close()
+
+    def test_multi_task(self):
+        tasks = ["1-1-1", ("1-1-2", 0), "1-1-3"]
+        env = MultiTaskAAIEnvironment(tasks, seed=1, width=32, height=32)
+        task_ids = set()
+        for i in range(20):
+            env.reset()
+            task_ids.add(env.task_id)
+            self.assertEqual(env.arena_index, 0)
+        self.assertEqual(task_ids, set(["1-1-1", "1-1-2", "1-1-3"]))
+
+        # Tasks of the following episodes are restored with the state
+        saved = env.save_state()
+        next_task_ids = []
+        for i in range(5):
+            env.reset()
+            next_task_ids.append(env.task_id)
+        env.restore_state(saved)
+        for task_id in next_task_ids:
+            env.reset()
+            self.assertEqual(env.task_id, task_id)
+
+        # seed() also reseeds the task sampling
+        seeded_task_ids = []
+        for i in range(2):
+            env.seed(2)
+            seeded_task_ids.append([])
+            for j in range(5):
+                env.reset()
+                seeded_task_ids[i].append(env.task_id)
+        self.assertEqual(seeded_task_ids[0], seeded_task_ids[1])
+        env.close()
+
+    def test_save_restore_state(self):
+        env = AAIEnvironment(task_id="1-1-1", obs_type=OBS_TYPE_STATE)
+        env.reset()
+        for i in range(10):
+            env.step([1, 1])
+        saved = env.save_state()
+        saved_obs = env._get_state()
+
+        for i in range(3):
+            env.step([0, 2])
+        stepped_obs = env._get_state()
+        env.restore_state(saved)
+        self.assertEqual(env.step_num, saved["step_num"])
+        np.testing.assert_allclose(env._get_state()["agent"],
+                                   saved_obs["agent"], atol=1e-4)
+
+        # Same steps from the restored state follow the same trajectory
+        for i in range(3):
+            env.step([0, 2])
+        np.testing.assert_allclose(env._get_state()["agent"],
+                                   stepped_obs["agent"], atol=1e-4)
+
+        # Moving agent is restored at rest
+        moving = env.save_state()
+        self.assertGreater(np.linalg.norm(moving["agent_velocity"][[0, 2]]), 1.0)
+        env.step([0, 2])
+        env.restore_state(moving)
+        np.testing.assert_allclose(env.env.get_agent_info()["pos"],
+                                   moving["agent_pos"], atol=1e-4)
+        np.testing.assert_allclose(env.env.get_agent_info()["velocity"][[0, 2]],
+                                   [0.0, 0.0], atol=1e-4)
+        env.restore_state(saved)
+
+        # Objects of the snapshot are created again after reset
+        env.reset()
+        env.restore_state(saved)
+        restored_obs = env._get_state()
+        self.assertEqual(len(env.objects), len(saved["objects"]))
+        np.testing.assert_array_equal(restored_obs["object_type"],
+                                      saved_obs["object_type"])
+        np.testing.assert_allclose(restored_obs["object_pos"],
+                                   saved_obs["object_pos"], atol=1e-4)
+        np.testing.assert_array_equal(env.objects.as_arrays()["reward"],
+                                      saved_obs["object_reward"][:len(env.objects)])
+        env.close()
+
+
+    def test_obs_buffer(self):
+        obs_buffer = np.zeros((3, 16, 16), dtype=np.float32)
+        env = AAIEnvironment(width=32, height=32, obs_buffer=obs_buffer,
+                             obs_layout="CHW", obs_dtype=np.float32, downsample=2)
+        self.assertEqual(env.observation_space.shape, (3, 16, 16))
+
+        obs = env.reset()
+        self.assertIs(obs, obs_buffer)
+        obs, _, _, _ = env.step([1, 1])
+        self.assertIs(obs, obs_buffer)
+        env.close()
         
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,129 @@
+import shutil
+import tempfile
+import unittest
+
+from manimalai.environment import AAIEnvironment
+from manimalai.evaluation import Evaluator, RandomPolicy, summarize, is_passed, \
+    get_max_return, is_reachable, run_episode
+from manimalai.task_catalog import get_catalog
+
+
+class EvaluationTest(unittest.TestCase):
+    def setUp(self):
+        self.result_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.result_dir)
+
+    def test_is_passed(self):
+        self.assertTrue(is_passed(1.0, 0))
+        self.assertTrue(is_passed(1.0, 1))
+        self.assertFalse(is_passed(0.0, 0.5))
+        self.assertTrue(is_passed(-0.4, -0.5))
+
+    def test_max_return(self):
+        catalog = get_catalog()
+        info = catalog.get_info("1-1-1")
+        self.assertEqual(get_max_return(info), 1.0)
+        self.assertTrue(is_reachable(info))
+
+        # The goal of size 5 gives 1, which can not reach the pass_mark 4
+        info = catalog.get_info("1-10-1")
+        self.assertEqual(info.pass_mark, 4)
+        self.assertEqual(get_max_return(info), 1.0)
+        self.assertFalse(is_reachable(info))
+
+    def test_episode_seed(self):
+        class RecordingPolicy(RandomPolicy):
+            def reset(self, seed=None):
+                super().reset(seed)
+                self.actions = []
+
+            def __call__(self, observation):
+                action = super().__call__(observation)
+                self.actions.append(tuple(action))
+                return action
+
+        # Episode runs the same after other episodes
+        env = AAIEnvironment(width=16, height=16)
+        policy = RecordingPolicy()
+        run_episode(env, policy, "1-1-1", 0, 0)
+        actions = policy.actions
+        run_episode(env, policy, "1-1-1", 0, 1)
+        self.assertNotEqual(policy.actions, actions)
+        run_episode(env, policy, "1-1-1", 0, 0)
+        self.assertEqual(policy.actions, actions)
+        env.close()
+
+    def test_run(self):
+        catalog = get_catalog()
+        infos = [catalog.get_info("1-1-1"), catalog.get_info("2-1-1")]
+        env_kwargs = {"width": 16, "height": 16}
+
+        evaluator = Evaluator("manimalai.evaluation:RandomPolicy",
+                              policy_id="random",
+                              result_dir=self.result_dir,
+                              num_workers=2,
+                              env_kwargs=env_kwargs)
+        results = evaluator.run(infos, seeds=[0, 1])
+        self.assertEqual(len(results), 4)
+        for result in results:
+            self.assertEqual(result["policy_id"], "random")
+            self.assertGreater(result["steps"], 0)
+            self.assertEqual(result["passed"],
+                             result["return"] >= result["pass_mark"])
+
+        # Cached results are used without running the policy
+        evaluator = Evaluator("unknown_module:policy",
+                              policy_id="random",
+                              result_dir=self.result_dir,
+                              env_kwargs=env_kwargs)
+        cached_results = evaluator.run(infos, seeds=[0, 1])
+        key = lambda r: (r["task_id"], r["seed"])
+        self.assertEqual(sorted(cached_results, key=key), sorted(results, key=key))
+
+        # Episodes evaluated again in another order and pool run the same
+        shutil.rmtree(self.result_dir)
+        evaluator = Evaluator("manimalai.evaluation:RandomPolicy",
+                              policy_id="random",
+                              result_dir=self.result_dir,
+                              num_workers=1,
+                              env_kwargs=env_kwargs)
+        rerun_results = evaluator.run(infos[::-1], seeds=[1, 0])
+        episode = lambda r: (r["task_id"], r["seed"], r["episode_seed"], r["return"],
+                             r["steps"])
+        self.assertEqual(sorted(map(episode, rerun_results)),
+                         sorted(map(episode, results)))
+
+        # Results of other env_kwargs are not used
+        evaluator = Evaluator("unknown_module:policy",
+                              policy_id="random",
+                              result_dir=self.result_dir,
+                              env_kwargs={"width": 32, "height": 32})
+        self.assertIsNone(evaluator.load_result("1-1-1", 0, 0))
+
+        summary = summarize(results)
+        self.assertEqual(sorted(summary["categories"].keys()), ["1", "2"])
+        self.assertEqual(summary["total"]["num_episodes"], 4)
+        self.assertEqual(summary["unreachable"], [])
+
+    def test_summarize_unreachable(self):
+        results = []
+        for task_id, reachable, passed in [("1-1-1", True, True),
+                                           ("1-1-2", True, False),
+                                           ("1-10-1", False, False)]:
+            results.append({"task_id": task_id, "arena_index": 0, "category": "1",
+                            "return": 1.0, "pass_mark": 4 if not reachable else 1,
+                            "max_return": 1.0, "reachable": reachable,
+                            "passed": passed})
+        total = summarize(results)["total"]
+        self.assertEqual(total["num_episodes"], 3)
+        self.assertEqual(total["num_unreachable"], 1)
+        self.assertEqual(total["pass_rate"], 0.5)
+        self.assertEqual(summarize(results)["unreachable"],
+                         [{"task_id": "1-10-1", "arena_index": 0,
+                           "pass_mark": 4, "max_return": 1.0}])
+
+
+if __name__ == '__main__':
+    unittest.main()
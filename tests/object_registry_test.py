@@ -0,0 +1,91 @@
+import unittest
+
+import numpy as np
+
+from manimalai.object_registry import ObjectRegistry
+
+
+class ObjectRegistryTest(unittest.TestCase):
+    def test_add_remove(self):
+        registry = ObjectRegistry(capacity=2)
+        registry.add(5, 1, reward=1.0, terminate=True)
+        registry.add(3, 4)
+        registry.add(10, 8, hot_zone=True)
+
+        # Slots grow with the number of the objects, and not with the ids
+        self.assertEqual(registry.capacity, 4)
+        # Registration order is kept
+        np.testing.assert_array_equal(registry.ids, [5, 3, 10])
+        self.assertEqual(registry.get(5), (1, 1.0, True, False))
+        self.assertIn(3, registry)
+        self.assertNotIn(4, registry)
+        self.assertNotIn(100, registry)
+
+        registry.remove(3)
+        np.testing.assert_array_equal(registry.ids, [5, 10])
+
+        arrays = registry.as_arrays()
+        np.testing.assert_array_equal(arrays["kind"], [1, 8])
+        np.testing.assert_array_equal(arrays["reward"], [1.0, 0.0])
+        np.testing.assert_array_equal(arrays["terminate"], [True, False])
+        np.testing.assert_array_equal(arrays["hot_zone"], [False, True])
+
+        registry.clear()
+        self.assertEqual(len(registry), 0)
+        self.assertNotIn(5, registry)
+
+        # Ids of a long session are not kept after clear()
+        registry.add(10 ** 9, 2, reward=1.0)
+        self.assertEqual(registry.capacity, 4)
+        np.testing.assert_array_equal(registry.ids, [10 ** 9])
+        self.assertEqual(registry.process_collisions([10 ** 9])[0], 1.0)
+
+    def test_compact(self):
+        registry = ObjectRegistry(capacity=4)
+        for id in range(100, 104):
+            registry.add(id, 1)
+        registry.remove(101)
+        registry.remove(102)
+
+        # Removed objects are dead in the liveness mask until the slots run out
+        self.assertEqual(registry.size, 4)
+        self.assertEqual(len(registry), 2)
+        np.testing.assert_array_equal(registry.alive[:4], [True, False, False, True])
+        self.assertNotIn(101, registry)
+        with self.assertRaises(KeyError):
+            registry.remove(101)
+
+        # Dead slots are reused before growing
+        registry.add(104, 2, reward=1.0)
+        registry.add(99, 3, reward=-1.0)
+        self.assertEqual(registry.capacity, 4)
+        np.testing.assert_array_equal(registry.ids, [100, 103, 104, 99])
+        self.assertEqual(registry.get(104), (2, 1.0, False, False))
+        reward, _, collected_ids, _ = registry.process_collisions([99, 101, 104])
+        self.assertEqual(reward, 0.0)
+        np.testing.assert_array_equal(collected_ids, [99, 104])
+
+    def test_process_collisions(self):
+        registry = ObjectRegistry()
+        registry.add(1, 2, reward=1.0)
+        registry.add(2, 2, reward=1.0)
+        registry.add(3, 7, terminate=True)
+        registry.add(4, 8, hot_zone=True)
+
+        # Unknown and duplicated ids are ignored
+        reward, terminal, collected_ids, num_hot_zones = \
+            registry.process_collisions([1, 1, 2, 4, 1000])
+        self.assertEqual(reward, 2.0)
+        self.assertFalse(terminal)
+        np.testing.assert_array_equal(collected_ids, [1, 2])
+        self.assertEqual(num_hot_zones, 1)
+
+        reward, terminal, collected_ids, num_hot_zones = \
+            registry.process_collisions([3])
+        self.assertEqual(reward, 0.0)
+        self.assertTrue(terminal)
+        self.assertEqual(len(collected_ids), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
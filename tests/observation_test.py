@@ -0,0 +1,53 @@
+import unittest
+
+import numpy as np
+
+from manimalai.observation import ScreenProcessor, LAYOUT_CHW
+
+
+class ScreenProcessorTest(unittest.TestCase):
+    def setUp(self):
+        rng = np.random.RandomState(0)
+        self.screen = rng.randint(0, 256, size=(8, 12, 3)).astype(np.uint8)
+
+    def test_identity(self):
+        processor = ScreenProcessor(12, 8)
+        self.assertTrue(processor.is_identity)
+        obs = processor.process(self.screen)
+        np.testing.assert_array_equal(obs, self.screen)
+
+    def test_layout_and_dtype(self):
+        out = np.empty((3, 4, 6), dtype=np.float32)
+        processor = ScreenProcessor(12, 8, layout=LAYOUT_CHW, dtype=np.float32,
+                                    downsample=2, out=out)
+        self.assertFalse(processor.is_identity)
+        self.assertEqual(processor.observation_space().shape, (3, 4, 6))
+
+        obs = processor.process(self.screen)
+        self.assertIs(obs, out)
+        expected = self.screen[::2, ::2].transpose(2, 0, 1) / 255.0
+        np.testing.assert_allclose(obs, expected, rtol=1e-6)
+
+        obs = processor.process_black()
+        self.assertIs(obs, out)
+        self.assertEqual(obs.max(), 0.0)
+
+    def test_grayscale(self):
+        processor = ScreenProcessor(12, 8, grayscale=True)
+        obs = processor.process(self.screen)
+        self.assertEqual(obs.shape, (8, 12, 1))
+        self.assertEqual(obs.dtype, np.uint8)
+        expected = (self.screen.astype(np.float64) @ [0.299, 0.587, 0.114]).astype(np.uint8)
+        self.assertLessEqual(np.abs(obs[:, :, 0].astype(np.int32) - expected).max(), 1)
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            ScreenProcessor(12, 8, downsample=5)
+        with self.assertRaises(ValueError):
+            ScreenProcessor(12, 8, layout="WHC")
+        with self.assertRaises(ValueError):
+            ScreenProcessor(12, 8, out=np.empty((8, 12, 3), dtype=np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main()
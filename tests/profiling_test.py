@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from manimalai.profiling import PhaseProfiler, RollingHistogram
+
+
+class ProfilingTest(unittest.TestCase):
+    def test_rolling_histogram(self):
+        histogram = RollingHistogram(window=4)
+        for value in [1.0, 2.0, 3.0, 4.0, 5.0, 6.0]:
+            histogram.add(value)
+        self.assertEqual(histogram.count, 6)
+        self.assertEqual(sorted(histogram.get_values()), [3.0, 4.0, 5.0, 6.0])
+
+        summary = histogram.summary()
+        self.assertEqual(summary["max"], 6.0)
+        self.assertEqual(summary["mean"], 4.5)
+
+        counts, bins = histogram.histogram(bins=[0.0, 4.5, 10.0])
+        np.testing.assert_array_equal(counts, [2, 2])
+
+    def test_nested_section(self):
+        profiler = PhaseProfiler()
+        profiler.start()
+        profiler.mark("a")
+        profiler.enter()
+        profiler.mark("b")
+        profiler.exit("c")
+        profiler.stop("step")
+
+        summary = profiler.summary()
+        self.assertEqual(sorted(summary["step"].keys()), ["a", "c", "total"])
+
+
+if __name__ == '__main__':
+    unittest.main()
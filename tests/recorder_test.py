@@ -0,0 +1,132 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import unittest.mock
+
+import numpy as np
+
+from manimalai.environment import AAIEnvironment
+from manimalai import recorder
+from manimalai.recorder import EpisodeRecorder, Recording, RESET_ACTION, INDEX_FILE_NAME, \
+    ON_FULL_RAISE
+
+
+class RecorderTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def wait_for_episodes(self, num_episodes):
+        # index.json is replaced by the writer thread after every episode
+        path = os.path.join(self.tmp_dir, INDEX_FILE_NAME)
+        deadline = time.time() + 10.0
+        while time.time() < deadline:
+            if os.path.exists(path):
+                with open(path) as f:
+                    index = json.load(f)
+                if len(index["episodes"]) >= num_episodes:
+                    return index
+            time.sleep(0.01)
+        self.fail("index.json was not updated")
+
+    def record(self, compress):
+        env = AAIEnvironment(width=16, height=16, task_id="1-1-1", frame_skip=50)
+        env = EpisodeRecorder(env, self.tmp_dir, chunk_size=4, compress=compress)
+
+        env.reset()
+        # t=250 with frame_skip=50 terminates at every 5th step
+        screens = []
+        for i in range(7):
+            screen, _, terminal, _ = env.step([1, 1])
+            screens.append(screen.copy())
+            if terminal:
+                first_screen = screen.copy()
+
+        # Episodes are in the index before close
+        index = self.wait_for_episodes(1)
+        self.assertEqual(index["episodes"][0]["length"], 6)
+        env.close()
+
+        recording = Recording(self.tmp_dir)
+        self.assertEqual(len(recording), 9)
+        self.assertEqual(recording.index["num_dropped"], 0)
+        self.assertEqual(len(recording.chunks), 3)
+        self.assertEqual(recording.episodes[0]["start"], 0)
+        self.assertEqual(recording.episodes[0]["length"], 6)
+        self.assertEqual(recording.episodes[1]["start"], 6)
+        self.assertEqual(recording.episodes[1]["length"], 3)
+
+        episode = recording.get_episode(0)
+        self.assertEqual(episode["screens"].shape, (6, 16, 16, 3))
+        self.assertEqual(tuple(episode["actions"][0]), (RESET_ACTION, RESET_ACTION))
+        self.assertEqual(tuple(episode["actions"][1]), (1, 1))
+        np.testing.assert_array_equal(episode["terminals"],
+                                      [False, False, False, False, False, True])
+        self.assertEqual(episode["info_local_velocity"].shape, (6, 3))
+        # Terminal row repeats the last screen of the episode
+        np.testing.assert_array_equal(episode["screens"][5], screens[3])
+
+        # Screen returned on terminal is the first frame of the next episode
+        episode = recording.get_episode(1)
+        self.assertEqual(tuple(episode["actions"][0]), (RESET_ACTION, RESET_ACTION))
+        np.testing.assert_array_equal(episode["screens"][0], first_screen)
+        np.testing.assert_array_equal(episode["screens"][2], screens[6])
+
+    def test_record(self):
+        self.record(compress=False)
+
+    def test_record_compressed(self):
+        self.record(compress=True)
+
+    def test_queue_full(self):
+        # Writer is held in the first record, so the queue stays full
+        writing = threading.Event()
+        append_orig = recorder._Chunk.append
+
+        def append_held(chunk, record):
+            writing.wait()
+            append_orig(chunk, record)
+
+        with unittest.mock.patch.object(recorder._Chunk, "append", append_held):
+            env = AAIEnvironment(width=16, height=16, task_id="1-1-1")
+            env = EpisodeRecorder(env, self.tmp_dir, max_queue_size=2)
+            env.reset()
+            start = time.time()
+            for i in range(5):
+                env.step([1, 1])
+            # step() does not wait for the writer
+            self.assertLess(time.time() - start, 5.0)
+            writing.set()
+            env.close()
+
+        recording = Recording(self.tmp_dir)
+        self.assertEqual(len(recording), 2)
+        self.assertEqual(recording.index["num_dropped"], 4)
+        self.assertEqual(recording.episodes[0]["length"], 2)
+        self.assertEqual(recording.episodes[0]["num_dropped"], 4)
+
+        writing.clear()
+        with unittest.mock.patch.object(recorder._Chunk, "append", append_held):
+            env = AAIEnvironment(width=16, height=16, task_id="1-1-1")
+            env = EpisodeRecorder(env, os.path.join(self.tmp_dir, "raise"),
+                                  max_queue_size=1, on_full=ON_FULL_RAISE)
+            env.reset()
+            with self.assertRaises(RuntimeError):
+                env.step([1, 1])
+            writing.set()
+            env.close()
+
+        env = AAIEnvironment(width=16, height=16)
+        with self.assertRaises(ValueError):
+            EpisodeRecorder(env, self.tmp_dir, on_full="block")
+        env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
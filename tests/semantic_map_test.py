@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from manimalai.environment import AAIEnvironment, OBS_TYPE_STATE
+from manimalai.semantic_map import SemanticMap, CHANNEL_AGENT, CHANNEL_GOOD_GOAL, \
+    CHANNEL_WALL, NUM_CHANNELS
+
+
+class SemanticMapTest(unittest.TestCase):
+    def test_rasterize(self):
+        semantic_map = SemanticMap(resolution=40, extent=40.0)
+
+        angle = np.pi / 6
+        centers = np.array([[2.0, -3.0], [-10.0, 10.0]], dtype=np.float32)
+        axis_x = np.array([[np.cos(angle), -np.sin(angle)], [1.0, 0.0]], dtype=np.float32)
+        axis_z = np.array([[np.sin(angle), np.cos(angle)], [0.0, 1.0]], dtype=np.float32)
+        half_sizes = np.array([[4.0, 1.0], [2.5, 2.5]], dtype=np.float32)
+        rounds = np.array([False, True])
+        channels = np.array([CHANNEL_WALL, CHANNEL_GOOD_GOAL])
+
+        grid = semantic_map.rasterize(centers, axis_x, axis_z, half_sizes, rounds, channels)
+        self.assertEqual(grid.shape, (NUM_CHANNELS, 40, 40))
+
+        # Compare with the point-in-shape test of every cell
+        x, z = np.meshgrid(semantic_map.cell_centers, semantic_map.cell_centers)
+        dx = x - centers[0, 0]
+        dz = z - centers[0, 1]
+        rect = (np.abs(dx * axis_x[0, 0] + dz * axis_x[0, 1]) <= 4.0) & \
+            (np.abs(dx * axis_z[0, 0] + dz * axis_z[0, 1]) <= 1.0)
+        np.testing.assert_array_equal(grid[CHANNEL_WALL], rect)
+
+        disc = (x + 10.0) ** 2 + (z - 10.0) ** 2 <= 2.5 ** 2
+        np.testing.assert_array_equal(grid[CHANNEL_GOOD_GOAL], disc)
+        self.assertFalse(grid[CHANNEL_AGENT].any())
+
+    def test_render(self):
+        env = AAIEnvironment(task_id="1-1-1", obs_type=OBS_TYPE_STATE)
+        semantic_map = SemanticMap(resolution=40, extent=40.0)
+        grid = semantic_map.render(env)
+
+        # Agent at the center, and the goal 2m ahead (-z in the world)
+        self.assertTrue(grid[CHANNEL_AGENT, 20, 20])
+        self.assertTrue(grid[CHANNEL_GOOD_GOAL, 18, 20])
+        self.assertEqual(np.count_nonzero(grid[CHANNEL_WALL]), 0)
+
+        out = np.zeros(semantic_map.shape, dtype=np.uint8)
+        semantic_map.render(env, out=out)
+        np.testing.assert_array_equal(out, grid)
+        env.close()
+
+    def test_static_batching(self):
+        # Walls and ramp merged into the static batch are still on the map
+        grids = []
+        for static_batching in (False, True):
+            env = AAIEnvironment(task_id="8-10-1", obs_type=OBS_TYPE_STATE,
+                                 static_batching=static_batching)
+            grids.append(SemanticMap(resolution=80).render(env))
+            env.close()
+        self.assertGreater(np.count_nonzero(grids[0][CHANNEL_WALL]), 0)
+        np.testing.assert_array_equal(grids[1], grids[0])
+
+
+if __name__ == '__main__':
+    unittest.main()
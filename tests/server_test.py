@@ -0,0 +1,87 @@
+import multiprocessing as mp
+import os
+import shutil
+import stat
+import tempfile
+import time
+import unittest
+from multiprocessing import AuthenticationError
+
+import numpy as np
+
+from manimalai.server import EnvServer, EnvClient, get_key_path
+
+
+def _run_server(address):
+    server = EnvServer(address=address, num_envs=3, num_workers=2, width=16, height=16)
+    server.serve_forever()
+
+
+class ServerTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.address = os.path.join(self.tmp_dir, "manimalai.sock")
+        # Not a daemon, since the server starts worker processes
+        self.process = mp.Process(target=_run_server, args=(self.address,))
+        self.process.start()
+        for _ in range(300):
+            if os.path.exists(self.address):
+                break
+            time.sleep(0.1)
+
+    def tearDown(self):
+        self.process.join(timeout=30)
+        if self.process.is_alive():
+            self.process.terminate()
+        shutil.rmtree(self.tmp_dir)
+
+    def test_step(self):
+        client = EnvClient(self.address)
+        self.assertEqual(client.num_envs, 3)
+        self.assertEqual(client.observation_shape, (16, 16, 3))
+
+        screens = client.reset()
+        self.assertEqual(screens.shape, (3, 16, 16, 3))
+
+        screens, rewards, terminals, info = client.step(np.ones((3, 2)))
+        self.assertEqual(rewards.shape, (3,))
+        self.assertEqual(info["local_velocity"].shape, (3, 3))
+
+        # Step a subset of the envs
+        screens, rewards, terminals, info = client.step([[1, 1]], env_ids=[2])
+        self.assertEqual(screens.shape, (1, 16, 16, 3))
+        self.assertEqual(client.call("__getattribute__", "step_num"), [1, 1, 2])
+
+        # Second client shares the envs
+        other_client = EnvClient(self.address)
+        other_client.reset(env_ids=[0])
+        self.assertEqual(client.call("__getattribute__", "step_num"), [0, 1, 2])
+        other_client.close()
+
+        client.shutdown()
+        self.process.join(timeout=30)
+        self.assertFalse(self.process.is_alive())
+        self.assertFalse(os.path.exists(get_key_path(self.address)))
+
+    def test_authentication(self):
+        client = EnvClient(self.address)
+        key_path = get_key_path(self.address)
+        self.assertEqual(stat.S_IMODE(os.stat(key_path).st_mode), 0o600)
+
+        # Clients without the key are refused, and the server keeps serving
+        with self.assertRaises(AuthenticationError):
+            EnvClient(self.address, authkey=b"wrong")
+
+        # Socket of the running server is not replaced by another server
+        server = EnvServer(address=self.address, num_envs=1, width=16, height=16)
+        with self.assertRaises(RuntimeError):
+            server.serve_forever()
+        server.close()
+        self.assertTrue(os.path.exists(key_path))
+
+        self.assertEqual(client.call("__getattribute__", "step_num"), [0, 0, 0])
+        client.shutdown()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from manimalai.assets import DATA_DIR
+from manimalai.static_batch import StaticBatch, _load_obj, _evict
+
+
+def _read_col(path):
+    with open(path) as f:
+        return np.array([[float(v) for v in line.split()[1:]]
+                         for line in f if line.startswith("b ")])
+
+
+class StaticBatchTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_compound(self):
+        batch = StaticBatch(self.tmp_dir)
+        batch.add_box([2.0, 1.0, 0.5], [1.0, 1.0, 0.0], 0.0, color=[1.0, 0.0, 0.0], kind=4)
+        # Quarter turn swaps the x and z extents
+        batch.add_box([2.0, 1.0, 0.5], [-3.0, 1.0, 4.0], 0.5 * np.pi, color=[1.0, 0.0, 0.0],
+                      kind=4)
+        batch.add_box([1.0, 5.0, 1.0], [0.0, 5.0, 0.0], 0.0, visible=False)
+        self.assertTrue(batch.compound)
+        self.assertEqual(batch.kinds, [4, 4])
+
+        path = batch.write()
+        self.assertEqual(os.path.basename(path), batch.key + ".obj")
+        boxes = _read_col(os.path.splitext(path)[0] + ".col")
+        np.testing.assert_allclose(boxes, [[1.0, 1.0, 0.0, 2.0, 1.0, 0.5],
+                                           [-3.0, 1.0, 4.0, 0.5, 1.0, 2.0],
+                                           [0.0, 5.0, 0.0, 1.0, 5.0, 1.0]], atol=1e-5)
+
+        # One texture, and only the visible boxes are drawn
+        groups = _load_obj(path)
+        self.assertEqual(len(groups), 1)
+        texture_path, (positions, normals, uvs) = list(groups.items())[0]
+        self.assertTrue(os.path.exists(texture_path))
+        self.assertEqual(len(positions), 2 * 36)
+        np.testing.assert_allclose(positions[:36].min(axis=0), [-1.0, 0.0, -0.5], atol=1e-5)
+        np.testing.assert_allclose(positions[36:].max(axis=0), [-2.5, 2.0, 6.0], atol=1e-5)
+        np.testing.assert_allclose(np.linalg.norm(normals, axis=1), 1.0, atol=1e-5)
+
+        # Same parts are written once under the same name
+        same_batch = StaticBatch(self.tmp_dir)
+        same_batch.parts = list(batch.parts)
+        self.assertEqual(same_batch.key, batch.key)
+        mtl_path = os.path.splitext(path)[0] + ".mtl"
+        mtime = os.stat(mtl_path).st_mtime_ns
+        self.assertEqual(same_batch.write(), path)
+        self.assertEqual(os.stat(mtl_path).st_mtime_ns, mtime)
+
+    def test_mesh(self):
+        model_path = os.path.join(DATA_DIR, "immovable", "cylinder.obj")
+        batch = StaticBatch(self.tmp_dir)
+        batch.add_box([2.0, 1.0, 0.5], [0.0, 1.0, 0.0], 0.3, color=[0.0, 0.0, 1.0])
+        batch.add_model(model_path, [2.0, 1.0, 1.0], [5.0, 0.0, 0.0], 0.0)
+        self.assertFalse(batch.compound)
+        self.assertIsNone(batch.mesh_path)
+
+        path = batch.write()
+        self.assertFalse(os.path.exists(os.path.splitext(path)[0] + ".col"))
+        groups = _load_obj(path)
+        # Color of the box, and the texture of the tunnel
+        self.assertEqual(len(groups), 2)
+        num_corners = sum(len(corners[0]) for corners in groups.values())
+        model_corners = _load_obj(model_path)
+        num_model_corners = sum(len(corners[0]) for corners in model_corners.values())
+        self.assertEqual(num_corners, 36 + num_model_corners)
+
+        # Invisible parts only collide with a compound of boxes
+        batch.add_box([1.0, 1.0, 1.0], [0.0, 1.0, 0.0], 0.3, visible=False)
+        with self.assertRaises(ValueError):
+            batch.write()
+
+    def test_split(self):
+        # Parts without boxes collide with the mesh of a second model, and the
+        # walls stay a compound of boxes
+        model_path = os.path.join(DATA_DIR, "immovable", "cylinder.obj")
+        batch = StaticBatch(self.tmp_dir)
+        batch.add_box([2.0, 1.0, 0.5], [0.0, 1.0, 0.0], 0.0, color=[0.0, 0.0, 1.0])
+        batch.add_box([2.0, 1.0, 0.5], [0.0, 1.0, 8.0], 0.3, color=[0.0, 0.0, 1.0])
+        batch.add_model(model_path, [2.0, 1.0, 1.0], [5.0, 0.0, 0.0], 0.0)
+        self.assertTrue(batch.compound)
+        self.assertIsNotNone(batch.mesh_path)
+
+        path = batch.write()
+        np.testing.assert_allclose(_read_col(os.path.splitext(path)[0] + ".col"),
+                                   [[0.0, 1.0, 0.0, 2.0, 1.0, 0.5]], atol=1e-5)
+        # Every part is drawn, and only the others are in the mesh model
+        groups = _load_obj(path)
+        num_model_corners = sum(len(corners[0]) for corners in _load_obj(model_path).values())
+        self.assertEqual(sum(len(corners[0]) for corners in groups.values()),
+                         2 * 36 + num_model_corners)
+        mesh_groups = _load_obj(batch.mesh_path)
+        self.assertEqual(len(mesh_groups), 1)
+        self.assertEqual(sum(len(corners[0]) for corners in mesh_groups.values()),
+                         36 + num_model_corners)
+
+    def test_collision_proxy(self):
+        # Tunnels in quarter turns collide with the boxes of their .col file
+        model_path = os.path.join(DATA_DIR, "immovable", "cylinder.obj")
+        collision_path = os.path.join(DATA_DIR, "immovable", "cylinder.col")
+        batch = StaticBatch(self.tmp_dir)
+        batch.add_box([2.0, 1.0, 0.5], [0.0, 1.0, 0.0], 0.0, color=[0.0, 0.0, 1.0])
+        batch.add_model(model_path, [2.0, 1.0, 3.0], [5.0, 0.0, 0.0], 0.5 * np.pi,
+                        collision_path=collision_path)
+        self.assertTrue(batch.compound)
+        self.assertIsNone(batch.mesh_path)
+
+        path = batch.write()
+        boxes = _read_col(os.path.splitext(path)[0] + ".col")
+        tunnel_boxes = _read_col(collision_path)
+        self.assertEqual(len(boxes), 1 + len(tunnel_boxes))
+        # Quarter turn maps (x, z) to (z, -x), and swaps the x and z extents
+        expected = np.stack([5.0 + tunnel_boxes[:, 2] * 3.0,
+                             tunnel_boxes[:, 1],
+                             -tunnel_boxes[:, 0] * 2.0,
+                             tunnel_boxes[:, 5] * 3.0,
+                             tunnel_boxes[:, 4],
+                             tunnel_boxes[:, 3] * 2.0], axis=1)
+        np.testing.assert_allclose(boxes[1:], expected, atol=1e-5)
+
+        # Other angles fall back to the mesh
+        batch.add_model(model_path, [2.0, 1.0, 3.0], [-5.0, 0.0, 0.0], 0.3,
+                        collision_path=collision_path)
+        self.assertIsNotNone(batch.mesh_path)
+
+    def test_eviction(self):
+        paths = []
+        for i in range(4):
+            batch = StaticBatch(self.tmp_dir)
+            batch.add_box([1.0, 1.0, 1.0], [float(i), 1.0, 0.0], 0.0)
+            paths.append(batch.write())
+            os.utime(paths[-1], ns=(i * 10 ** 9, i * 10 ** 9))
+
+        # Using a model marks it as recent
+        batch = StaticBatch(self.tmp_dir)
+        batch.parts = [("box", (1.0, 1.0, 1.0), (0.0, 1.0, 0.0), 0.0, (255, 255, 255), True)]
+        self.assertEqual(batch.write(), paths[0])
+
+        _evict(self.tmp_dir, 2)
+        self.assertEqual([os.path.exists(path) for path in paths],
+                         [True, False, False, True])
+        self.assertFalse(os.path.exists(os.path.splitext(paths[1])[0] + ".col"))
+
+
+if __name__ == '__main__':
+    unittest.main()
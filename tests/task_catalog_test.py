@@ -0,0 +1,110 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+import warnings
+
+from manimalai.task_catalog import TaskCatalog, CONFIG_DIR, get_arena, get_catalog
+
+
+class TaskCatalogTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.config_dir = os.path.join(self.tmp_dir, "configurations")
+        os.makedirs(self.config_dir)
+        for task_id in ["1-1-1", "1-2-1"]:
+            shutil.copy(os.path.join(CONFIG_DIR, task_id + ".yml"), self.config_dir)
+        self.cache_path = os.path.join(self.tmp_dir, "catalog.json")
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp_dir)
+
+    def test_metadata(self):
+        catalog = TaskCatalog(self.config_dir, cache_path=self.cache_path)
+
+        self.assertEqual(catalog.task_ids(), ["1-1-1", "1-2-1"])
+        self.assertEqual(catalog.num_arenas("1-1-1"), 1)
+
+        info = catalog.get_info("1-1-1", 0)
+        self.assertEqual(info.t, 250)
+        self.assertEqual(info.pass_mark, 0)
+        self.assertEqual(info.blackouts, ())
+        self.assertEqual(info.item_counts, {"Agent": 1, "GoodGoal": 1})
+        self.assertEqual(info.category, "1")
+
+        arena = catalog.get_arena("1-1-1", 0)
+        self.assertEqual(arena.t, 250)
+        self.assertEqual([item.name for item in arena.items], ["Agent", "GoodGoal"])
+        # Memoized
+        self.assertIs(arena, catalog.get_arena("1-1-1", 0))
+
+        with self.assertRaises(KeyError):
+            catalog.get_arena("unknown")
+
+    def test_cache_invalidation(self):
+        TaskCatalog(self.config_dir, cache_path=self.cache_path)
+        self.assertTrue(os.path.exists(self.cache_path))
+
+        # Change t of one config and make sure its entry is recompiled
+        path = os.path.join(self.config_dir, "1-1-1.yml")
+        with open(path) as f:
+            text = f.read()
+        with open(path, "w") as f:
+            f.write(text.replace("t: 250", "t: 500"))
+        stat = os.stat(path)
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000))
+
+        catalog = TaskCatalog(self.config_dir, cache_path=self.cache_path)
+        self.assertEqual(catalog.get_info("1-1-1").t, 500)
+        self.assertEqual(catalog.get_arena("1-1-1").t, 500)
+
+    def test_malformed_config(self):
+        with open(os.path.join(self.config_dir, "9-9-9.yml"), "w") as f:
+            f.write("!ArenaConfig\narenas: [\n")
+        with warnings.catch_warnings(record=True) as caught:
+            warnings.simplefilter("always")
+            catalog = TaskCatalog(self.config_dir, cache_path=self.cache_path)
+        self.assertEqual(len(caught), 1)
+        self.assertIn("9-9-9.yml", str(caught[0].message))
+
+        # Other configs are still in the catalog
+        self.assertEqual(catalog.task_ids(), ["1-1-1", "1-2-1"])
+        self.assertIn("9-9-9", catalog.errors)
+        self.assertEqual(catalog.get_arena("1-2-1").t, get_arena("1-2-1").t)
+
+    def test_cache_format(self):
+        TaskCatalog(self.config_dir, cache_path=self.cache_path)
+        with open(self.cache_path) as f:
+            cache = json.load(f)
+        self.assertEqual(sorted(cache["entries"].keys()), ["1-1-1", "1-2-1"])
+
+        # Arenas loaded from the cache match the ones parsed from yaml
+        catalog = TaskCatalog(self.config_dir, cache_path=self.cache_path)
+        arena = catalog.get_arena("1-2-1", 0)
+        expected = get_arena("1-2-1", 0)
+        self.assertEqual(arena.pass_mark, expected.pass_mark)
+        self.assertEqual(len(arena.items), len(expected.items))
+        for item, expected_item in zip(arena.items, expected.items):
+            self.assertIs(type(item), type(expected_item))
+            self.assertEqual(item.name, expected_item.name)
+            self.assertEqual([vars(p) for p in item.positions],
+                             [vars(p) for p in expected_item.positions])
+            self.assertEqual([type(p) for p in item.positions],
+                             [type(p) for p in expected_item.positions])
+            self.assertEqual(item.rotations, expected_item.rotations)
+
+        # Broken cache is rebuilt
+        with open(self.cache_path, "w") as f:
+            f.write("{")
+        self.assertEqual(TaskCatalog(self.config_dir, cache_path=self.cache_path).get_info(
+            "1-1-1").t, 250)
+
+    def test_default_catalog(self):
+        self.assertIs(get_catalog(), get_catalog())
+        arena = get_arena("1-1-1", 0)
+        self.assertEqual(arena.t, 250)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,77 @@
+import unittest
+
+import numpy as np
+
+from manimalai.vector_env import AAIVectorEnv
+
+
+class VectorEnvTest(unittest.TestCase):
+    def test_step(self):
+        env = AAIVectorEnv(num_envs=3, num_workers=2, width=32, height=24)
+
+        screens = env.reset()
+        self.assertEqual(screens.shape, (3, 24, 32, 3))
+        self.assertEqual(screens.dtype, np.uint8)
+
+        env.step_async(np.ones((3, 2), dtype=np.int32))
+        screens, rewards, terminals, info = env.step_wait()
+
+        self.assertEqual(screens.shape, (3, 24, 32, 3))
+        self.assertEqual(rewards.shape, (3,))
+        self.assertEqual(rewards.dtype, np.float32)
+        self.assertEqual(terminals.shape, (3,))
+        self.assertEqual(terminals.dtype, np.bool_)
+        self.assertEqual(info["local_velocity"].shape, (3, 3))
+        self.assertTrue(screens.flags["C_CONTIGUOUS"])
+
+        env.close()
+
+    def test_step_subset(self):
+        env = AAIVectorEnv(num_envs=4, num_workers=2, width=16, height=16)
+        env.reset()
+        step_nums = env.call("__getattribute__", "step_num")
+        self.assertEqual(step_nums, [0, 0, 0, 0])
+
+        screens, rewards, terminals, info = env.step(np.ones((2, 2), dtype=np.int32),
+                                                     env_ids=[3, 0])
+        self.assertEqual(screens.shape, (2, 16, 16, 3))
+        self.assertEqual(rewards.shape, (2,))
+        self.assertEqual(info["local_velocity"].shape, (2, 3))
+
+        step_nums = env.call("__getattribute__", "step_num")
+        self.assertEqual(step_nums, [1, 0, 0, 1])
+
+        screens = env.reset(env_ids=[0])
+        self.assertEqual(screens.shape, (1, 16, 16, 3))
+        step_nums = env.call("__getattribute__", "step_num")
+        self.assertEqual(step_nums, [0, 0, 0, 1])
+
+        with self.assertRaises(ValueError):
+            env.reset(env_ids=[4])
+        env.close()
+
+    def test_call(self):
+        env = AAIVectorEnv(num_envs=2, num_workers=1, width=16, height=16,
+                           task_id=["1-1-1", "1-2-1"])
+
+        results = env.call("_convert_pos_inv", [0.0, 1.0, 0.0])
+        self.assertEqual(len(results), 2)
+        for pos in results:
+            self.assertEqual(pos, [20.0, 1.0, 20.0])
+
+        env.close()
+
+
+    def test_observation_format(self):
+        env = AAIVectorEnv(num_envs=2, num_workers=2, width=32, height=32,
+                           env_kwargs={"obs_layout": "CHW", "grayscale": True,
+                                       "downsample": 2})
+        screens = env.reset()
+        self.assertEqual(screens.shape, (2, 1, 16, 16))
+        self.assertEqual(env.single_observation_space.shape, (1, 16, 16))
+        screens, _, _, _ = env.step(np.ones((2, 2), dtype=np.int32))
+        self.assertEqual(screens.shape, (2, 1, 16, 16))
+        env.close()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+
+import numpy as np
+
+from manimalai.environment import AAIEnvironment
+from manimalai.wrappers import FrameStack
+
+
+class FrameStackTest(unittest.TestCase):
+    def test_stack(self):
+        env = FrameStack(AAIEnvironment(width=16, height=16, task_id="1-1-1"),
+                         num_frames=3, copy=True)
+        self.assertTrue(env.direct)
+        self.assertEqual(env.observation_space.shape, (3, 16, 16, 3))
+
+        frames = []
+        stack = env.reset()
+        self.assertEqual(stack.shape, (3, 16, 16, 3))
+        frames.append(stack[-1])
+        for i in range(3):
+            np.testing.assert_array_equal(stack[i], frames[0])
+
+        for i in range(5):
+            stack, reward, terminal, info = env.step([1, 2])
+            if terminal:
+                break
+            frames.append(stack[-1])
+            expected = ([frames[0]] * 3 + frames)[-3:]
+            np.testing.assert_array_equal(stack, np.stack(expected))
+        env.close()
+
+    def test_view(self):
+        env = FrameStack(AAIEnvironment(width=16, height=16, task_id="1-1-1"),
+                         num_frames=4)
+        stack = env.reset()
+        for i in range(6):
+            stack, _, terminal, _ = env.step([0, 1])
+            # Stack is a contiguous view of the ring buffer
+            self.assertIs(stack.base, env.buffer)
+            self.assertTrue(stack.flags["C_CONTIGUOUS"])
+        env.close()
+
+    def test_clear_on_terminal(self):
+        env = FrameStack(AAIEnvironment(width=16, height=16, task_id="1-1-1"),
+                         num_frames=3, zero_fill=True)
+        env.reset()
+        for i in range(300):
+            stack, reward, terminal, _ = env.step([1, 2])
+            if terminal:
+                break
+        self.assertTrue(terminal)
+        # Only the first frame of the next episode remains
+        self.assertFalse(stack[:2].any())
+        self.assertEqual(env.env.step_num, 0)
+        env.close()
+
+
+if __name__ == '__main__':
+    unittest.main()